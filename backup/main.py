@@ -3,13 +3,12 @@
 import os
 import sys
 import time
+import heapq
 import logging
 import subprocess
 import datetime
 from pathlib import Path
-import re
 import signal
-import yaml
 from typing import List, Dict, Any, Optional, Set, Tuple
 import threading
 
@@ -22,9 +21,35 @@ logger = logging.getLogger(__name__)
 
 # Import our modules
 try:
-    from tools.lib.config import ConfigManager
+    from tools.lib.config import ConfigManager, ConfigWatcher, ConfigCache
+    from tools.lib.schedule import Schedule, ScheduledTask, CronTrigger, CATCHUP_POLICIES
+    from tools.lib.ledger import JobLedger, default_ledger_path, pid_alive, QUEUED, RUNNING
+    from tools.lib.dispatch import Dispatcher, Job
+    from tools.lib.supervisor import JobSupervisor
+    from tools.lib.hosts import HostReconciler
+    from tools.lib.bandwidth import BandwidthBudget, parse_stat_fields
+    from tools.lib.pressure import AIMDController, AdaptiveLimiter, PressureSampler
+    from tools.lib.notify import Notifier, SendmailTransport
+    from tools.lib.metrics import Registry, MetricsServer
+    from tools.lib.simulate import Simulation, scale_servers
+    from tools.lib.leader import LeaderElection, FileLease, LedgerLease
+    from tools.lib.mounts import MountSessionManager
+    from tools.lib.ssh import saved_seconds
 except ImportError:
-    from backup.tools.lib.config import ConfigManager
+    from backup.tools.lib.config import ConfigManager, ConfigWatcher, ConfigCache
+    from backup.tools.lib.schedule import Schedule, ScheduledTask, CronTrigger, CATCHUP_POLICIES
+    from backup.tools.lib.ledger import JobLedger, default_ledger_path, pid_alive, QUEUED, RUNNING
+    from backup.tools.lib.dispatch import Dispatcher, Job
+    from backup.tools.lib.supervisor import JobSupervisor
+    from backup.tools.lib.hosts import HostReconciler
+    from backup.tools.lib.bandwidth import BandwidthBudget, parse_stat_fields
+    from backup.tools.lib.pressure import AIMDController, AdaptiveLimiter, PressureSampler
+    from backup.tools.lib.notify import Notifier, SendmailTransport
+    from backup.tools.lib.metrics import Registry, MetricsServer
+    from backup.tools.lib.simulate import Simulation, scale_servers
+    from backup.tools.lib.leader import LeaderElection, FileLease, LedgerLease
+    from backup.tools.lib.mounts import MountSessionManager
+    from backup.tools.lib.ssh import saved_seconds
 
 class BackupScheduler:
     """Main scheduler for SBE backups"""
@@ -53,15 +78,108 @@ class BackupScheduler:
         self.mail_recipient = os.environ.get("MAIL_RECIPIENT", "admin")
         self.sendmail_path = os.environ.get("sendMAIL_RECIPIENT", "/usr/sbin/sendmail")
         self.max_backups = int(os.environ.get("MAX_SIMULTANEOUS_BACKUPS", "2"))
+        self.max_backups_per_server = int(os.environ.get("MAX_BACKUPS_PER_SERVER", "1"))
+        self.max_backups_per_device = int(os.environ.get("MAX_BACKUPS_PER_DEVICE", "0"))
+        self.config_poll_interval = int(os.environ.get("CONFIG_POLL_INTERVAL", "60"))
+        # (path, signature) of the configuration last reported as unloadable
+        self._config_failure = None
+        
+        # Mails are queued, coalesced into digests and sent by a background thread
+        self.notifier = Notifier(
+            SendmailTransport(self.sendmail_path, self.mail_recipient),
+            digest_interval=float(os.environ.get("NOTIFY_DIGEST_INTERVAL", "300")),
+            tail_lines=int(os.environ.get("NOTIFY_TAIL_LINES", "40"))
+        )
+        
+        # Adds/removes hosts in store/ when servers.yaml changes
+        self.host_reconciler = HostReconciler(str(self.base_dir), self.config)
+        
+        # Compiled backup tasks ordered by next fire time
+        self.schedule = Schedule(slots=self.max_backups)
+        self._loaded_servers = None
+        self.checker_trigger = CronTrigger("0 18 * * *")
+        self.next_checker_run = self.checker_trigger.next_after(datetime.datetime.now())
+        self._wakeup = threading.Event()
+        
+        # Runs missed while the scheduler was down, as a heap of (start time, seq, task)
+        self.catchup_policy = os.environ.get("CATCHUP_POLICY", "once")
+        self.catchup_spread = float(os.environ.get("CATCHUP_SPREAD", "60"))
+        self._catchup: List[Tuple[datetime.datetime, int, ScheduledTask]] = []
+        self._catchup_planned = False
+        
+        # Worker pool limiting simultaneous backups overall, per remote server and per storage device
+        self.dispatcher = Dispatcher(self.max_backups, self._launch_backup, limits={
+            "server": self.max_backups_per_server,
+            "device": self.max_backups_per_device,
+        }, aging=float(os.environ.get("PRIORITY_AGING", "600")), admit=self._mount_ready)
+        
+        # Optionally adapt the number of concurrent backups to storage and CPU pressure
+        self.adaptive_limiter = None
+        if os.environ.get("ADAPTIVE_CONCURRENCY", "0") == "1":
+            controller = AIMDController(
+                minimum=int(os.environ.get("ADAPTIVE_MIN_BACKUPS", "1")),
+                maximum=int(os.environ.get("ADAPTIVE_MAX_BACKUPS", str(self.max_backups * 2))),
+                initial=self.max_backups,
+                target_utilization=float(os.environ.get("ADAPTIVE_TARGET_UTIL", "0.8")),
+                io_pressure_limit=float(os.environ.get("ADAPTIVE_IO_PRESSURE", "20")),
+                cpu_load_limit=float(os.environ.get("ADAPTIVE_CPU_LOAD", "1.5")),
+            )
+            self.adaptive_limiter = AdaptiveLimiter(
+                controller,
+                PressureSampler(),
+                apply=self._set_max_backups,
+                load=lambda: (self.dispatcher.running_count(), self.dispatcher.queue_depth()),
+                interval=float(os.environ.get("ADAPTIVE_INTERVAL", "30"))
+            )
+        
+        # Bandwidth budget split among running backups via rsync --bwlimit
+        self.bandwidth = BandwidthBudget.from_env(slots=self.max_backups)
+        
+        # Images stay mounted while jobs of their host are queued or running (MOUNT_IDLE_TIMEOUT=0: per job)
+        self.mount_sessions = None
+        mount_idle_timeout = float(os.environ.get("MOUNT_IDLE_TIMEOUT", "300"))
+        if mount_idle_timeout > 0:
+            self.mount_sessions = MountSessionManager(self._release_mount, mount_idle_timeout,
+                                                      on_unmounted=lambda host: self.dispatcher.retry())
+        
+        # Backup processes are supervised by one asyncio thread
+        self.supervisor = JobSupervisor(tail_lines=int(os.environ.get("JOB_LOG_TAIL_LINES", "200")))
+        self.job_log_keep = int(os.environ.get("JOB_LOG_KEEP", "30"))
         
         # Ensure reports directory exists
         if not self.reports_dir.exists():
             self.reports_dir.mkdir(parents=True, exist_ok=True)
-            # Create empty queue files
-            (self.reports_dir / "SBE-queue").touch()
-            (self.reports_dir / "SBE-queue-run").touch()
-            (self.reports_dir / "SBE-done").touch()
-            logger.info("Created reports directory and initialized queue files.")
+            logger.info("Created reports directory.")
+        
+        # Job ledger replacing the SBE-queue/SBE-queue-run/SBE-done files
+        self.ledger = JobLedger(default_ledger_path(self.reports_dir))
+        self.ledger.migrate_flat_files(self.reports_dir)
+        
+        # With NODE_ID set, several schedulers share the ledger and claim jobs under leases
+        self.node_id = os.environ.get("NODE_ID") or None
+        self.lease_seconds = float(os.environ.get("LEASE_SECONDS", "120"))
+        self.lease_max_attempts = int(os.environ.get("LEASE_MAX_ATTEMPTS", "3"))
+        self._lease_stop = threading.Event()
+        self._claim_lock = threading.Lock()
+        
+        # Optional standby: only the holder of the leader lease schedules (STANDBY_LEASE=file|ledger)
+        self.leader = None
+        lease_kind = os.environ.get("STANDBY_LEASE", "")
+        if lease_kind:
+            leader_lease_seconds = float(os.environ.get("LEADER_LEASE_SECONDS", "15"))
+            if lease_kind == "ledger":
+                lease = LedgerLease(self.ledger, leader_lease_seconds, holder=self.node_id)
+            else:
+                if lease_kind != "file":
+                    logger.error(f"Unknown STANDBY_LEASE {lease_kind!r}, using 'file'")
+                lease = FileLease(os.environ.get("LEADER_LOCK", str(self.reports_dir / "SBE-leader.lock")),
+                                  holder=self.node_id)
+            self.leader = LeaderElection(lease, interval=max(1.0, leader_lease_seconds / 3),
+                                         on_lost=self._leadership_lost)
+        
+        # In-memory metrics, served at /metrics when METRICS_PORT is set
+        self.metrics = Registry()
+        self._setup_metrics()
     
     def start(self, now: bool = False, logs: bool = False) -> None:
         """Start the backup scheduler
@@ -78,53 +196,137 @@ class BackupScheduler:
         signal.signal(signal.SIGTERM, self._handle_signal)
         
         logger.info("Backup scheduler started")
+        self.notifier.start()
         
-        # Clear run queue on startup
-        with open(self.reports_dir / "SBE-queue-run", "w") as f:
-            f.write("")
+        # A standby waits here until the leader stops renewing its lease
+        if self.leader is not None:
+            if not self.leader.wait(self._lease_stop):
+                self.notifier.stop()
+                return
+            logger.info("Holding the leader lease, scheduling backups")
+        
+        metrics_port = os.environ.get("METRICS_PORT")
+        if metrics_port:
+            try:
+                MetricsServer(self.metrics, int(metrics_port), os.environ.get("METRICS_ADDRESS", "0.0.0.0")).start()
+            except (OSError, ValueError) as e:
+                logger.error(f"Cannot serve metrics on port {metrics_port}: {e}")
+        
+        # Re-read configuration as soon as it changes instead of at the next poll
+        if os.environ.get("CONFIG_INOTIFY", "1") == "1":
+            ConfigWatcher(
+                [self.base_dir / "backup" / "config", self.base_dir / "backup"],
+                on_change=self._on_config_change
+            ).start()
+        
+        if self.adaptive_limiter is not None:
+            # Watch the devices holding the store and every backup image
+            sampler = self.adaptive_limiter.sampler
+            sampler.add_path(str(self.store_dir))
+            for image in self.store_dir.glob("*/backups"):
+                sampler.add_path(str(image))
+            self.adaptive_limiter.start()
+        
+        if self.mount_sessions is not None:
+            # Images left mounted by a previous run are unmounted once idle
+            for mount_dir in self.store_dir.glob("*/.mounted"):
+                if os.path.ismount(mount_dir):
+                    self.mount_sessions.adopt(mount_dir.parent.name)
+            self.mount_sessions.start()
+        
+        if self.node_id:
+            # Other nodes keep their jobs; ours go back to the shared queue
+            requeued = self.ledger.requeue_node(self.node_id)
+            if requeued:
+                logger.warning(f"Requeued {requeued} jobs of a previous run of node {self.node_id}")
+            threading.Thread(target=self._lease_loop, name="sbe-lease", daemon=True).start()
+        elif self.leader is None:
+            # Clear queue on startup (after a leader change, jobs are recovered once the schedule is loaded)
+            abandoned = self.ledger.abandon_active()
+            if abandoned:
+                logger.warning(f"Marked {abandoned} jobs of a previous run as failed")
         
         # Main loop
         try:
             while self.running:
                 # Sync backup hosts configuration (add/remove hosts by servers.yaml)
                 try:
-                    subprocess.run([
-                        sys.executable,
-                        str((Path(__file__).parent / "tools" / "manage_hosts.py").resolve())
-                    ], check=True)
+                    self.host_reconciler.reconcile()
                 except Exception as e:
-                    logger.error(f"manage_hosts.py failed: {e}")
-                # Wait until the start of the next minute
-                self._wait_for_next_minute()
+                    logger.error(f"Host sync failed: {e}")
                 
-                # Load and validate backup configuration
-                backup_config = self._load_backup_config()
-                if not backup_config:
-                    logger.error("Failed to load backup configuration")
-                    time.sleep(60)
+                # Load backup configuration and compile changed entries
+                current_time = datetime.datetime.now()
+                if not self._refresh_schedule(current_time):
+                    # Reported once per version of the file, not on every poll
+                    config_path = self.config.backup_config_path()
+                    failure = (config_path, config_path and ConfigCache.signature(config_path))
+                    if failure != self._config_failure:
+                        logger.error("Failed to load backup configuration")
+                        self._config_failure = failure
+                    self._sleep_until(current_time + datetime.timedelta(seconds=self.config_poll_interval))
                     continue
+                self._config_failure = None
+                
+                # Run all backups once if requested
+                if now:
+                    now = False
+                    for task in self.schedule.tasks:
+                        self._process_backup(task)
+                
+                # Queue runs missed during downtime, spread out over time
+                if not self._catchup_planned:
+                    self._catchup_planned = True
+                    recovered = set()
+                    if self.leader is not None and not self.node_id:
+                        recovered = self._recover_jobs()
+                    self._plan_catchup(current_time, skip=recovered)
+                self._process_catchup(current_time)
                 
-                # Process each backup
-                for server_config in backup_config.get("servers", []):
-                    self._process_backup(server_config, now)
+                # Process every task whose fire time has come
+                for task in self.schedule.pop_due(current_time):
+                    self.schedule_lag.observe((current_time - task.last_fire).total_seconds())
+                    self._process_backup(task)
                 
                 # Run checker script at 18:00
-                current_time = datetime.datetime.now().strftime("%H%M")
-                if current_time == "1800":
+                if current_time >= self.next_checker_run:
                     self._run_checker()
+                    # Re-plan tonight's windows with the latest durations
+                    self.schedule.replan(self.ledger.average_durations())
+                    self._check_window_plans(notify=True)
+                    self.next_checker_run = self.checker_trigger.next_after(current_time)
                 
-                # Sleep until the next minute
-                time.sleep(60)
+                # Sleep until the next fire time, but re-read the configuration regularly
+                wake_time = min(
+                    self.schedule.next_fire_time() or datetime.datetime.max,
+                    self._catchup[0][0] if self._catchup else datetime.datetime.max,
+                    self.next_checker_run,
+                    datetime.datetime.now() + datetime.timedelta(seconds=self.config_poll_interval)
+                )
+                self._sleep_until(wake_time)
                 
         except Exception as e:
             logger.error(f"Error in scheduler: {str(e)}")
-            self._send_email(f"Error in SBE scheduler", f"An error occurred in the SBE scheduler: {str(e)}")
+            self._send_email(f"Error in SBE scheduler", f"An error occurred in the SBE scheduler: {str(e)}",
+                             digest=False)
         
+        if self.mount_sessions is not None:
+            self.mount_sessions.stop()
+            self.mount_sessions.close_all()
+        
+        # Hand over to a standby right away
+        if self.leader is not None:
+            self.leader.release()
+        
+        # Deliver queued notifications before exiting
+        self.notifier.stop()
         logger.info("Backup scheduler stopped")
     
     def stop(self) -> None:
         """Stop the backup scheduler"""
         self.running = False
+        self._lease_stop.set()
+        self._wakeup.set()
     
     def _handle_signal(self, signum: int, frame) -> None:
         """Handle termination signals
@@ -136,43 +338,80 @@ class BackupScheduler:
         logger.info(f"Received signal {signum}, shutting down")
         self.stop()
     
-    def _wait_for_next_minute(self) -> None:
-        """Wait until the start of the next minute"""
-        logger.info("Waiting for the start of the next minute...")
-        while datetime.datetime.now().second != 0:
-            time.sleep(1)
+    def _sleep_until(self, wake_time: datetime.datetime) -> None:
+        """Sleep until the given time or until the scheduler is stopped
+        
+        Args:
+            wake_time: Time to wake up at
+        """
+        delay = (wake_time - datetime.datetime.now()).total_seconds()
+        if delay > 0:
+            if self.logs:
+                logger.info(f"Sleeping until {wake_time:%Y-%m-%d %H:%M:%S}")
+            self._wakeup.wait(delay)
+            # Woken early by a configuration change; keep the event for stop()
+            if self.running:
+                self._wakeup.clear()
+    
+    def _refresh_schedule(self, current_time: datetime.datetime) -> bool:
+        """Load the backup configuration and recompile it if it changed
+        
+        Args:
+            current_time: Reference time for newly added tasks
+            
+        Returns:
+            True if a valid configuration is loaded, False otherwise
+        """
+        backup_config = self._load_backup_config()
+        if not backup_config:
+            return False
+        
+        servers = backup_config.get("servers", []) or []
+        if servers is not self._loaded_servers and servers != self._loaded_servers:
+            for error in self.schedule.load(servers, current_time, self.ledger.average_durations()):
+                logger.error(error)
+            self._loaded_servers = servers
+            logger.info(f"Compiled {len(self.schedule)} backup tasks, next run at {self.schedule.next_fire_time()}")
+            self._check_window_plans(notify=False)
+        
+        return True
+    
+    def _check_window_plans(self, notify: bool) -> None:
+        """Warn about start windows whose backups are predicted to overrun
+        
+        Args:
+            notify: Whether to send an email in addition to logging
+        """
+        for window_plan in self.schedule.window_plans:
+            plan = window_plan.plan
+            if self.logs:
+                for planned in plan.jobs:
+                    logger.info(f"Window {window_plan.label}: {planned.key.name} planned at "
+                                f"+{datetime.timedelta(seconds=int(planned.start))} for "
+                                f"{datetime.timedelta(seconds=int(planned.duration))}")
+            if window_plan.fits:
+                continue
+            
+            message = (f"The {len(plan.jobs)} backups of window {window_plan.label} are predicted to take "
+                       f"{datetime.timedelta(seconds=int(plan.makespan))} with {plan.workers} running at once, "
+                       f"{window_plan.overrun} longer than the window.")
+            logger.warning(message)
+            if notify:
+                self._send_email(f"Backup window {window_plan.label} will overrun", message)
     
     def _load_backup_config(self) -> Dict[str, Any]:
         """Load backup configuration
         
+        The file is parsed and validated only when it changed since the last call.
+        
         Returns:
             Dict containing backup configuration
         """
-        # Check if YAML/JSON config exists
-        yaml_path = self.base_dir / "backup" / "config" / "backup.yaml"
-        json_path = self.base_dir / "backup" / "config" / "backup.json"
-        xml_path = self.base_dir / "backup" / "backup.xml"
-        
-        if yaml_path.exists():
-            try:
-                with open(yaml_path, "r") as f:
-                    return yaml.safe_load(f)
-            except Exception as e:
-                logger.error(f"Error loading YAML config: {str(e)}")
-                return {}
-        elif json_path.exists():
-            import json
-            try:
-                with open(json_path, "r") as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"Error loading JSON config: {str(e)}")
-                return {}
-        elif xml_path.exists():
-            return self._parse_xml_config(xml_path)
-        else:
-            logger.error("No backup configuration file found")
+        if self.config.backup_config_path() is None:
+            if self._config_failure != (None, None):
+                logger.error("No backup configuration file found")
             # Copy example config
+            xml_path = self.base_dir / "backup" / "backup.xml"
             example_path = self.base_dir / "backup" / "tools" / "backup.xml-example"
             if example_path.exists():
                 import shutil
@@ -180,151 +419,166 @@ class BackupScheduler:
                 logger.info("Copied example backup.xml. Please configure it.")
             
             return {}
+        
+        return self.config.load_backup_config()
     
-    def _parse_xml_config(self, xml_path: Path) -> Dict[str, Any]:
-        """Parse XML backup configuration
+    def _on_config_change(self, path: Path) -> None:
+        """Wake the scheduler when a configuration file changes
         
         Args:
-            xml_path: Path to XML config file
-            
+            path: Changed file
+        """
+        if path.name in ("backup.yaml", "backup.json", "backup.xml", "servers.yaml"):
+            if self.logs:
+                logger.info(f"Configuration file {path} changed")
+            self._wakeup.set()
+    
+    def _plan_catchup(self, current_time: datetime.datetime, skip: Set[Tuple[str, str]] = frozenset()) -> None:
+        """Plan runs missed since the last successful run of every task
+        
+        Args:
+            current_time: Current time
+            skip: (directory, type) of tasks that are already being re-run
+        """
+        if self.catchup_policy not in CATCHUP_POLICIES:
+            logger.error(f"Unknown CATCHUP_POLICY {self.catchup_policy!r}, using 'once'")
+            self.catchup_policy = "once"
+        
+        plan = self.schedule.plan_catchup(
+            self.ledger.last_successes(), current_time, self.catchup_policy, self.catchup_spread
+        )
+        plan = [(start_time, task) for start_time, task in plan if (task.directory, task.backup_type) not in skip]
+        for seq, (start_time, task) in enumerate(plan):
+            heapq.heappush(self._catchup, (start_time, seq, task))
+        if plan:
+            logger.info(f"Catching up {len(plan)} missed backup runs until {plan[-1][0]:%Y-%m-%d %H:%M:%S}")
+    
+    def _process_catchup(self, current_time: datetime.datetime) -> None:
+        """Queue catch-up runs whose start time has come
+        
+        Args:
+            current_time: Current time
+        """
+        while self._catchup and self._catchup[0][0] <= current_time:
+            _, seq, task = heapq.heappop(self._catchup)
+            logger.info(f"Catching up missed {task.backup_type} backup for {task.directory}")
+            if not self._process_backup(task) and (self.store_dir / task.directory).exists():
+                # Same backup still queued or running; replay this run after it
+                retry_time = current_time + datetime.timedelta(seconds=max(self.catchup_spread, 60))
+                heapq.heappush(self._catchup, (retry_time, seq, task))
+    
+    def _recover_jobs(self) -> Set[Tuple[str, str]]:
+        """Adopt or re-run the jobs a previous leader left queued or running
+        
+        Backup processes still alive on this host are watched until they
+        exit. Their output went to the previous leader, so the outcome is
+        unknown and every recovered job is run again; rsync only transfers
+        what is still missing.
+        
         Returns:
-            Dict containing backup configuration
+            (directory, type) of every recovered job
         """
-        import xml.etree.ElementTree as ET
+        tasks = {(task.directory, task.backup_type): task for task in self.schedule.tasks}
+        # Recorded PIDs only mean something if the previous leader ran on this host
+        local = isinstance(self.leader.lease, FileLease)
+        recovered = set()
+        for job in self.ledger.jobs(QUEUED) + self.ledger.jobs(RUNNING):
+            key = (job["directory"], job["type"])
+            recovered.add(key)
+            if job["state"] == RUNNING and local and pid_alive(job["pid"]):
+                logger.warning(f"Adopting {job['type']} backup for {job['directory']} (pid {job['pid']}) "
+                               f"from the previous leader")
+                threading.Thread(target=self._watch_adopted, args=(job, tasks.get(key)),
+                                 name=f"sbe-adopt-{job['id']}", daemon=True).start()
+            else:
+                self._rerun(job, tasks.get(key))
+        if recovered:
+            logger.warning(f"Recovered {len(recovered)} jobs of the previous leader")
+        return recovered
+    
+    def _watch_adopted(self, job: Dict[str, Any], task: Optional[ScheduledTask]) -> None:
+        """Wait for an adopted backup process to exit, then re-run its job"""
+        while self.running and pid_alive(job["pid"]):
+            time.sleep(5)
+        if self.running:
+            self._rerun(job, task)
+    
+    def _rerun(self, job: Dict[str, Any], task: Optional[ScheduledTask]) -> None:
+        """Close a job whose outcome was lost with the previous leader and queue it again
+        
+        Args:
+            job: Ledger row of the job
+            task: Compiled task of the job, None if it is no longer configured
+        """
+        if job["state"] == RUNNING:
+            self._release_mount(job["directory"])
+        self.ledger.complete(job["id"], False)
+        if task is not None:
+            logger.info(f"Re-running {task.backup_type} backup for {task.directory} after the leader change")
+            self._process_backup(task)
+    
+    def _release_mount(self, directory: str) -> None:
+        """Unmount a backup image left mounted by an interrupted backup
         
+        Args:
+            directory: Backup directory
+        """
+        mount_script = self.base_dir / "backup" / "tools" / "mount.py"
         try:
-            # Validate XML
-            result = subprocess.run(
-                ["xmllint", "--noout", "--schema", str(self.base_dir / "backup" / "config" / "backup.xsd"), str(xml_path)],
-                capture_output=True,
-                text=True
-            )
-            
+            result = subprocess.run([sys.executable, str(mount_script), "--umount", "--project", directory],
+                                    capture_output=True, text=True, timeout=300)
             if result.returncode != 0:
-                logger.error(f"Invalid XML format: {result.stderr}")
-                return {}
-            
-            logger.info("XML valid")
-            
-            # Parse XML
-            servers = []
-            tree = ET.parse(xml_path)
-            root = tree.getroot()
-            
-            for server in root.findall(".//server"):
-                server_config = {}
-                
-                for element in server:
-                    # Convert retention to int if present
-                    if element.tag == "retention" and element.text:
-                        server_config[element.tag] = int(element.text)
-                    else:
-                        server_config[element.tag] = element.text
-                
-                servers.append(server_config)
-            
-            return {"servers": servers}
-            
-        except Exception as e:
-            logger.error(f"Error parsing XML config: {str(e)}")
-            return {}
+                logger.error(f"Failed to unmount {directory}: {result.stdout.strip()} {result.stderr.strip()}")
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.error(f"Failed to unmount {directory}: {e}")
     
-    def _process_backup(self, server_config: Dict[str, Any], now: bool = False) -> None:
-        """Process a backup configuration
+    def _mount_ready(self, job: Job) -> bool:
+        """Check that the image of a job's host is not being unmounted
         
-        Args:
-            server_config: Server configuration
-            now: Whether to run backup immediately
+        Such jobs stay queued and are dispatched once the unmount is done.
         """
-        # Extract configuration
-        directory = server_config.get("backupdirectory")
-        interval = server_config.get("intervall")
-        date_pattern = server_config.get("date")
-        backup_type = server_config.get("type")
-        retention = server_config.get("retention")
-        
-        if not directory or not interval or not date_pattern or not backup_type:
-            logger.error(f"Invalid backup configuration: {server_config}")
-            return
+        return self.mount_sessions is None or not self.mount_sessions.is_closing(job.directory)
+    
+    def _leadership_lost(self) -> None:
+        """Stop scheduling after another scheduler may have taken over"""
+        logger.error("Lost the leader lease, stopping the scheduler")
+        self._send_email("SBE scheduler lost leadership",
+                         "The scheduler could not renew its leader lease and stopped; a standby takes over.",
+                         digest=False)
+        self.stop()
+    
+    def _process_backup(self, task: ScheduledTask) -> bool:
+        """Process a due backup task
         
+        Args:
+            task: Compiled backup task
+            
+        Returns:
+            True if the backup was queued, False otherwise
+        """
         # Debug information
         if self.logs:
-            logger.info(f"Checking backup for: {directory}")
-            logger.info(f"Interval: {interval}")
-            logger.info(f"Date: {date_pattern}")
-            logger.info(f"Type: {backup_type}")
-            logger.info(f"Retention: {retention}")
-        
-        # Check if backup should run
-        should_run = False
+            logger.info(f"Checking backup for: {task.directory}")
+            logger.info(f"Schedule: {task.trigger.expression}")
+            logger.info(f"Type: {task.backup_type}")
+            logger.info(f"Retention: {task.retention}")
         
-        if now:
-            should_run = True
-        else:
-            # Check interval
-            current_time = datetime.datetime.now()
-            
-            # Parse interval
-            if re.match(r"^\d+[hH]$", interval):
-                # Hourly interval (e.g., "12h")
-                hours = int(interval[:-1])
-                if current_time.hour % hours == 0 and current_time.minute == 0:
-                    should_run = True
-            elif re.match(r"^\d+[mM]$", interval):
-                # Minute interval (e.g., "30m")
-                minutes = int(interval[:-1])
-                if current_time.minute % minutes == 0:
-                    should_run = True
-            elif re.match(r"^\d{2}:\d{2}$", interval):
-                # Specific time (e.g., "01:30")
-                hour, minute = map(int, interval.split(":"))
-                if current_time.hour == hour and current_time.minute == minute:
-                    should_run = True
-            else:
-                logger.warning(f"Unknown interval format: {interval}")
-                return
-            
-            # If interval condition met, check date pattern
-            if should_run:
-                # Check date pattern
-                if date_pattern == "*":
-                    # Wildcard - run every day
-                    pass
-                elif re.match(r"^\d{1,2}$", date_pattern):
-                    # Day of month (e.g., "15")
-                    if current_time.day != int(date_pattern):
-                        should_run = False
-                elif re.match(r"^[A-Za-z]{3}$", date_pattern) or re.match(r"^[A-Za-z]+$", date_pattern):
-                    # Day of week (e.g., "Mon" or "Monday")
-                    current_day_short = current_time.strftime("%a")
-                    current_day_full = current_time.strftime("%A")
-                    if date_pattern not in [current_day_short, current_day_full]:
-                        should_run = False
-                elif re.match(r"^[A-Za-z]{3}-\d{1,2}$", date_pattern) or re.match(r"^[A-Za-z]+-\d{1,2}$", date_pattern):
-                    # Month-Day format for yearly backups (e.g., "Jan-1")
-                    month_part, day_part = date_pattern.split("-")
-                    current_month_short = current_time.strftime("%b")
-                    current_month_full = current_time.strftime("%B")
-                    if (month_part != current_month_short and month_part != current_month_full) or int(day_part) != current_time.day:
-                        should_run = False
-                else:
-                    logger.warning(f"Unknown date pattern format: {date_pattern}")
-                    should_run = False
-        
-        # If all conditions are met, run backup
-        if should_run:
-            include_file = server_config.get("include_file")
-            exclude_file = server_config.get("exclude_file")
-            self._run_backup(directory, backup_type, retention, include_file, exclude_file)
+        return self._run_backup(task.directory, task.backup_type, task.retention,
+                                task.include_file, task.exclude_file, task.priority)
     
     def _run_backup(self, directory: str, backup_type: str, retention: Optional[int] = None,
-                    include_file: Optional[str] = None, exclude_file: Optional[str] = None) -> None:
+                    include_file: Optional[str] = None, exclude_file: Optional[str] = None,
+                    priority: int = 0) -> bool:
         """Run a backup
         
         Args:
             directory: Backup directory
             backup_type: Type of backup (daily, weekly, monthly, yearly, latest)
             retention: Retention period in days
+            priority: Dispatch priority, higher runs first when slots are scarce
+            
+        Returns:
+            True if the backup was queued, False otherwise
         """
         # Check if backup directory exists
         backup_dir = self.store_dir / directory
@@ -332,21 +586,121 @@ class BackupScheduler:
         if not backup_dir.exists():
             logger.error(f"Backup directory {backup_dir} doesn't exist")
             self._send_email(f"Backup error for {directory}", f"Backup directory {backup_dir} doesn't exist")
-            return
+            return False
         
         # Avoid duplicates in queue
-        if not self._check_queue(directory, backup_type):
+        job_id = self.ledger.enqueue(directory, backup_type, priority)
+        if job_id is None:
             if self.logs:
                 logger.info(f"Backup for {directory} already in queue with type {backup_type}")
-            return
+            return False
+        
+        # In a cluster the job is run by whichever node claims it first
+        if self.node_id:
+            logger.info(f"Queued backup for {directory} with type {backup_type} in the shared ledger")
+            self._claim_jobs()
+            return True
+        
+        # Hand over to the worker pool; starts as soon as a slot is free
+        if self.mount_sessions is not None:
+            self.mount_sessions.acquire(directory)
+        self.dispatcher.submit(Job(
+            job_id, directory, backup_type, resources=self._backup_resources(directory), priority=priority,
+            retention=retention, include_file=include_file, exclude_file=exclude_file
+        ))
+        if self.dispatcher.queue_depth():
+            logger.info(f"Queued backup for {directory} with type {backup_type} "
+                        f"({self.dispatcher.queue_depth()} waiting for a free slot)")
+        return True
+    
+    def _set_max_backups(self, limit: int) -> None:
+        """Apply a concurrency limit chosen by the adaptive controller
         
-        # Manage queue to avoid overloading
-        self._manage_queue()
+        The bandwidth budget is split for the new number of slots too,
+        before a raised limit dispatches more jobs.
+        """
+        self.bandwidth.set_slots(limit)
+        self.dispatcher.set_max_workers(limit)
+    
+    def _claim_jobs(self) -> int:
+        """Claim as many jobs from the shared ledger as this node has free slots
         
-        logger.info(f"Starting backup for {directory} with type {backup_type}")
+        Returns:
+            Number of claimed jobs
+        """
+        with self._claim_lock:
+            free = self.dispatcher.max_workers - self.dispatcher.running_count() - self.dispatcher.queue_depth()
+            claimed = self.ledger.claim(self.node_id, self.lease_seconds, free,
+                                        one_per_directory=self.max_backups_per_server == 1)
+        
+        tasks = {(task.directory, task.backup_type): task for task in self.schedule.tasks}
+        for row in claimed:
+            directory, backup_type = row["directory"], row["type"]
+            if not (self.store_dir / directory).exists():
+                logger.error(f"Claimed backup for {directory}, but {self.store_dir / directory} doesn't exist here")
+                self.ledger.complete(row["id"], False, node=self.node_id)
+                continue
+            
+            # Options come from this node's copy of backup.yaml
+            task = tasks.get((directory, backup_type))
+            options = {}
+            if task is not None:
+                options = {"retention": task.retention, "include_file": task.include_file,
+                           "exclude_file": task.exclude_file}
+            logger.info(f"Claimed backup for {directory} with type {backup_type} (attempt {row['attempts']})")
+            if self.mount_sessions is not None:
+                self.mount_sessions.acquire(directory)
+            self.dispatcher.submit(Job(row["id"], directory, backup_type, resources=self._backup_resources(directory),
+                                       priority=row["priority"], **options))
+        return len(claimed)
+    
+    def _lease_loop(self) -> None:
+        """Renew this node's leases, recover expired ones and claim queued jobs"""
+        interval = max(1.0, self.lease_seconds / 4)
+        while not self._lease_stop.is_set():
+            try:
+                self.ledger.heartbeat(self.node_id, self.lease_seconds)
+                self.ledger.requeue_expired(self.lease_max_attempts)
+                self._claim_jobs()
+            except Exception as e:
+                logger.error(f"Error renewing leases: {e}")
+            self._lease_stop.wait(interval)
+    
+    def _backup_resources(self, directory: str) -> Dict[str, str]:
+        """Shared resources a backup of a directory competes for
         
-        # Add to run queue
-        self._add_to_run_queue(directory, backup_type)
+        Args:
+            directory: Backup directory
+            
+        Returns:
+            Dict with the remote server and the block device holding the backup image
+        """
+        backup_dir = self.store_dir / directory
+        server = self.config.load_server_config(directory).get("SERVER") or directory
+        
+        # The image file lives on the device we write to, whether mounted or not
+        try:
+            device = os.stat(backup_dir / "backups").st_dev
+        except OSError:
+            device = os.stat(backup_dir).st_dev
+        
+        return {"server": server, "device": str(device)}
+    
+    def _launch_backup(self, job: Job) -> bool:
+        """Start the backup process of a dispatched job
+        
+        Args:
+            job: Job that was assigned a worker slot
+            
+        Returns:
+            True if the backup process was started, False otherwise
+        """
+        directory = job.directory
+        backup_type = job.backup_type
+        
+        self.dispatch_wait.observe(job.wait_time)
+        logger.info(f"Starting backup for {directory} with type {backup_type} "
+                    f"(waited {job.wait_time:.1f}s, {self.dispatcher.queue_depth()} still queued)")
         
         # Universal backup script
         universal_script = self.base_dir / "backup" / "tools" / "backup_server.py"
@@ -359,236 +713,192 @@ class BackupScheduler:
             f"--{backup_type}"
         ]
 
-        if include_file:
-            command.extend(["--include-file", include_file])
+        if job.options.get("include_file"):
+            command.extend(["--include-file", job.options["include_file"]])
 
-        if exclude_file:
-            command.extend(["--exclude-file", exclude_file])
+        if job.options.get("exclude_file"):
+            command.extend(["--exclude-file", job.options["exclude_file"]])
+        
+        if job.options.get("retention") is not None:
+            command.extend(["--retention", str(job.options["retention"])])
+        
+        if self.mount_sessions is not None:
+            # The scheduler unmounts the image once no job of the host needs it anymore
+            command.append("--keep-mounted")
         
-        if retention is not None:
-            command.extend(["--retention", str(retention)])
+        bwlimit = self.bandwidth.assign(job.job_id, directory, datetime.datetime.now())
+        if bwlimit:
+            command.extend(["--bwlimit", str(bwlimit)])
+            logger.info(f"Bandwidth limit for {directory}: {bwlimit} KiB/s")
         
-        # Start backup in background
+        # Start backup in background, output goes to a per-job log file
+        log_path = self._job_log_path(job)
         try:
-            process = subprocess.Popen(
+            self.supervisor.launch(
                 command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
+                log_path,
+                on_exit=lambda return_code, tail: self._backup_finished(job, log_path, return_code, tail),
+                on_start=lambda pid: self._backup_started(job, pid),
+                on_line=lambda line: self._backup_output(job, line)
             )
-            
-            # Add to running backups set
-            self.backups_running.add(process.pid)
-            
-            # Start thread to monitor process completion
-            threading.Thread(
-                target=self._monitor_backup_process,
-                args=(process, directory, backup_type),
-                daemon=True
-            ).start()
+            return True
             
         except Exception as e:
+            self.bandwidth.release(job.job_id)
+            if self.mount_sessions is not None:
+                self.mount_sessions.release(directory)
             logger.error(f"Error starting backup for {directory}: {str(e)}")
             self._send_email(f"Backup error for {directory}", f"Error starting backup: {str(e)}")
-            self._remove_from_queue(directory, backup_type)
+            self.ledger.complete(job.job_id, False, node=self.node_id)
+            return False
     
-    def _monitor_backup_process(self, process: subprocess.Popen, directory: str, backup_type: str) -> None:
-        """Monitor backup process and handle completion
+    def _backup_started(self, job: Job, pid: int) -> None:
+        """Record a started backup process
         
         Args:
-            process: Subprocess process object
-            directory: Backup directory
-            backup_type: Type of backup
+            job: Dispatched job
+            pid: Process ID of the backup process
         """
-        stdout, stderr = process.communicate()
+        job.pid = pid
         
-        # Get return code
-        return_code = process.poll()
+        # Add to running backups set
+        self.backups_running.add(pid)
+        self.ledger.start(job.job_id, pid)
+    
+    def _backup_output(self, job: Job, line: str) -> None:
+        """Pick up statistics from the output of a backup process
         
-        # Remove from running backups
-        if process.pid in self.backups_running:
-            self.backups_running.remove(process.pid)
+        Args:
+            job: Dispatched job
+            line: Output line
+        """
+        fields = parse_stat_fields(line)
+        if not fields:
+            return
+        host = job.directory
+        if "mount_seconds" in fields:
+            self.mount_time.observe(fields["mount_seconds"], host=host)
+        if "retention_seconds" in fields:
+            self.retention_time.observe(fields["retention_seconds"], host=host)
+        if "ssh_connections" in fields:
+            handshakes = int(fields.get("ssh_handshakes", 0))
+            self.ssh_handshakes.inc(handshakes, host=host)
+            self.ssh_handshake_time.inc(fields.get("ssh_handshake_seconds", 0), host=host)
+            self.ssh_connections.inc(fields["ssh_connections"], host=host)
+            # Valued at the average handshake measured for the host so far
+            opened = self.ssh_handshakes.value(host=host)
+            if opened:
+                average = self.ssh_handshake_time.value(host=host) / opened
+                self.ssh_saved.inc(saved_seconds(int(fields["ssh_connections"]), handshakes, average), host=host)
+        if "bytes" in fields and "seconds" in fields:
+            transferred, seconds = int(fields["bytes"]), fields["seconds"]
+            job.transferred = (job.transferred or 0) + transferred
+            self.rsync_bytes.inc(transferred, host=host)
+            self.rsync_duration.observe(seconds, host=host)
+            if seconds > 0:
+                self.rsync_throughput.set(transferred / seconds, host=host)
+                self.bandwidth.observe(host, transferred / 1024 / seconds)
+    
+    def _backup_finished(self, job: Job, log_path: Path, return_code: int, tail: List[str]) -> None:
+        """Handle completion of a backup process
         
-        # Move from run queue to done
-        self._remove_from_run_queue(process.pid)
-        self._add_to_done(process.pid, directory, backup_type, return_code == 0)
+        Args:
+            job: Dispatched job
+            log_path: Log file with the full output
+            return_code: Exit code of the backup process
+            tail: Last lines of the output
+        """
+        directory = job.directory
+        
+        # Remove from running backups
+        self.backups_running.discard(job.pid)
+        
+        # Record the outcome in the ledger and free the worker slot
+        if not self.ledger.complete(job.job_id, return_code == 0, return_code, job.transferred, node=self.node_id):
+            logger.warning(f"Lease of job {job.job_id} for {directory} was lost, another node has taken it over")
+        self.backups_total.inc(host=directory, type=job.backup_type, result="success" if return_code == 0 else "failed")
+        if job.run_time is not None:
+            self.backup_duration.observe(job.run_time, host=directory, type=job.backup_type)
+        self.bandwidth.release(job.job_id)
+        if self.mount_sessions is not None:
+            self.mount_sessions.release(directory)
+        self.dispatcher.finished(job)
+        if self.node_id:
+            self._claim_jobs()
         
         # Check for errors
         if return_code != 0:
-            logger.error(f"Backup failed for {directory}: {stderr.decode()}")
+            output = "\n".join(tail)
+            logger.error(f"Backup failed for {directory} (return code {return_code}), see {log_path}")
             self._send_email(
-                f"Backup failed for {directory}",
-                f"Return code: {return_code}\n\nStdout:\n{stdout.decode()}\n\nStderr:\n{stderr.decode()}"
+                f"Backup failed for {directory} ({job.backup_type})",
+                f"Return code: {return_code}\n\nLast lines of output:\n{output}",
+                log_path=log_path
             )
         else:
             logger.info(f"Backup completed successfully for {directory}")
             if self.logs:
-                logger.info(f"Backup output: {stdout.decode()}")
+                logger.info(f"Backup output: {log_path}")
     
-    def _check_queue(self, directory: str, backup_type: str) -> bool:
-        """Check if backup is already in queue
-        
-        Args:
-            directory: Backup directory
-            backup_type: Type of backup
-            
-        Returns:
-            True if not in queue, False otherwise
-        """
-        # Create directory if it doesn't exist
-        if not self.reports_dir.exists():
-            self.reports_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Check if the PID used in queue file is active (Delete old entries)
-        for queue_file in ["SBE-queue", "SBE-queue-run"]:
-            queue_path = self.reports_dir / queue_file
-            
-            if queue_path.exists():
-                # Read queue file
-                with open(queue_path, "r") as f:
-                    lines = f.readlines()
-                
-                # Check if lines match current backup
-                new_lines = []
-                for line in lines:
-                    if not line.strip():
-                        continue
-                    
-                    parts = line.split(";")
-                    if len(parts) >= 4:
-                        pid_str = parts[0].strip()
-                        try:
-                            pid = int(pid_str)
-                            # Check if PID is still active
-                            try:
-                                os.kill(pid, 0)  # Signal 0 just checks if process exists
-                                # Process exists, keep line
-                                new_lines.append(line)
-                                
-                                # Check if this is our directory and type
-                                if parts[2].strip() == directory and parts[3].strip() == backup_type:
-                                    return False  # Already in queue
-                            except OSError:
-                                # Process doesn't exist, remove line
-                                pass
-                        except ValueError:
-                            # Invalid PID, keep line
-                            new_lines.append(line)
-                
-                # Write cleaned queue file
-                with open(queue_path, "w") as f:
-                    f.writelines(new_lines)
-        
-        # Add to queue
-        with open(self.reports_dir / "SBE-queue", "a") as f:
-            start_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            f.write(f"{os.getpid()}; {start_date}; {directory}; {backup_type};\n")
-        
-        return True
+    def _setup_metrics(self) -> None:
+        """Register the scheduler's metrics"""
+        metrics = self.metrics
+        metrics.gauge("sbe_queue_depth", "Backups waiting for a free slot", callback=self.dispatcher.queue_depth)
+        metrics.gauge("sbe_running_backups", "Backups running", callback=self.dispatcher.running_count)
+        metrics.gauge("sbe_concurrency_limit", "Maximum number of concurrent backups",
+                      callback=lambda: self.dispatcher.max_workers)
+        metrics.gauge("sbe_scheduled_tasks", "Compiled backup.yaml entries", callback=lambda: len(self.schedule))
+        metrics.gauge("sbe_mount_sessions", "Backup images kept mounted between jobs",
+                      callback=lambda: len(self.mount_sessions.sessions()) if self.mount_sessions else 0)
+        self.schedule_lag = metrics.histogram(
+            "sbe_schedule_lag_seconds", "Delay between a task's fire time and its processing",
+            buckets=(0.01, 0.1, 0.5, 1, 5, 30, 60, 300))
+        self.dispatch_wait = metrics.histogram(
+            "sbe_dispatch_wait_seconds", "Time backups waited for a worker slot")
+        self.backup_duration = metrics.histogram(
+            "sbe_backup_duration_seconds", "Run time of backup processes", labels=("host", "type"))
+        self.backups_total = metrics.counter(
+            "sbe_backups_total", "Finished backups", labels=("host", "type", "result"))
+        self.rsync_duration = metrics.histogram(
+            "sbe_rsync_duration_seconds", "Run time of rsync transfers", labels=("host",))
+        self.rsync_bytes = metrics.counter(
+            "sbe_rsync_received_bytes_total", "Bytes received by rsync", labels=("host",))
+        self.rsync_throughput = metrics.gauge(
+            "sbe_rsync_throughput_bytes_per_second", "Throughput of the last rsync transfer", labels=("host",))
+        self.mount_time = metrics.histogram(
+            "sbe_mount_open_seconds", "Time to open LUKS and mount a backup image", labels=("host",))
+        self.retention_time = metrics.histogram(
+            "sbe_retention_prune_seconds", "Time to remove backups beyond retention", labels=("host",))
+        self.ssh_handshakes = metrics.counter(
+            "sbe_ssh_handshakes_total", "SSH master connections opened", labels=("host",))
+        self.ssh_handshake_time = metrics.counter(
+            "sbe_ssh_handshake_seconds_total", "Time spent opening SSH master connections", labels=("host",))
+        self.ssh_connections = metrics.counter(
+            "sbe_ssh_connections_total", "rsync and ssh commands run over a master connection", labels=("host",))
+        self.ssh_saved = metrics.counter(
+            "sbe_ssh_saved_seconds_total", "Estimated handshake time saved by connection reuse", labels=("host",))
     
-    def _manage_queue(self) -> None:
-        """Manage backup queue to avoid overloading"""
-        # Check current number of running backups
-        queue_path = self.reports_dir / "SBE-queue-run"
-        
-        if queue_path.exists():
-            with open(queue_path, "r") as f:
-                # Count non-empty lines
-                lines = [line for line in f.readlines() if line.strip()]
-                running_count = len(lines)
-            
-            # Wait until there's room in the queue
-            while running_count >= self.max_backups:
-                time.sleep(2)
-                
-                # Recheck queue
-                with open(queue_path, "r") as f:
-                    lines = [line for line in f.readlines() if line.strip()]
-                    running_count = len(lines)
-    
-    def _add_to_run_queue(self, directory: str, backup_type: str) -> None:
-        """Add backup to run queue
+    def _job_log_path(self, job: Job) -> Path:
+        """Create the log file path of a job and prune old logs of the same backup
         
         Args:
-            directory: Backup directory
-            backup_type: Type of backup
-        """
-        with open(self.reports_dir / "SBE-queue-run", "a") as f:
-            start_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            f.write(f"{os.getpid()}; {start_date}; {directory}; {backup_type};\n")
-        
-        # Remove from waiting queue
-        self._remove_from_queue(directory, backup_type)
-    
-    def _remove_from_queue(self, directory: str, backup_type: str) -> None:
-        """Remove backup from waiting queue
-        
-        Args:
-            directory: Backup directory
-            backup_type: Type of backup
-        """
-        queue_path = self.reports_dir / "SBE-queue"
-        
-        if queue_path.exists():
-            with open(queue_path, "r") as f:
-                lines = f.readlines()
-            
-            # Filter out matching lines
-            new_lines = []
-            for line in lines:
-                if not line.strip():
-                    continue
-                
-                parts = line.split(";")
-                if len(parts) >= 4 and parts[2].strip() == directory and parts[3].strip() == backup_type:
-                    continue
-                
-                new_lines.append(line)
+            job: Dispatched job
             
-            # Write filtered queue
-            with open(queue_path, "w") as f:
-                f.writelines(new_lines)
-    
-    def _remove_from_run_queue(self, pid: int) -> None:
-        """Remove backup from run queue
-        
-        Args:
-            pid: Process ID
+        Returns:
+            Path of the job log file
         """
-        queue_path = self.reports_dir / "SBE-queue-run"
+        log_dir = self.reports_dir / "logs" / job.directory
+        log_dir.mkdir(parents=True, exist_ok=True)
         
-        if queue_path.exists():
-            with open(queue_path, "r") as f:
-                lines = f.readlines()
-            
-            # Filter out matching lines
-            new_lines = []
-            for line in lines:
-                if not line.strip():
-                    continue
-                
-                parts = line.split(";")
-                if len(parts) >= 1 and parts[0].strip() == str(pid):
-                    continue
-                
-                new_lines.append(line)
-            
-            # Write filtered queue
-            with open(queue_path, "w") as f:
-                f.writelines(new_lines)
-    
-    def _add_to_done(self, pid: int, directory: str, backup_type: str, success: bool) -> None:
-        """Add backup to done list
+        old_logs = sorted(log_dir.glob(f"{job.backup_type}-*.log"))
+        for old_log in old_logs[:max(0, len(old_logs) - self.job_log_keep + 1)]:
+            try:
+                old_log.unlink()
+            except OSError as e:
+                logger.warning(f"Could not remove old job log {old_log}: {e}")
         
-        Args:
-            pid: Process ID
-            directory: Backup directory
-            backup_type: Type of backup
-            success: Whether backup was successful
-        """
-        with open(self.reports_dir / "SBE-done", "a") as f:
-            start_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            status = "SUCCESS" if success else "FAILED"
-            f.write(f"{pid}; {start_date}; {directory}; {backup_type}; {status};\n")
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        return log_dir / f"{job.backup_type}-{timestamp}-{job.job_id}.log"
     
     def _run_checker(self) -> None:
         """Run the checker script"""
@@ -614,29 +924,50 @@ class BackupScheduler:
             logger.error(f"Checker script failed: {e}")
             self._send_email("Checker script failed", f"Error code: {e.returncode}\n\nOutput: {e.stdout}\n\nError: {e.stderr}")
     
-    def _send_email(self, subject: str, body: str) -> None:
-        """Send email notification
+    def _send_email(self, subject: str, body: str, log_path: Optional[Path] = None,
+                    digest: bool = True) -> None:
+        """Queue an email notification; delivery happens in the background
         
         Args:
             subject: Email subject
-            body: Email body
+            body: Email body, truncated to its last lines
+            log_path: Full log referenced in the mail
+            digest: Whether the mail may be combined with others of the next minutes
         """
-        try:
-            process = subprocess.Popen(
-                [self.sendmail_path, self.mail_recipient],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            message = f"Subject: {subject}\n\n{body}"
-            stdout, stderr = process.communicate(input=message)
-            
-            if process.returncode != 0:
-                logger.error(f"Failed to send email: {stderr}")
-        except Exception as e:
-            logger.error(f"Error sending email: {str(e)}")
+        self.notifier.notify(subject, body, log_path=log_path, digest=digest)
+
+def simulate(days: int, scale: int = 1, base_dir: Optional[str] = None) -> None:
+    """Replay backup.yaml against a virtual clock and print the expected load
+
+    Durations come from a task's `duration` key, then the job ledger's
+    history. Nothing is mounted, queued or run.
+
+    Args:
+        days: Number of days to simulate
+        scale: Replicate every entry this many times to model more hosts
+        base_dir: Base directory of SBE installation
+    """
+    base_dir = Path(base_dir) if base_dir else Path(__file__).resolve().parent.parent
+    servers = ConfigManager(str(base_dir)).load_backup_config().get("servers", []) or []
+
+    durations = {}
+    ledger_path = default_ledger_path(Path(os.environ.get("REPORTS_DIR", "/var/SBE/reports/")))
+    if ledger_path.exists():
+        durations = JobLedger(ledger_path).average_durations()
+    if scale > 1:
+        # Copies of a host share its history
+        durations.update({(f"{directory}-{copy}", backup_type): seconds
+                          for (directory, backup_type), seconds in list(durations.items())
+                          for copy in range(1, scale)})
+
+    simulation = Simulation(
+        scale_servers(servers, scale),
+        int(os.environ.get("MAX_SIMULTANEOUS_BACKUPS", "2")),
+        durations,
+        limits={"server": int(os.environ.get("MAX_BACKUPS_PER_SERVER", "1"))},
+        aging=float(os.environ.get("PRIORITY_AGING", "600")),
+    )
+    print(simulation.run(days).format())
 
 # Command-line interface
 if __name__ == "__main__":
@@ -647,6 +978,8 @@ if __name__ == "__main__":
     parser.add_argument("--now", action="store_true", help="Run all backups immediately")
     parser.add_argument("--update", action="store_true", help="Update scripts")
     parser.add_argument("--logs", action="store_true", help="Show detailed logs")
+    parser.add_argument("--simulate", type=int, metavar="DAYS", help="Simulate the schedule for DAYS days and exit")
+    parser.add_argument("--scale", type=int, default=1, metavar="N", help="With --simulate, replicate every host N times")
     
     args = parser.parse_args()
     
@@ -676,6 +1009,10 @@ if __name__ == "__main__":
         
         sys.exit(0)
     
+    if args.simulate:
+        simulate(args.simulate, args.scale)
+        sys.exit(0)
+    
     # Start scheduler
     scheduler = BackupScheduler()
     scheduler.start(now=args.now, logs=args.logs)
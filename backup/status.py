@@ -3,6 +3,7 @@
 import os
 import sys
 import logging
+import datetime
 import subprocess
 from pathlib import Path
 from typing import List, Dict, Any, Optional
@@ -17,8 +18,10 @@ logger = logging.getLogger(__name__)
 # Import our modules
 try:
     from tools.lib.config import ConfigManager
+    from tools.lib.ledger import JobLedger, default_ledger_path, FLAT_FILES, QUEUED, RUNNING
 except ImportError:
     from backup.tools.lib.config import ConfigManager
+    from backup.tools.lib.ledger import JobLedger, default_ledger_path, FLAT_FILES, QUEUED, RUNNING
 
 class BackupStatus:
     """Status reporting for SBE backups"""
@@ -72,89 +75,88 @@ class BackupStatus:
         print("\nQUEUE STATUS")
         print("------------")
         
+        ledger = self._open_ledger()
+        if ledger is None:
+            print("No job ledger found")
+            return
+        
         # Show current queue
-        queue_file = self.reports_dir / "SBE-queue"
-        print("\nCurrent queue:")
-        if queue_file.exists():
-            with open(queue_file, "r") as f:
-                print(f.read())
-        else:
-            print("No queue file found")
+        queued = ledger.jobs(QUEUED)
+        print(f"\nCurrent queue ({len(queued)} waiting):")
+        for job in queued:
+            print(f"{job['queued_at']}; {job['directory']}; {job['type']}; waiting {self._seconds_since(job['queued_at'])}s")
+        if not queued:
+            print("Queue is empty")
         
         # Show running backups
-        queue_run_file = self.reports_dir / "SBE-queue-run"
         print("\nBackups running at the moment:")
-        if queue_run_file.exists():
-            with open(queue_run_file, "r") as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    print(line)
-                    parts = line.split(";")
-                    if len(parts) >= 1:
-                        pid = parts[0].strip()
-                        
-                        # Check if process is still alive
-                        try:
-                            os.kill(int(pid), 0)  # Signal 0 just checks if process exists
-                            print("  > Task is still alive")
-                        except:
-                            print("  > No task with PID detected")
-        else:
+        running = ledger.jobs(RUNNING)
+        for job in running:
+            waited = self._seconds_between(job['queued_at'], job['started_at'])
+            node = f" on {job['node']}" if job.get('node') else ""
+            print(f"{job['pid']}; {job['started_at']}; {job['directory']}; {job['type']}; waited {waited}s{node}")
+            if job.get('node') and job['node'] != os.environ.get("NODE_ID"):
+                print(f"  > Leased until {job['lease_expires']} UTC")
+                continue
+            
+            # Check if process is still alive
+            try:
+                os.kill(int(job["pid"]), 0)  # Signal 0 just checks if process exists
+                print("  > Task is still alive")
+            except:
+                print("  > No task with PID detected")
+        if not running:
             print("No running backups")
         
         # Show completed backups
-        done_file = self.reports_dir / "SBE-done"
         print("\nBackups done:")
-        if done_file.exists() and done_file.stat().st_size > 0:
+        done = ledger.recent(10)
+        if done:
             print("(Last 10)")
-            try:
-                with open(done_file, "r") as f:
-                    lines = f.readlines()
-                    for line in lines[-10:]:
-                        print(line.strip())
-            except Exception as e:
-                print(f"Error reading done file: {str(e)}")
+            for job in done:
+                took = self._seconds_between(job['started_at'], job['finished_at'])
+                moved = f"{job['bytes'] / 1024 / 1024:.1f} MiB" if job.get('bytes') is not None else "-"
+                print(f"{job['pid']}; {job['finished_at']}; {job['directory']}; {job['type']}; {job['state'].upper()}; "
+                      f"took {took}s; {moved};")
         else:
             print("No backups with state DONE")
     
     def clean_queue(self) -> None:
-        """Clean up the queue by removing orphaned entries"""
-        # Check each queue file
-        for queue_file in ["SBE-queue", "SBE-queue-run"]:
-            file_path = self.reports_dir / queue_file
-            
-            if file_path.exists():
-                with open(file_path, "r") as f:
-                    lines = f.readlines()
-                
-                # Filter out orphaned entries
-                new_lines = []
-                for line in lines:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    parts = line.split(";")
-                    if len(parts) >= 1:
-                        pid = parts[0].strip()
-                        
-                        try:
-                            # Check if process is still alive
-                            os.kill(int(pid), 0)
-                            # Process exists, keep line
-                            new_lines.append(line + "\n")
-                        except:
-                            # Process doesn't exist, skip line
-                            pass
-                
-                # Write cleaned queue
-                with open(file_path, "w") as f:
-                    f.writelines(new_lines)
-                
-                print(f"Cleaned {queue_file}: removed {len(lines) - len(new_lines)} orphaned entries")
+        """Clean up the queue by marking orphaned running jobs as failed"""
+        ledger = self._open_ledger()
+        if ledger is None:
+            print("No job ledger found")
+            return
+        
+        removed = ledger.clean_orphans(os.environ.get("NODE_ID") or None)
+        print(f"Cleaned job ledger: marked {removed} orphaned entries as failed")
+    
+    @staticmethod
+    def _seconds_between(start: Optional[str], end: Optional[str]) -> int:
+        """Seconds between two ledger timestamps (0 if either is missing)"""
+        if not start or not end:
+            return 0
+        fmt = "%Y-%m-%d %H:%M:%S"
+        return int((datetime.datetime.strptime(end, fmt) - datetime.datetime.strptime(start, fmt)).total_seconds())
+    
+    def _seconds_since(self, start: Optional[str]) -> int:
+        """Seconds elapsed since a ledger timestamp"""
+        return self._seconds_between(start, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    
+    def _open_ledger(self) -> Optional[JobLedger]:
+        """Open the job ledger, importing legacy queue files if present
+        
+        Returns:
+            JobLedger, or None if neither a ledger nor queue files exist
+        """
+        ledger_path = default_ledger_path(self.reports_dir)
+        has_flat_files = any((self.reports_dir / name).exists() for name in FLAT_FILES)
+        if not ledger_path.exists() and not has_flat_files:
+            return None
+        
+        ledger = JobLedger(ledger_path)
+        ledger.migrate_flat_files(self.reports_dir)
+        return ledger
     
     def check_mounts(self) -> None:
         """Check status of backup mounts"""
@@ -212,7 +214,7 @@ if __name__ == "__main__":
     
     # Parse arguments
     parser = argparse.ArgumentParser(description="SBE Backup Status")
-    parser.add_argument("--clean", action="store_true", help="Clean up orphaned queue entries")
+    parser.add_argument("--clean", action="store_true", help="Mark orphaned running jobs as failed")
     parser.add_argument("--mounts", action="store_true", help="Check backup mounts")
     
     args = parser.parse_args()
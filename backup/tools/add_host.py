@@ -22,11 +22,13 @@ try:
     from lib.key_manager import KeyManager
     from lib.config import ConfigManager
     from lib.mount import BackupMounter
+    from lib.ssh import from_environment
 except ImportError:
     try:
         from backup.tools.lib.key_manager import KeyManager
         from backup.tools.lib.config import ConfigManager
         from backup.tools.lib.mount import BackupMounter
+        from backup.tools.lib.ssh import from_environment
     except ImportError:
         logger.error("Could not import required modules. Make sure you're running this script from the correct directory.")
         sys.exit(1)
@@ -561,8 +563,13 @@ python3 {universal_script} --server {hostname} "$@"
             print("Transferring SSH public key...")
             print("Note: You may need to enter the SSH password.")
             
+            # The password login becomes the host's master connection, which
+            # the initial backup reuses instead of connecting again
+            ssh = from_environment(user, server, port)
+            if ssh.enabled:
+                ssh.control_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
             result = subprocess.run(
-                ["ssh-copy-id", "-i", "~/.ssh/id_rsa.pub", "-p", port, f"{user}@{server}"],
+                ["ssh-copy-id", "-i", "~/.ssh/id_rsa.pub"] + ssh.options() + [f"{user}@{server}"],
                 capture_output=False,  # Let user interact with the process
                 text=True
             )
@@ -8,14 +8,24 @@ import os
 import sys
 import logging
 import argparse
+import re
+import time
 import subprocess
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
 
 try:
     from lib.mount import BackupMounter
+    from lib.snapshots import newest_snapshot, promote, PROMOTED_TYPES, SNAPSHOT_NAME
+    from lib.shards import shard_commands, list_remote_directories, run_parallel
+    from lib.ssh import from_environment
+    from lib.tuning import compression_options
 except ImportError:
     from backup.tools.lib.mount import BackupMounter
+    from backup.tools.lib.snapshots import newest_snapshot, promote, PROMOTED_TYPES, SNAPSHOT_NAME
+    from backup.tools.lib.shards import shard_commands, list_remote_directories, run_parallel
+    from backup.tools.lib.ssh import from_environment
+    from backup.tools.lib.tuning import compression_options
 
 # Configure logging
 logging.basicConfig(
@@ -24,7 +34,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def run_backup(server_name, backup_type="daily", retention=None, include_file=None, exclude_file=None):
+def run_backup(server_name, backup_type="daily", retention=None, include_file=None, exclude_file=None,
+               bwlimit=None, keep_mounted=False):
     # Set base directory to the SBE root
     base_dir = Path(__file__).resolve().parent.parent.parent
 
@@ -74,6 +85,8 @@ def run_backup(server_name, backup_type="daily", retention=None, include_file=No
         retention: Number of backups to keep
         include_file: Optional path to rsync include patterns
         exclude_file: Optional path to rsync exclude patterns
+        bwlimit: Optional rsync bandwidth limit in KiB/s
+        keep_mounted: Leave the image mounted for the next job; the scheduler unmounts it when idle
     """
     logger.info(f"Starting {backup_type} backup for {server_name}")
     
@@ -88,11 +101,13 @@ def run_backup(server_name, backup_type="daily", retention=None, include_file=No
     # Ensure mount
     mounter = BackupMounter(str(base_dir))
     if not _is_mounted(mount_dir):
+        started = time.monotonic()
         success, msg = mounter.mount_backup_directory(server_name)
         if not success:
             logger.error(f"Failed to mount backup directory: {msg}")
             return False
         mounter.initialize_backup_directories(server_name)
+        print(f"SBE-STATS mount_seconds={time.monotonic() - started:.3f}", flush=True)
     
     # Create timestamp for this backup
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -105,96 +120,158 @@ def run_backup(server_name, backup_type="daily", retention=None, include_file=No
         # Read server configuration
         config = _read_server_config(server_dir / "server.config")
 
-        # Get rsync parameters
-        rsync_opts = ["-a", "--delete", "--numeric-ids", "--relative"]
-
-        # Add SSH options if needed (pass as separate arguments)
-        ssh_cmd = f"ssh -p {config.get('PORT', '22')}"
-        rsync_opts.extend(["-e", ssh_cmd])
-
-        # Apply include/exclude patterns
-        if exclude_file is None:
-            exclude_file = config.get("EXCLUDE_FILE")
-        if include_file is None:
-            include_file = config.get("INCLUDE_FILE")
-
-        # Fallback to default files in the server directory
-        if not exclude_file:
-            default_ex = server_dir / "exclude.txt"
-            if default_ex.exists():
-                exclude_file = str(default_ex)
-        if not include_file:
-            default_in = server_dir / "include.txt"
-            if default_in.exists():
-                include_file = str(default_in)
-
-        def _read_patterns(file_path):
-            patterns = []
-            path = Path(file_path)
-            if not path.is_absolute():
-                path = server_dir / path
-            if path.exists():
-                with open(path, "r") as f:
-                    for line in f:
-                        line = line.strip()
-                        if line and not line.startswith("#"):
-                            patterns.append(line)
+        # GFS mode: higher tiers are hard-link copies of the newest daily snapshot
+        promoted = None
+        if backup_type in PROMOTED_TYPES and config.get("GFS", os.environ.get("GFS", "0")) == "1":
+            max_age = timedelta(hours=float(config.get("GFS_MAX_AGE", os.environ.get("GFS_MAX_AGE", "36"))))
+            promoted = promote(mount_dir, backup_type, max_age)
+            if promoted is None:
+                logger.info(f"No daily snapshot of the last {max_age} to promote, running rsync")
+
+        if promoted is None:
+            # Get rsync parameters
+            rsync_opts = ["-a", "--delete", "--numeric-ids", "--relative", "--stats"]
+            if bwlimit:
+                rsync_opts.append(f"--bwlimit={bwlimit}")
+
+            # All rsync and ssh commands of the run share one multiplexed connection
+            ssh = from_environment(config.get('USER', 'root'), config.get('SERVER'), config.get('PORT', '22'), config)
+            ssh.open()
+            rsync_opts.extend(["-e", ssh.rsh()])
+
+            # Compression chosen by tune.py (SSH_CIPHER is applied by the connection)
+            rsync_opts.extend(compression_options(config.get("RSYNC_COMPRESS"), config.get("RSYNC_COMPRESS_LEVEL")))
+
+            # Apply include/exclude patterns
+            if exclude_file is None:
+                exclude_file = config.get("EXCLUDE_FILE")
+            if include_file is None:
+                include_file = config.get("INCLUDE_FILE")
+
+            # Fallback to default files in the server directory
+            if not exclude_file:
+                default_ex = server_dir / "exclude.txt"
+                if default_ex.exists():
+                    exclude_file = str(default_ex)
+            if not include_file:
+                default_in = server_dir / "include.txt"
+                if default_in.exists():
+                    include_file = str(default_in)
+
+            def _read_patterns(file_path):
+                patterns = []
+                path = Path(file_path)
+                if not path.is_absolute():
+                    path = server_dir / path
+                if path.exists():
+                    with open(path, "r") as f:
+                        for line in f:
+                            line = line.strip()
+                            if line and not line.startswith("#"):
+                                patterns.append(line)
+                else:
+                    logger.warning(f"Pattern file {path} not found")
+                return patterns
+
+            if exclude_file:
+                for pat in _read_patterns(exclude_file):
+                    rsync_opts.extend(["--exclude", pat])
+
+            if include_file:
+                for pat in _read_patterns(include_file):
+                    rsync_opts.extend(["--include", pat])
+
+            # Build rsync command
+            rsync_cmd = ["rsync"] + rsync_opts
+            share = config.get('SHARE', '/') or '/'  # Default to '/' if empty
+            remote = f"{config.get('USER', 'root')}@{config.get('SERVER')}"
+            source = f"{remote}:{share}"
+            target = str(backup_dir / timestamp)
+
+            # Unchanged files become hard links into the newest snapshot of any type
+            if config.get("LINK_DEST", "1") != "0":
+                previous = newest_snapshot(mount_dir, exclude=Path(target))
+                if previous is not None:
+                    logger.info(f"Hard-linking unchanged files from {previous}")
+                    rsync_cmd.append(f"--link-dest={previous.resolve()}")
+
+            # Create target directory
+            os.makedirs(target, exist_ok=True)
+
+            # Hosts with huge trees can split the top-level directories over parallel rsyncs
+            shards = int(config.get("RSYNC_SHARDS", "1") or 1)
+            commands = [rsync_cmd + [source, target]]
+            if shards > 1:
+                try:
+                    ssh.record_connections()
+                    directories = list_remote_directories(ssh.ssh_command(), remote, share)
+                    commands = shard_commands(rsync_cmd, remote, share, target, directories, shards)
+                except (RuntimeError, OSError, subprocess.TimeoutExpired) as e:
+                    logger.warning(f"Cannot shard the backup, running a single rsync: {e}")
+
+            # Run rsync
+            ssh.record_connections(len(commands))
+            _report_ssh_stats(ssh)
+            started = time.monotonic()
+            if len(commands) > 1:
+                logger.info(f"Running {len(commands)} rsync processes from {source} to {target}")
+                result = run_parallel(commands)
+                command = [arg for shard in commands for arg in shard + [";"]][:-1]
             else:
-                logger.warning(f"Pattern file {path} not found")
-            return patterns
-
-        if exclude_file:
-            for pat in _read_patterns(exclude_file):
-                rsync_opts.extend(["--exclude", pat])
-
-        if include_file:
-            for pat in _read_patterns(include_file):
-                rsync_opts.extend(["--include", pat])
-
-        # Build rsync command
-        rsync_cmd = ["rsync"] + rsync_opts
-        share = config.get('SHARE', '/') or '/'  # Default to '/' if empty
-        source = f"{config.get('USER', 'root')}@{config.get('SERVER')}:{share}"
-        target = str(backup_dir / timestamp)
-
-        # Create target directory
-        os.makedirs(target, exist_ok=True)
-
-        # Run rsync
-        logger.info(f"Running rsync from {source} to {target}")
-        command = rsync_cmd + [source, target]
-        result = subprocess.run(command, capture_output=True, text=True)
-        if result.returncode != 0:
-            raise RuntimeError(
-                f"rsync failed with code {result.returncode}: {result.stderr}"
-            )
-
-        # Record executed command and timestamp
-        with open(f"{target}/backup_info.txt", "w") as f:
-            f.write(f"Backup created at {datetime.now().isoformat()}\n")
-            f.write(f"Server: {server_name}\n")
-            f.write(f"Type: {backup_type}\n")
-            f.write(
-                f"Command: {' '.join(command)}\nReturn code: {result.returncode}\n"
-            )
-
-        logger.info(f"Created backup at {target}")
+                logger.info(f"Running rsync from {source} to {target}")
+                command = commands[0]
+                result = subprocess.run(command, capture_output=True, text=True)
+            _report_stats(result.stdout, time.monotonic() - started)
+            if result.returncode != 0:
+                raise RuntimeError(
+                    f"rsync failed with code {result.returncode}: {result.stderr}"
+                )
+
+            # Record executed command and timestamp
+            with open(f"{target}/backup_info.txt", "w") as f:
+                f.write(f"Backup created at {datetime.now().isoformat()}\n")
+                f.write(f"Server: {server_name}\n")
+                f.write(f"Type: {backup_type}\n")
+                f.write(
+                    f"Command: {' '.join(command)}\nReturn code: {result.returncode}\n"
+                )
+
+            logger.info(f"Created backup at {target}")
 
         # Implement retention policy if specified
         if retention:
+            started = time.monotonic()
             _apply_retention_policy(backup_dir, retention)
+            print(f"SBE-STATS retention_seconds={time.monotonic() - started:.3f}", flush=True)
 
         success = True
     except Exception as e:
         logger.error(f"Backup failed: {str(e)}")
         success = False
     finally:
-        u_success, msg = mounter.unmount_backup_directory(server_name)
-        if not u_success:
-            logger.error(f"Failed to unmount backup directory: {msg}")
+        if not keep_mounted:
+            u_success, msg = mounter.unmount_backup_directory(server_name)
+            if not u_success:
+                logger.error(f"Failed to unmount backup directory: {msg}")
 
     return success
 
+def _report_stats(rsync_output, seconds):
+    """Print transferred bytes for the scheduler's bandwidth accounting (summed over shards)"""
+    matches = re.findall(r"Total bytes received:\s*([\d,.]+)", rsync_output or "")
+    if not matches:
+        return
+    transferred = sum(int(re.sub(r"[,.]", "", match)) for match in matches)
+    print(f"SBE-STATS bytes={transferred} seconds={seconds:.1f}", flush=True)
+
+def _report_ssh_stats(ssh):
+    """Print SSH handshakes and multiplexed connections for the scheduler"""
+    if not ssh.enabled:
+        return
+    stats = ssh.stats()
+    print(f"SBE-STATS ssh_handshakes={stats['handshakes']} ssh_handshake_seconds={stats['handshake_seconds']:.3f} "
+          f"ssh_connections={stats['connections']}", flush=True)
+
 def _is_mounted(mount_point):
     """Check if a directory is mounted"""
     try:
@@ -236,11 +313,11 @@ def _read_server_config(config_file):
 def _apply_retention_policy(backup_dir, retention):
     """Apply retention policy by removing old backups"""
     try:
-        # List all backups
+        # List all backups (partial promotions and other entries are not snapshots)
         backups = []
         for item in os.listdir(backup_dir):
             item_path = backup_dir / item
-            if os.path.isdir(item_path):
+            if os.path.isdir(item_path) and SNAPSHOT_NAME.fullmatch(item):
                 backups.append(item)
         
         # Sort by name (timestamp)
@@ -266,6 +343,8 @@ if __name__ == "__main__":
     parser.add_argument("--retention", type=int, help="Number of backups to keep")
     parser.add_argument("--include-file", help="Path to include patterns file")
     parser.add_argument("--exclude-file", help="Path to exclude patterns file")
+    parser.add_argument("--bwlimit", type=int, help="Bandwidth limit for rsync in KiB/s")
+    parser.add_argument("--keep-mounted", action="store_true", help="Leave the backup image mounted afterwards")
     
     args = parser.parse_args()
     
@@ -281,7 +360,8 @@ if __name__ == "__main__":
         backup_type = "latest"
     
     # Run backup
-    success = run_backup(args.server, backup_type, args.retention, args.include_file, args.exclude_file)
+    success = run_backup(args.server, backup_type, args.retention, args.include_file, args.exclude_file,
+                         args.bwlimit, args.keep_mounted)
     
     # Exit with appropriate code
     sys.exit(0 if success else 1)
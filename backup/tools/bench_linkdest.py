@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark of hard-linked snapshots (rsync --link-dest) against full copies
+on a synthetic tree: a number of daily snapshots of a source that changes
+by a small fraction of its files between runs.
+
+Reports per-run transfer volume and wall time and the disk space all
+snapshots take together (hard-linked files are counted once). Needs rsync.
+
+Usage: python3 backup/tools/bench_linkdest.py [--files 5000] [--days 7] [--change 0.05]
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+def make_tree(root: Path, files: int, rng: random.Random) -> list:
+    """Create a source tree of mostly small and a few large files"""
+    paths = []
+    for i in range(files):
+        path = root / f"dir{i % 50:02d}" / f"sub{i % 7}" / f"file{i:06d}.dat"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        size = rng.choice([512, 4096, 16384, 65536]) if rng.random() < 0.95 else 1024 * 1024
+        path.write_bytes(rng.randbytes(size))
+        paths.append(path)
+    return paths
+
+def mutate(paths: list, fraction: float, rng: random.Random) -> None:
+    """Rewrite a fraction of the files"""
+    for path in rng.sample(paths, max(1, int(len(paths) * fraction))):
+        path.write_bytes(rng.randbytes(path.stat().st_size))
+
+def snapshot(source: Path, target: Path, link_dest: Path = None) -> tuple:
+    """Copy the source into a new snapshot
+
+    Returns:
+        (bytes written as new file data, seconds)
+    """
+    command = ["rsync", "-a", "--delete", "--stats"]
+    if link_dest is not None:
+        command.append(f"--link-dest={link_dest}")
+    started = time.monotonic()
+    result = subprocess.run(command + [f"{source}/", str(target)], capture_output=True, text=True, check=True)
+    seconds = time.monotonic() - started
+    match = re.search(r"Total transferred file size:\s*([\d,.]+)", result.stdout)
+    return int(re.sub(r"[,.]", "", match.group(1))) if match else 0, seconds
+
+def disk_usage(root: Path) -> int:
+    """Bytes allocated below a directory, counting every inode once"""
+    seen = set()
+    total = 0
+    for directory, _, names in os.walk(root):
+        for name in names:
+            st = os.lstat(os.path.join(directory, name))
+            if (st.st_dev, st.st_ino) not in seen:
+                seen.add((st.st_dev, st.st_ino))
+                total += st.st_blocks * 512
+    return total
+
+def run(mode: str, work: Path, source: Path, paths: list, days: int, change: float, seed: int) -> tuple:
+    """Take `days` snapshots with one mode, mutating the source in between"""
+    rng = random.Random(seed)
+    store = work / mode
+    previous = None
+    transferred = []
+    durations = []
+    for day in range(days):
+        if day:
+            mutate(paths, change, rng)
+        target = store / f"day{day:03d}"
+        link_dest = previous if mode == "link-dest" else None
+        moved, seconds = snapshot(source, target, link_dest)
+        transferred.append(moved)
+        durations.append(seconds)
+        previous = target
+    return transferred, durations, disk_usage(store)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark rsync --link-dest snapshots")
+    parser.add_argument("--files", type=int, default=5000, help="Files in the synthetic tree")
+    parser.add_argument("--days", type=int, default=7, help="Number of snapshots")
+    parser.add_argument("--change", type=float, default=0.05, help="Fraction of files changed per day")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed of the tree and changes")
+    args = parser.parse_args()
+
+    if shutil.which("rsync") is None:
+        sys.exit("rsync is not installed")
+
+    with tempfile.TemporaryDirectory(prefix="sbe_linkdest_") as tmp:
+        work = Path(tmp)
+        results = {}
+        for mode in ("full", "link-dest"):
+            # Both modes see the same tree and the same sequence of changes
+            source = work / f"source-{mode}"
+            paths = make_tree(source, args.files, random.Random(args.seed))
+            results[mode] = run(mode, work, source, paths, args.days, args.change, args.seed + 1)
+
+        source_size = disk_usage(work / "source-full")
+        print(f"{args.files} files, {source_size / 2**20:.0f} MiB, {args.days} snapshots, "
+              f"{args.change:.0%} changed per day")
+        print(f"{'mode':>10} {'first run':>10} {'later runs':>11} {'later s/run':>12} {'disk':>10}")
+        for mode, (transferred, durations, usage) in results.items():
+            later = transferred[1:] or [0]
+            later_time = durations[1:] or [0]
+            print(f"{mode:>10} {transferred[0] / 2**20:>8.1f}Mi {sum(later) / len(later) / 2**20:>9.1f}Mi "
+                  f"{sum(later_time) / len(later_time):>12.2f} {usage / 2**20:>8.0f}Mi")
+
+        full, linked = results["full"], results["link-dest"]
+        if linked[2]:
+            print(f"Disk usage: {full[2] / linked[2]:.1f}x smaller with --link-dest")
+        if sum(linked[0][1:]):
+            print(f"Transfer per later run: {sum(full[0][1:]) / sum(linked[0][1:]):.1f}x less with --link-dest")
+
+if __name__ == "__main__":
+    main()
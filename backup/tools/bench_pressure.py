@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the adaptive concurrency controller against fixed caps on a
+synthetic workload: a night of backups with mixed sizes and source speeds
+writing to one store disk that thrashes when too many streams compete.
+
+The disk and network are modelled (1 s steps) so the comparison is
+repeatable on any machine; the controller sees the same utilization and
+I/O pressure signals it reads from /proc in production.
+
+Usage: python3 backup/tools/bench_pressure.py [--jobs 60] [--caps 1 2 4 8]
+"""
+
+import sys
+import random
+import argparse
+from pathlib import Path
+
+try:
+    from lib.pressure import AIMDController, Pressure
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+    from backup.tools.lib.pressure import AIMDController, Pressure
+
+def make_jobs(count: int, seed: int = 1):
+    """Generate (size in MiB, source speed in MiB/s) per job"""
+    rng = random.Random(seed)
+    return [(rng.choice([500, 2000, 8000, 30000]) * rng.uniform(0.5, 1.5), rng.choice([10, 25, 60, 110]))
+            for _ in range(count)]
+
+def disk_capacity(streams: int, bandwidth: float, knee: int, thrash: float) -> float:
+    """Store throughput in MiB/s with a number of concurrent write streams"""
+    if streams <= knee:
+        return bandwidth
+    return bandwidth / (1 + thrash * (streams - knee))
+
+def simulate(jobs, cap=None, controller=None, bandwidth=250.0, knee=4, thrash=0.25, interval=30):
+    """Run the workload with a fixed cap or a controller
+
+    Returns:
+        (makespan in seconds, average throughput in MiB/s, highest concurrency)
+    """
+    pending = list(jobs)
+    running = []
+    limit = cap if cap is not None else controller.limit
+    clock = 0
+    busy_time = 0.0
+    peak = 0
+    total = sum(size for size, _ in jobs)
+
+    while pending or running:
+        while pending and len(running) < limit:
+            size, speed = pending.pop(0)
+            running.append([size, speed])
+        peak = max(peak, len(running))
+
+        demand = sum(speed for _, speed in running)
+        capacity = disk_capacity(len(running), bandwidth, knee, thrash)
+        delivered = min(demand, capacity)
+        for job in running:
+            job[0] -= job[1] * delivered / demand
+        running = [job for job in running if job[0] > 0]
+        busy_time += delivered / capacity if capacity else 0
+        clock += 1
+
+        if controller is not None and clock % interval == 0:
+            utilization = busy_time / interval
+            stalled = max(0.0, demand - capacity) / demand * 100 if demand else 0.0
+            busy_time = 0.0
+            limit = controller.update(Pressure(utilization, stalled, 0.2), len(running), len(pending))
+
+    return clock, total / clock, peak
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark adaptive backup concurrency")
+    parser.add_argument("--jobs", type=int, default=60, help="Number of backup jobs")
+    parser.add_argument("--caps", type=int, nargs="+", default=[1, 2, 4, 8], help="Fixed caps to compare")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed of the workload")
+    args = parser.parse_args()
+
+    jobs = make_jobs(args.jobs, args.seed)
+    print(f"{len(jobs)} jobs, {sum(size for size, _ in jobs) / 1024:.0f} GiB total")
+    print(f"{'policy':>14} {'makespan':>10} {'MiB/s':>8} {'peak':>5}")
+    for cap in args.caps:
+        makespan, throughput, peak = simulate(jobs, cap=cap)
+        print(f"{'fixed ' + str(cap):>14} {makespan / 3600:>9.2f}h {throughput:>8.1f} {peak:>5}")
+    makespan, throughput, peak = simulate(jobs, controller=AIMDController(minimum=1, maximum=16, initial=2))
+    print(f"{'adaptive':>14} {makespan / 3600:>9.2f}h {throughput:>8.1f} {peak:>5}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the scheduler core: per-tick cost of the compiled next-fire-time
+heap compared to evaluating every backup.yaml entry on every minute.
+
+Usage: python3 backup/tools/bench_schedule.py [--tasks 100 1000 10000]
+"""
+
+import re
+import sys
+import time
+import random
+import argparse
+import datetime
+from pathlib import Path
+
+try:
+    from lib.schedule import Schedule
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+    from backup.tools.lib.schedule import Schedule
+
+def make_entries(count: int, seed: int = 1):
+    """Generate a mix of backup.yaml entries"""
+    rng = random.Random(seed)
+    entries = []
+    for i in range(count):
+        kind = rng.random()
+        if kind < 0.6:
+            interval, date = f"{rng.randrange(24):02d}:{rng.randrange(60):02d}", "*"
+        elif kind < 0.8:
+            interval, date = f"{rng.randrange(24):02d}:00", rng.choice(["Sun", "Mon", "Wednesday"])
+        elif kind < 0.9:
+            interval, date = f"{rng.randrange(24):02d}:30", str(rng.randrange(1, 29))
+        elif kind < 0.95:
+            interval, date = f"{rng.choice([1, 2, 4, 6, 12])}h", "*"
+        else:
+            interval, date = "04:00", "Jan-1"
+        entries.append({
+            "backupdirectory": f"host{i}",
+            "intervall": interval,
+            "date": date,
+            "type": "daily",
+        })
+    return entries
+
+def polling_tick(entries, current_time):
+    """Per-minute evaluation of every entry, as the scheduler used to do"""
+    due = 0
+    for entry in entries:
+        interval = entry["intervall"]
+        date_pattern = entry["date"]
+        should_run = False
+        if re.match(r"^\d+[hH]$", interval):
+            should_run = current_time.hour % int(interval[:-1]) == 0 and current_time.minute == 0
+        elif re.match(r"^\d+[mM]$", interval):
+            should_run = current_time.minute % int(interval[:-1]) == 0
+        elif re.match(r"^\d{2}:\d{2}$", interval):
+            hour, minute = map(int, interval.split(":"))
+            should_run = current_time.hour == hour and current_time.minute == minute
+        if should_run and date_pattern != "*":
+            if re.match(r"^\d{1,2}$", date_pattern):
+                should_run = current_time.day == int(date_pattern)
+            elif re.match(r"^[A-Za-z]+$", date_pattern):
+                should_run = date_pattern in (current_time.strftime("%a"), current_time.strftime("%A"))
+            else:
+                month_part, day_part = date_pattern.split("-")
+                should_run = (month_part in (current_time.strftime("%b"), current_time.strftime("%B"))
+                              and int(day_part) == current_time.day)
+        due += should_run
+    return due
+
+def bench(count: int, minutes: int):
+    """Run both strategies over the same simulated period"""
+    entries = make_entries(count)
+    start = datetime.datetime(2025, 1, 6, 0, 0)
+
+    t0 = time.perf_counter()
+    schedule = Schedule()
+    schedule.load(entries, start - datetime.timedelta(minutes=1))
+    compile_time = time.perf_counter() - t0
+
+    # Heap: one wake-up per distinct fire time, due tasks popped in O(log n)
+    t0 = time.perf_counter()
+    wakeups = heap_due = 0
+    end = start + datetime.timedelta(minutes=minutes)
+    current = schedule.next_fire_time()
+    while current is not None and current < end:
+        wakeups += 1
+        heap_due += len(schedule.pop_due(current))
+        current = schedule.next_fire_time()
+    heap_time = time.perf_counter() - t0
+
+    # Polling: one wake-up per minute, every entry checked
+    t0 = time.perf_counter()
+    poll_due = 0
+    for minute in range(minutes):
+        poll_due += polling_tick(entries, start + datetime.timedelta(minutes=minute))
+    poll_time = time.perf_counter() - t0
+
+    # Idle tick: the check made when nothing is due
+    t0 = time.perf_counter()
+    for _ in range(10000):
+        schedule.pop_due(start - datetime.timedelta(days=1))
+    idle_tick = (time.perf_counter() - t0) / 10000
+
+    return {
+        "tasks": count,
+        "compile_ms": compile_time * 1000,
+        "heap_per_run_us": heap_time / max(heap_due, 1) * 1e6,
+        "heap_idle_tick_us": idle_tick * 1e6,
+        "poll_per_tick_us": poll_time / minutes * 1e6,
+        "wakeups": wakeups,
+        "due": (heap_due, poll_due),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SBE scheduler core")
+    parser.add_argument("--tasks", type=int, nargs="+", default=[100, 1000, 10000], help="Task counts to benchmark")
+    parser.add_argument("--minutes", type=int, default=240, help="Simulated minutes per run")
+    args = parser.parse_args()
+
+    print(f"{'tasks':>7} {'compile ms':>11} {'idle tick us':>13} {'per run us':>11} {'poll tick us':>13} {'wakeups':>8}  due (heap/poll)")
+    for count in args.tasks:
+        r = bench(count, args.minutes)
+        print(f"{r['tasks']:>7} {r['compile_ms']:>11.1f} {r['heap_idle_tick_us']:>13.2f} "
+              f"{r['heap_per_run_us']:>11.2f} {r['poll_per_tick_us']:>13.1f} {r['wakeups']:>8}  {r['due'][0]}/{r['due'][1]}")
+
+if __name__ == "__main__":
+    main()
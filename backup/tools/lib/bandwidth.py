@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import logging
+import datetime
+import threading
+from typing import List, Dict, Optional, Tuple, Hashable
+
+logger = logging.getLogger(__name__)
+
+# Multipliers to KiB/s, the unit of rsync --bwlimit
+RATE_UNITS = {"": 1, "K": 1, "M": 1024, "G": 1024 * 1024}
+
+# Measured throughput is scaled by this before being used as demand, so a
+# job that is limited by its source can still speed up a little
+DEMAND_HEADROOM = 1.2
+
+# Weight of a new throughput sample in the moving average
+DEMAND_SMOOTHING = 0.5
+
+STATS_PATTERN = re.compile(r"SBE-STATS((?:\s+\w+=[\d.]+)+)\s*$")
+
+def parse_stat_fields(line: str) -> Optional[Dict[str, float]]:
+    """Parse the key=value fields of an SBE-STATS line printed by backup_server.py
+
+    Returns:
+        Dict of fields, or None if the line is no stats line
+    """
+    match = STATS_PATTERN.search(line)
+    if not match:
+        return None
+    fields = {}
+    for field in match.group(1).split():
+        key, _, value = field.partition("=")
+        try:
+            fields[key] = float(value)
+        except ValueError:
+            continue
+    return fields
+
+def parse_stats(line: str) -> Optional[Tuple[int, float]]:
+    """Parse the transfer statistics of an SBE-STATS line
+
+    Returns:
+        (bytes received, seconds), or None if the line has no transfer statistics
+    """
+    fields = parse_stat_fields(line)
+    if not fields or "bytes" not in fields or "seconds" not in fields:
+        return None
+    return int(fields["bytes"]), fields["seconds"]
+
+def parse_rate(text: str) -> int:
+    """Parse a rate like '500', '800K', '20M' or '1G' into KiB/s
+
+    Raises:
+        ValueError: If the rate cannot be parsed
+    """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMG]?)(?:i?B)?(?:/s)?\s*", str(text), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid bandwidth rate: {text!r}")
+    return int(float(match.group(1)) * RATE_UNITS[match.group(2).upper()])
+
+def parse_schedule(text: str) -> List[Tuple[int, int, int]]:
+    """Parse 'HH:MM-HH:MM=RATE' entries separated by commas
+
+    Windows may wrap around midnight, e.g. '18:00-08:00=0'.
+
+    Returns:
+        List of (start minute, end minute, KiB/s)
+
+    Raises:
+        ValueError: If an entry cannot be parsed
+    """
+    windows = []
+    for entry in filter(None, (part.strip() for part in text.split(","))):
+        match = re.fullmatch(r"(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(.+)", entry)
+        if not match:
+            raise ValueError(f"Invalid bandwidth window: {entry!r}")
+        start_h, start_m, end_h, end_m = (int(value) for value in match.groups()[:4])
+        if start_h > 23 or end_h > 24 or start_m > 59 or end_m > 59:
+            raise ValueError(f"Invalid time in bandwidth window: {entry!r}")
+        windows.append((start_h * 60 + start_m, end_h * 60 + end_m, parse_rate(match.group(5))))
+    return windows
+
+def water_fill(total: float, demands: Dict[Hashable, Optional[float]]) -> Dict[Hashable, int]:
+    """Split a budget so no job gets more than it can use
+
+    Jobs whose demand is below the fair share get their demand, the rest
+    is split evenly among the others. Unknown demand (None) is unbounded.
+
+    Args:
+        total: Budget to split
+        demands: Demand per job
+
+    Returns:
+        Allocation per job
+    """
+    allocation: Dict[Hashable, float] = {}
+    pending = dict(demands)
+    remaining = float(total)
+    while pending:
+        share = remaining / len(pending)
+        capped = {key: demand for key, demand in pending.items() if demand is not None and demand <= share}
+        if not capped:
+            for key in pending:
+                allocation[key] = share
+            break
+        for key, demand in capped.items():
+            allocation[key] = demand
+            remaining -= demand
+            del pending[key]
+    return {key: max(1, int(value)) for key, value in allocation.items()}
+
+class BandwidthBudget:
+    """Scheduler-wide bandwidth budget split among running backups
+
+    The budget (optionally depending on the time of day) is water-filled
+    across running jobs using each host's measured throughput as demand,
+    so bandwidth a slow source cannot use goes to the others. rsync cannot
+    change --bwlimit while running, so allocations are made at launch:
+    a new job gets its fair share, bounded by what running jobs leave
+    free minus an even split (total / slots) kept back for every other
+    free worker slot. Each job gets at least total / max(slots, running
+    jobs) unless its measured demand is lower. While no more jobs than
+    slots run, the limits never add up to more than the budget; a job
+    started beyond the slots (e.g. claimed from another node) still gets
+    that floor rather than being starved, and the overcommit is logged.
+    """
+
+    def __init__(self, limit: int = 0, schedule: Optional[List[Tuple[int, int, int]]] = None,
+                 slots: int = 1):
+        """Initialize the budget
+
+        Args:
+            limit: Default budget in KiB/s, 0 for unlimited
+            schedule: (start minute, end minute, KiB/s) windows overriding the default
+            slots: Maximum number of jobs running at once
+        """
+        self.limit = limit
+        self.schedule = schedule or []
+        self.slots = max(1, slots)
+        self._assigned: Dict[Hashable, int] = {}
+        self._demand_keys: Dict[Hashable, str] = {}
+        self._throughput: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, slots: int = 1) -> "BandwidthBudget":
+        """Create a budget from BANDWIDTH_LIMIT and BANDWIDTH_SCHEDULE"""
+        try:
+            limit = parse_rate(os.environ.get("BANDWIDTH_LIMIT", "0"))
+            schedule = parse_schedule(os.environ.get("BANDWIDTH_SCHEDULE", ""))
+        except ValueError as e:
+            logger.error(f"Ignoring bandwidth settings: {e}")
+            limit, schedule = 0, []
+        return cls(limit, schedule, slots)
+
+    def set_slots(self, slots: int) -> None:
+        """Change the number of jobs the budget is split for, e.g. when the worker limit changes"""
+        with self._lock:
+            self.slots = max(1, slots)
+
+    def limit_at(self, now: datetime.datetime) -> int:
+        """Budget in KiB/s at a point in time, 0 for unlimited"""
+        minute = now.hour * 60 + now.minute
+        for start, end, rate in self.schedule:
+            if start <= end:
+                if start <= minute < end:
+                    return rate
+            elif minute >= start or minute < end:
+                return rate
+        return self.limit
+
+    def demand(self, host: str) -> Optional[float]:
+        """Expected useful bandwidth of a host in KiB/s, None if unknown"""
+        throughput = self._throughput.get(host)
+        return throughput * DEMAND_HEADROOM if throughput else None
+
+    def assign(self, job_key: Hashable, host: str, now: datetime.datetime) -> int:
+        """Reserve bandwidth for a job that is about to start
+
+        Args:
+            job_key: Unique key of the job
+            host: Host the job reads from; its measured throughput is the demand
+            now: Current time
+
+        Returns:
+            rsync --bwlimit in KiB/s, 0 for unlimited
+        """
+        total = self.limit_at(now)
+        with self._lock:
+            if total <= 0:
+                self._assigned[job_key] = 0
+                self._demand_keys[job_key] = host
+                return 0
+
+            demands = {key: self.demand(self._demand_keys[key]) for key in self._assigned}
+            demands[job_key] = self.demand(host)
+            share = water_fill(total, demands)[job_key]
+
+            # Keep an even split free for each slot that may start a job later
+            running = len(self._assigned) + 1
+            committed = sum(self._assigned.values())
+            reserved = max(self.slots - running, 0) * (total // self.slots)
+            available = max(total - committed - reserved, 0)
+            floor = max(total // max(self.slots, running), 1)
+            limit = min(share, max(available, floor))
+            if limit > available:
+                logger.warning(f"{running} backups for {self.slots} bandwidth slots overcommit the "
+                               f"{total} KiB/s budget, limiting {host} to {limit} KiB/s")
+            self._assigned[job_key] = limit
+            self._demand_keys[job_key] = host
+            return limit
+
+    def release(self, job_key: Hashable) -> None:
+        """Return the bandwidth of a finished job to the budget"""
+        with self._lock:
+            self._assigned.pop(job_key, None)
+            self._demand_keys.pop(job_key, None)
+
+    def observe(self, host: str, kbps: float) -> None:
+        """Record measured throughput of a host in KiB/s"""
+        if kbps <= 0:
+            return
+        with self._lock:
+            previous = self._throughput.get(host)
+            if previous is None:
+                self._throughput[host] = kbps
+            else:
+                self._throughput[host] = previous + DEMAND_SMOOTHING * (kbps - previous)
+
+    def observe_line(self, host: str, line: str) -> bool:
+        """Record throughput from an SBE-STATS line printed by backup_server.py
+
+        Returns:
+            True if the line was a stats line
+        """
+        stats = parse_stats(line)
+        if stats is None:
+            return False
+        transferred, seconds = stats
+        if seconds > 0:
+            self.observe(host, transferred / 1024 / seconds)
+        return True
+
+    def assigned(self) -> Dict[Hashable, int]:
+        """Current allocation per running job"""
+        with self._lock:
+            return dict(self._assigned)
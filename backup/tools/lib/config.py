@@ -3,12 +3,182 @@
 import os
 import yaml
 import json
+import ctypes
+import ctypes.util
+import struct
 import logging
+import subprocess
+import threading
 from pathlib import Path
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, Optional, Union, Callable, Tuple
 
 logger = logging.getLogger(__name__)
 
+class ConfigCache:
+    """Parsed configuration files cached by their stat signature
+
+    A file is re-parsed (and re-validated) only when its mtime, size or
+    inode changes, or when it was invalidated explicitly. Parse errors are
+    logged once per change; until the file changes again the cached empty
+    result is returned silently.
+    """
+
+    def __init__(self):
+        """Initialize an empty cache"""
+        self._entries: Dict[Path, Tuple[Tuple[int, int, int], Dict[str, Any]]] = {}
+        # Signature of each file whose last parse failed; kept across invalidate()
+        self._failures: Dict[Path, Tuple[int, int, int]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def signature(path: Path) -> Optional[Tuple[int, int, int]]:
+        """Stat signature of a file, or None if it does not exist"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def load(self, path: Path, parser: Callable[[Path], Dict[str, Any]]) -> Dict[str, Any]:
+        """Return the parsed contents of a file, parsing only if it changed
+
+        Args:
+            path: File to load
+            parser: Callable parsing the file; may raise on invalid content
+
+        Returns:
+            Parsed contents, or an empty dict if the file is missing or invalid
+        """
+        path = Path(path)
+        signature = self.signature(path)
+        if signature is None:
+            return {}
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == signature:
+                return entry[1]
+
+            try:
+                value = parser(path) or {}
+                logger.info(f"Loaded configuration from {path}")
+                self._failures.pop(path, None)
+            except Exception as e:
+                # Re-parsed after an invalidation without a change: already reported
+                if self._failures.get(path) != signature:
+                    logger.error(f"Error loading config {path}: {str(e)}")
+                self._failures[path] = signature
+                value = {}
+
+            self._entries[path] = (signature, value)
+            return value
+
+    def invalidate(self, path: Optional[Path] = None) -> None:
+        """Drop a cached file (or every file) so the next load re-parses it
+
+        Args:
+            path: File to invalidate; None invalidates everything
+        """
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(Path(path), None)
+
+# Shared by every ConfigManager and the scheduler, so each file is parsed once per process
+config_cache = ConfigCache()
+
+class ConfigWatcher:
+    """Invalidates cached configuration files on change using inotify
+
+    Optional: only available on Linux with a libc exposing inotify. Without
+    it the stat signature check of ConfigCache still catches every change,
+    just not before the next load.
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, directories, on_change: Optional[Callable[[Path], None]] = None,
+                 cache: ConfigCache = config_cache):
+        """Initialize the watcher
+
+        Args:
+            directories: Directories whose files should be watched
+            on_change: Optional callback with the path of each changed file
+            cache: Cache to invalidate
+        """
+        self.directories = [Path(d) for d in directories]
+        self.on_change = on_change
+        self.cache = cache
+        self._fd = None
+        self._watches: Dict[int, Path] = {}
+
+    def start(self) -> bool:
+        """Start watching in a daemon thread
+
+        Returns:
+            True if inotify is active, False if it is not available
+        """
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            return False
+        try:
+            libc = ctypes.CDLL(libc_name, use_errno=True)
+            fd = libc.inotify_init1(os.O_CLOEXEC)
+            if fd < 0:
+                return False
+            mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE
+            for directory in self.directories:
+                if not directory.is_dir():
+                    continue
+                wd = libc.inotify_add_watch(fd, str(directory).encode(), mask)
+                if wd >= 0:
+                    self._watches[wd] = directory
+        except (AttributeError, OSError) as e:
+            logger.warning(f"inotify not available: {e}")
+            return False
+
+        if not self._watches:
+            os.close(fd)
+            return False
+
+        self._fd = fd
+        threading.Thread(target=self._run, name="sbe-config-watch", daemon=True).start()
+        logger.info(f"Watching {len(self._watches)} configuration directories for changes")
+        return True
+
+    def _run(self) -> None:
+        """Read inotify events and invalidate the affected files"""
+        while True:
+            try:
+                data = os.read(self._fd, 4096)
+            except OSError as e:
+                logger.error(f"inotify watcher stopped: {e}")
+                return
+
+            offset = 0
+            while offset + self.EVENT_HEADER.size <= len(data):
+                wd, _, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += self.EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+                offset += length
+
+                directory = self._watches.get(wd)
+                if directory is None or not name:
+                    continue
+                path = directory / name
+                self.cache.invalidate(path)
+                if self.on_change is not None:
+                    try:
+                        self.on_change(path)
+                    except Exception as e:
+                        logger.error(f"Error in config change handler: {e}")
+
 class ConfigManager:
     """Configuration manager for SBE that loads and validates configuration"""
     
@@ -68,7 +238,9 @@ class ConfigManager:
             logger.error(f"No server config found at {config_path}")
             return {}
         
-        # Parse shell-style config file
+        # Parse shell-style config file into a dict of its own; the scheduler
+        # loads configs of different servers from several threads
+        server_config = {}
         with open(config_path, "r") as config_file:
             for line in config_file:
                 line = line.strip()
@@ -79,36 +251,97 @@ class ConfigManager:
                 if key and value:
                     # Remove quotes if present
                     value = value.strip('"\'')
-                    self.server_config[key.strip()] = value
+                    server_config[key.strip()] = value
+        
+        # Only get_value reads this back
+        self.server_config = server_config
+        return server_config
+    
+    def backup_config_path(self) -> Optional[Path]:
+        """Path of the active backup configuration file (YAML, then JSON, then XML)
         
-        return self.server_config
+        Returns:
+            Path of the first existing configuration file, or None
+        """
+        for path in [
+            self.base_dir / "backup" / "config" / "backup.yaml",
+            self.base_dir / "backup" / "config" / "backup.json",
+            self.base_dir / "backup" / "backup.xml",
+        ]:
+            if path.exists():
+                return path
+        return None
     
     def load_backup_config(self) -> Dict[str, Any]:
         """Load backup configuration from YAML/JSON file
         
+        The parsed file is cached and only re-read when it changes.
+        
         Returns:
             Dict containing backup configuration
         """
-        # Check for YAML config first
-        yaml_path = self.base_dir / "backup" / "config" / "backup.yaml"
-        json_path = self.base_dir / "backup" / "config" / "backup.json"
-        xml_path = self.base_dir / "backup" / "backup.xml"
-        
-        if yaml_path.exists():
-            with open(yaml_path, "r") as yaml_file:
-                self.backup_config = yaml.safe_load(yaml_file)
-        elif json_path.exists():
-            with open(json_path, "r") as json_file:
-                self.backup_config = json.load(json_file)
-        elif xml_path.exists():
-            # For backwards compatibility - parse XML using the XML parser
-            self.backup_config = self._parse_xml_config(xml_path)
-        else:
+        config_path = self.backup_config_path()
+        if config_path is None:
             logger.error("No backup configuration file found")
             return {}
         
+        if config_path.suffix == ".yaml":
+            parser = self._parse_yaml_config
+        elif config_path.suffix == ".json":
+            parser = self._parse_json_config
+        else:
+            # For backwards compatibility - parse XML using the XML parser
+            parser = self._parse_xml_config
+        
+        self.backup_config = config_cache.load(config_path, parser)
         return self.backup_config
     
+    def load_servers_config(self) -> Dict[str, Any]:
+        """Load the host definitions from servers.yaml
+        
+        Returns:
+            Dict containing servers configuration
+        """
+        return config_cache.load(self.base_dir / "backup" / "config" / "servers.yaml", self._parse_yaml_config)
+    
+    @staticmethod
+    def _parse_yaml_config(path: Path) -> Dict[str, Any]:
+        """Parse a YAML config file"""
+        with open(path, "r") as yaml_file:
+            return yaml.safe_load(yaml_file)
+    
+    @staticmethod
+    def _parse_json_config(path: Path) -> Dict[str, Any]:
+        """Parse a JSON config file"""
+        with open(path, "r") as json_file:
+            return json.load(json_file)
+    
+    def _validate_xml_config(self, xml_path: Path) -> None:
+        """Validate an XML config against backup.xsd if xmllint and the schema are available
+        
+        Args:
+            xml_path: Path to XML config file
+            
+        Raises:
+            ValueError: If the XML does not match the schema
+        """
+        xsd_path = self.base_dir / "backup" / "config" / "backup.xsd"
+        if not xsd_path.exists():
+            return
+        
+        try:
+            result = subprocess.run(
+                ["xmllint", "--noout", "--schema", str(xsd_path), str(xml_path)],
+                capture_output=True,
+                text=True
+            )
+        except FileNotFoundError:
+            logger.warning("xmllint not found, skipping XML schema validation")
+            return
+        
+        if result.returncode != 0:
+            raise ValueError(f"Invalid XML format: {result.stderr}")
+    
     def _parse_xml_config(self, xml_path: Path) -> Dict[str, Any]:
         """Parse the old XML config format for backward compatibility
         
@@ -120,6 +353,8 @@ class ConfigManager:
         """
         import xml.etree.ElementTree as ET
         
+        self._validate_xml_config(xml_path)
+        
         servers = []
         try:
             tree = ET.parse(xml_path)
@@ -198,6 +433,40 @@ class ConfigManager:
             logger.error(f"Error saving server config: {e}")
             return False
             
+    def update_server_config(self, server_name: str, values: Dict[str, Any]) -> bool:
+        """Set some keys of an existing server configuration
+
+        Lines of other keys and comments are kept as they are; keys not in
+        the file yet are appended. A key listed more than once is written
+        once, in place of its first line. An empty value (or None) removes
+        every line of a key.
+
+        Args:
+            server_name: Name of the server (directory name)
+            values: Keys and values to set
+
+        Returns:
+            True if successful, False otherwise
+        """
+        config_path = self.base_dir / "store" / server_name / "server.config"
+
+        try:
+            pending = {key: value for key, value in values.items() if value not in (None, "")}
+            lines = []
+            for line in config_path.read_text().splitlines():
+                key = line.strip().partition("=")[0].strip()
+                if line.strip().startswith("#") or key not in values:
+                    lines.append(line)
+                elif key in pending:
+                    lines.append(f"{key}=\"{pending.pop(key)}\"")
+            lines.extend(f"{key}=\"{value}\"" for key, value in pending.items())
+            config_path.write_text("\n".join(lines) + "\n")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error updating server config: {e}")
+            return False
+
     def convert_xml_to_yaml(self) -> bool:
         """Convert XML configuration to YAML format
         
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+
+import time
+import logging
+import threading
+from collections import deque
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+logger = logging.getLogger(__name__)
+
+class Job:
+    """A backup job waiting for or holding a worker slot"""
+
+    def __init__(self, job_id: int, directory: str, backup_type: str,
+                 resources: Optional[Dict[str, str]] = None, priority: int = 0, **options: Any):
+        """Initialize a job
+
+        Args:
+            job_id: Ledger job id
+            directory: Backup directory
+            backup_type: Type of backup
+            resources: Shared resources the job uses, e.g. {"server": "10.0.0.5", "device": "2049"}
+            priority: Higher values are dispatched first
+            **options: Backup options (retention, include_file, exclude_file, ...)
+        """
+        self.job_id = job_id
+        self.directory = directory
+        self.backup_type = backup_type
+        self.resources = resources or {}
+        self.priority = priority
+        self.options = options
+        self.pid: Optional[int] = None
+        self.transferred: Optional[int] = None
+        self.queued_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def wait_time(self) -> float:
+        """Seconds spent in the ready queue (so far, if not started yet)"""
+        end = self.started_at if self.started_at is not None else time.monotonic()
+        return end - self.queued_at
+
+    @property
+    def run_time(self) -> Optional[float]:
+        """Seconds spent running, or None if not started"""
+        if self.started_at is None:
+            return None
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.started_at
+
+    def __repr__(self) -> str:
+        return f"Job({self.job_id}, {self.directory}/{self.backup_type})"
+
+class Dispatcher:
+    """Bounded pool of worker slots fed from an in-memory ready queue
+
+    `submit` never blocks: jobs wait in the ready queue and are handed to
+    the launcher as soon as a slot is free. The launcher starts the job
+    asynchronously and must call `finished` once it is done, which frees
+    the slot and immediately dispatches the next waiting job.
+
+    Besides the global limit, `limits` caps the running jobs per shared
+    resource (e.g. per remote server or storage device). A job is only
+    admitted when every resource it uses has capacity; jobs blocked by a
+    busy resource are skipped, not waited on. The same goes for jobs the
+    optional `admit` check refuses; call `retry` once it may accept them.
+
+    Among admissible jobs the highest priority wins. Every `aging` seconds
+    of waiting raise a job's priority by one, so low priority jobs cannot
+    starve. Ties go to the directory served least recently (round-robin
+    across hosts), then to the job queued first. Since aging changes the
+    order over time, the ready queue is scanned on dispatch instead of
+    being kept as a heap; it holds at most one job per backup entry.
+    """
+
+    def __init__(self, max_workers: int, launcher: Callable[[Job], bool],
+                 limits: Optional[Dict[str, int]] = None, aging: float = 600,
+                 clock: Callable[[], float] = time.monotonic,
+                 admit: Optional[Callable[[Job], bool]] = None):
+        """Initialize the dispatcher
+
+        Args:
+            max_workers: Maximum number of jobs running at once
+            launcher: Callable starting a job; returns False if it could not be started
+            limits: Maximum running jobs per value of each resource kind, 0 for unlimited
+            aging: Seconds of waiting that raise a job's priority by one, 0 to disable
+            clock: Time source in seconds, replaced by a virtual clock in simulations
+            admit: Returns False for jobs that must keep waiting, e.g. while their host is busy
+        """
+        self.max_workers = max_workers
+        self.clock = clock
+        self.launcher = launcher
+        self.limits = {kind: limit for kind, limit in (limits or {}).items() if limit > 0}
+        self.aging = aging
+        self.admit = admit
+        self._ready: deque = deque()
+        self._running: Dict[int, Job] = {}
+        self._in_use: Dict[Tuple[str, str], int] = {}
+        self._served: Dict[str, int] = {}
+        self._dispatch_count = 0
+        self._lock = threading.RLock()
+
+    def submit(self, job: Job) -> None:
+        """Add a job to the ready queue and dispatch if a slot is free
+
+        Args:
+            job: Job to run
+        """
+        with self._lock:
+            job.queued_at = self.clock()
+            self._ready.append(job)
+        self._dispatch()
+
+    def finished(self, job: Job) -> None:
+        """Release the slot of a finished job and dispatch waiting jobs
+
+        Args:
+            job: Job that finished
+        """
+        with self._lock:
+            self._release(job)
+        self._dispatch()
+
+    def retry(self) -> None:
+        """Dispatch waiting jobs after something `admit` depends on changed"""
+        self._dispatch()
+
+    def _has_capacity(self, job: Job) -> bool:
+        """Check that every limited resource of a job has a free slot and `admit` accepts it"""
+        for kind, limit in self.limits.items():
+            value = job.resources.get(kind)
+            if value is not None and self._in_use.get((kind, value), 0) >= limit:
+                return False
+        return self.admit is None or self.admit(job)
+
+    def effective_priority(self, job: Job, now: Optional[float] = None) -> int:
+        """Priority of a job including aging"""
+        if not self.aging or job.started_at is not None:
+            return job.priority
+        waited = (now if now is not None else self.clock()) - job.queued_at
+        return job.priority + int(waited // self.aging)
+
+    def _acquire(self, job: Job) -> None:
+        """Assign a worker slot and resource slots to a job"""
+        job.started_at = self.clock()
+        self._running[job.job_id] = job
+        self._dispatch_count += 1
+        self._served[job.directory] = self._dispatch_count
+        for kind, value in job.resources.items():
+            self._in_use[(kind, value)] = self._in_use.get((kind, value), 0) + 1
+
+    def _release(self, job: Job) -> None:
+        """Free the worker slot and resource slots of a job"""
+        job.finished_at = self.clock()
+        if self._running.pop(job.job_id, None) is None:
+            return
+        for kind, value in job.resources.items():
+            remaining = self._in_use.get((kind, value), 0) - 1
+            if remaining > 0:
+                self._in_use[(kind, value)] = remaining
+            else:
+                self._in_use.pop((kind, value), None)
+
+    def _next_job(self) -> Optional[Job]:
+        """Take the most urgent ready job whose limits all have capacity"""
+        if len(self._running) >= self.max_workers:
+            return None
+        now = self.clock()
+        best = None
+        best_key = None
+        for job in self._ready:
+            if not self._has_capacity(job):
+                continue
+            key = (-self.effective_priority(job, now), self._served.get(job.directory, 0), job.queued_at)
+            if best_key is None or key < best_key:
+                best, best_key = job, key
+        if best is not None:
+            self._ready.remove(best)
+        return best
+
+    def _dispatch(self) -> None:
+        """Start waiting jobs while slots are free"""
+        while True:
+            with self._lock:
+                job = self._next_job()
+                if job is None:
+                    return
+                self._acquire(job)
+
+            try:
+                started = self.launcher(job)
+            except Exception as e:
+                logger.error(f"Error launching {job}: {str(e)}")
+                started = False
+            if not started:
+                with self._lock:
+                    self._release(job)
+
+    def set_max_workers(self, max_workers: int) -> None:
+        """Change the global limit; running jobs above a lowered limit finish normally
+
+        Args:
+            max_workers: Maximum number of jobs running at once
+        """
+        with self._lock:
+            self.max_workers = max(1, max_workers)
+        self._dispatch()
+
+    def queue_depth(self) -> int:
+        """Number of jobs waiting for a slot"""
+        with self._lock:
+            return len(self._ready)
+
+    def running_count(self) -> int:
+        """Number of jobs holding a slot"""
+        with self._lock:
+            return len(self._running)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """State of all waiting and running jobs
+
+        Returns:
+            List of dicts with job id, directory, type, state and wait/run times
+        """
+        with self._lock:
+            jobs = [(job, "queued") for job in self._ready] + [(job, "running") for job in self._running.values()]
+            return [{
+                "job_id": job.job_id,
+                "directory": job.directory,
+                "type": job.backup_type,
+                "state": state,
+                "priority": self.effective_priority(job),
+                "resources": dict(job.resources),
+                "wait_time": job.wait_time,
+                "run_time": job.run_time,
+            } for job, state in jobs]
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import shutil
+import hashlib
+import logging
+import subprocess
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+# Relative, so it works whether lib is imported as lib, tools.lib or backup.tools.lib
+from .config import ConfigManager
+
+logger = logging.getLogger(__name__)
+
+# servers.yaml fields mirrored into server.config of an existing host
+CONNECTION_FIELDS = {"server_ip": "SERVER", "ssh_user": "USER", "ssh_port": "PORT"}
+
+class HostDiff:
+    """Difference between servers.yaml and the hosts in store/"""
+
+    def __init__(self, added: List[Dict[str, Any]], removed: List[str], modified: List[Dict[str, Any]]):
+        self.added = added
+        self.removed = removed
+        self.modified = modified
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.modified)
+
+    def __repr__(self) -> str:
+        return (f"HostDiff(added={[e['hostname'] for e in self.added]}, removed={self.removed}, "
+                f"modified={[e['hostname'] for e in self.modified]})")
+
+class HostReconciler:
+    """Keeps the hosts in store/ in sync with backup/config/servers.yaml
+
+    Reconciliation only runs when servers.yaml or the store/ directory
+    listing changed since the last run, and then applies just the
+    difference: new hosts are added, removed hosts are unmounted and
+    deleted, changed entries get their pattern files and connection
+    settings updated.
+    """
+
+    def __init__(self, base_dir: Optional[str] = None, config: Optional[ConfigManager] = None,
+                 allow_empty: Optional[bool] = None):
+        """Initialize the reconciler
+
+        Args:
+            base_dir: Base directory of SBE installation. If None, detect automatically.
+            config: Configuration manager to load servers.yaml with
+            allow_empty: Let a servers.yaml without hosts remove every host in
+                store/. Defaults to SERVERS_ALLOW_EMPTY=1 in the environment.
+        """
+        if base_dir:
+            self.base_dir = Path(base_dir)
+        else:
+            # Set base directory to the SBE root (3 levels up from this script)
+            self.base_dir = Path(__file__).resolve().parent.parent.parent.parent
+
+        self.store_dir = self.base_dir / "store"
+        self.servers_path = self.base_dir / "backup" / "config" / "servers.yaml"
+        self.add_host_script = self.base_dir / "backup" / "tools" / "add_host.py"
+        self.config = config or ConfigManager(str(self.base_dir))
+        if allow_empty is None:
+            allow_empty = os.environ.get("SERVERS_ALLOW_EMPTY", "0") == "1"
+        self.allow_empty = allow_empty
+
+        self._fingerprint = None
+        self._applied: Dict[str, Dict[str, Any]] = {}
+
+    def _current_fingerprint(self) -> Tuple:
+        """Stat signature of servers.yaml and the store/ directory listing"""
+        signature = []
+        for path in (self.servers_path, self.store_dir):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size, st.st_ino))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def existing_hosts(self) -> set:
+        """Returns a set of currently managed hostnames in store/"""
+        if not self.store_dir.exists():
+            return set()
+        return set(d.name for d in self.store_dir.iterdir() if d.is_dir() and not d.name.startswith('.'))
+
+    def diff(self, servers: List[Dict[str, Any]]) -> HostDiff:
+        """Compute the actions needed to match the given host entries
+
+        Args:
+            servers: Entries of servers.yaml
+
+        Returns:
+            HostDiff with added entries, removed hostnames and modified entries
+        """
+        wanted = {entry["hostname"]: entry for entry in servers if isinstance(entry, dict) and entry.get("hostname")}
+        existing = self.existing_hosts()
+
+        added = [entry for name, entry in wanted.items() if name not in existing]
+        removed = sorted(existing - set(wanted))
+        modified = [entry for name, entry in wanted.items()
+                    if name in existing and self._applied.get(name) != entry]
+        return HostDiff(added, removed, modified)
+
+    def reconcile(self, force: bool = False) -> Optional[HostDiff]:
+        """Apply servers.yaml to store/ if either changed
+
+        Args:
+            force: Reconcile even if nothing changed since the last run
+
+        Returns:
+            The applied HostDiff, or None if nothing was checked
+        """
+        fingerprint = self._current_fingerprint()
+        if not force and fingerprint == self._fingerprint:
+            return None
+
+        servers_config = self.config.load_servers_config()
+        if "servers" not in servers_config:
+            # Missing or unreadable servers.yaml must never remove hosts
+            if self._fingerprint != fingerprint:
+                logger.warning(f"No host definitions loaded from {self.servers_path}, skipping host sync")
+            self._fingerprint = fingerprint
+            return None
+        servers = servers_config.get("servers")
+        if not isinstance(servers, list):
+            servers = []
+        valid = [entry for entry in servers if isinstance(entry, dict) and entry.get("hostname")]
+        if not valid and self.existing_hosts() and not self.allow_empty:
+            # An empty, null or half-edited list must not wipe store/
+            if self._fingerprint != fingerprint:
+                logger.error(f"{self.servers_path} defines no hosts, refusing to remove all hosts in "
+                             f"{self.store_dir} (set SERVERS_ALLOW_EMPTY=1 to allow)")
+            self._fingerprint = fingerprint
+            return None
+
+        host_diff = self.diff(valid)
+        if host_diff:
+            logger.info(f"Syncing hosts with servers.yaml: {host_diff}")
+
+        failed = False
+        for entry in host_diff.added:
+            if self.add_host(entry):
+                self._applied[entry["hostname"]] = entry
+            else:
+                logger.error(f"Failed to add host {entry['hostname']}")
+                failed = True
+
+        for hostname in host_diff.removed:
+            logger.info(f"Removing host not in config: {hostname}")
+            self.unmount_and_remove_host(hostname)
+            self._applied.pop(hostname, None)
+
+        for entry in host_diff.modified:
+            self.update_host(entry)
+            self._applied[entry["hostname"]] = entry
+
+        # Our own changes to store/ must not trigger another run, failed adds are retried
+        self._fingerprint = None if failed else self._current_fingerprint()
+        return host_diff
+
+    def add_host(self, entry: Dict[str, Any]) -> bool:
+        """Run add_host.py with dict config for a host
+
+        Args:
+            entry: Host entry of servers.yaml
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            cmd = [
+                sys.executable, str(self.add_host_script),
+                '--hostname', entry['hostname'],
+                '--max-size', entry['max_size'],
+                '--ssh-user', entry['ssh_user'],
+                '--server-ip', entry['server_ip'],
+                '--ssh-port', str(entry.get('ssh_port', 22)),
+                '--non-interactive',
+            ]
+        except KeyError as e:
+            logger.error(f"Host entry {entry.get('hostname')} is missing {e}")
+            return False
+        if entry.get('encrypted', False):
+            cmd.append('--encrypted')
+        if entry.get('transfer_key', False):
+            cmd.append('--transfer-key')
+        if entry.get('run_backup', False):
+            cmd.append('--run-backup')
+        logger.info(f"Adding host: {' '.join(map(str, cmd))}")
+        res = subprocess.run(cmd, capture_output=True, text=True)
+        if res.returncode != 0:
+            logger.error(f"add_host.py failed: {res.stderr.strip()}")
+            return False
+
+        logger.info(f"add_host.py success: {res.stdout.strip()}")
+        self._update_pattern_files(entry)
+        return True
+
+    def update_host(self, entry: Dict[str, Any]) -> None:
+        """Apply a changed servers.yaml entry to an existing host
+
+        Args:
+            entry: Host entry of servers.yaml
+        """
+        self._update_pattern_files(entry)
+
+        hostname = entry["hostname"]
+        config_path = self.store_dir / hostname / "server.config"
+        if not config_path.exists():
+            return
+
+        updates = {key: str(entry[field]) for field, key in CONNECTION_FIELDS.items() if field in entry}
+        with open(config_path, "r") as f:
+            lines = f.readlines()
+
+        changed = False
+        new_lines = []
+        for line in lines:
+            key, _, value = line.strip().partition("=")
+            key = key.strip()
+            if key in updates:
+                if value.strip().strip('"\'') != updates[key]:
+                    line = f"{key}=\"{updates[key]}\"\n"
+                    changed = True
+                updates.pop(key)
+            new_lines.append(line)
+        for key, value in updates.items():
+            new_lines.append(f"{key}=\"{value}\"\n")
+            changed = True
+
+        if changed:
+            with open(config_path, "w") as f:
+                f.writelines(new_lines)
+            logger.info(f"Updated connection settings in {config_path}")
+
+    def _update_pattern_files(self, entry: Dict[str, Any]) -> None:
+        """Write include/exclude lists of an entry to the host directory"""
+        hostname = entry['hostname']
+        host_dir = self.store_dir / hostname
+
+        def upsert_list_file(filename, lines):
+            path = host_dir / filename
+            new_content = "\n".join(lines or []) + "\n" if lines else ""
+            if path.exists():
+                with open(path, "r") as f:
+                    existing = f.read()
+                if existing == new_content:
+                    return False  # No change
+            if lines is not None:
+                with open(path, "w") as f:
+                    f.write(new_content)
+                return True
+            return False
+
+        if 'include' in entry:
+            if upsert_list_file("include.txt", entry.get('include')):
+                logger.info(f"Updated include.txt for {hostname}")
+        if 'exclude' in entry:
+            if upsert_list_file("exclude.txt", entry.get('exclude')):
+                logger.info(f"Updated exclude.txt for {hostname}")
+
+    def unmount_and_remove_host(self, hostname: str) -> None:
+        """Unmount, close luks, and remove the store dir for a host
+
+        Args:
+            hostname: Name of the host
+        """
+        server_dir = self.store_dir / hostname
+        mount_dir = server_dir / ".mounted"
+        # Try to unmount (ignore errors)
+        if mount_dir.exists():
+            subprocess.run(["umount", str(mount_dir)], capture_output=True)
+        # Try to close LUKS device per add_host.py logic
+        h = hashlib.md5(hostname.encode()).hexdigest()[:8]
+        device_name = f"sbe_{h}_mapper"
+        # Attempt LUKS close, ignore errors
+        subprocess.run(["cryptsetup", "luksClose", device_name], capture_output=True)
+        subprocess.run(["dmsetup", "remove", "-f", device_name], capture_output=True)
+        # Remove directory
+        if server_dir.exists():
+            logger.info(f"Removing backup dir: {server_dir}")
+            shutil.rmtree(server_dir)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import fcntl
+import socket
+import logging
+import threading
+from pathlib import Path
+from typing import Optional, Callable, Union
+
+from .ledger import JobLedger
+
+logger = logging.getLogger(__name__)
+
+def default_holder() -> str:
+    """Identity of this scheduler process, e.g. host:1234"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class FileLease:
+    """Leadership held as an exclusive flock on a file
+
+    The kernel drops the lock the moment the holding process dies, so a
+    standby on the same host (or a filesystem with working locks) takes
+    over on its next attempt. The file names the current holder.
+    """
+
+    def __init__(self, path: Union[str, Path], holder: Optional[str] = None):
+        """Initialize the lease
+
+        Args:
+            path: Lock file
+            holder: Identity written into the file, defaults to host:pid
+        """
+        self.path = Path(path)
+        self.holder = holder or default_holder()
+        self._fd: Optional[int] = None
+
+    def acquire(self) -> bool:
+        """Try to take the lease without blocking
+
+        Returns:
+            True if this process holds the lease
+        """
+        if self._fd is not None:
+            return self.renew()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        self._write()
+        return True
+
+    def renew(self) -> bool:
+        """Refresh the holder record; the lock itself needs no renewal
+
+        Returns:
+            True if this process still holds the lease
+        """
+        if self._fd is None:
+            return False
+        try:
+            self._write()
+        except OSError as e:
+            logger.warning(f"Cannot update lease file {self.path}: {e}")
+        return True
+
+    def release(self) -> None:
+        """Give up the lease"""
+        if self._fd is None:
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+    def current_holder(self) -> Optional[str]:
+        """Holder named in the lock file, None if there is none"""
+        try:
+            return self.path.read_text().split()[0]
+        except (OSError, IndexError):
+            return None
+
+    def _write(self) -> None:
+        os.ftruncate(self._fd, 0)
+        os.pwrite(self._fd, f"{self.holder} {time.strftime('%Y-%m-%d %H:%M:%S')}\n".encode(), 0)
+
+class LedgerLease:
+    """Leadership held as an expiring row in the job ledger
+
+    Works wherever the ledger is shared, also across hosts. A leader that
+    hangs or loses the storage stops renewing, and a standby takes over
+    once `seconds` have passed.
+    """
+
+    def __init__(self, ledger: JobLedger, seconds: float, holder: Optional[str] = None,
+                 name: str = "scheduler"):
+        """Initialize the lease
+
+        Args:
+            ledger: Shared job ledger
+            seconds: Lifetime of the lease without renewal
+            holder: Identity of this process, defaults to host:pid
+            name: Name of the lease row
+        """
+        self.ledger = ledger
+        self.seconds = seconds
+        self.holder = holder or default_holder()
+        self.name = name
+
+    def acquire(self) -> bool:
+        """Try to take or renew the lease
+
+        Returns:
+            True if this process holds the lease
+        """
+        return self.ledger.acquire_lease(self.name, self.holder, self.seconds)
+
+    def renew(self) -> bool:
+        """Extend the lease
+
+        Returns:
+            True if this process still holds the lease
+        """
+        return self.ledger.acquire_lease(self.name, self.holder, self.seconds, renew_only=True)
+
+    def release(self) -> None:
+        """Give up the lease"""
+        self.ledger.release_lease(self.name, self.holder)
+
+    def current_holder(self) -> Optional[str]:
+        """Holder of an unexpired lease, None if there is none"""
+        return self.ledger.lease_holder(self.name)
+
+class LeaderElection:
+    """Waits for a lease and keeps renewing it while this process leads
+
+    A standby scheduler blocks in wait() until the leader's lease is
+    free, then renews it from a daemon thread. If a renewal fails, the
+    lease is lost and `on_lost` is called; the process should stop
+    scheduling right away because another one may have taken over.
+    """
+
+    def __init__(self, lease: Union[FileLease, LedgerLease], interval: float = 5,
+                 on_lost: Optional[Callable[[], None]] = None):
+        """Initialize the election
+
+        Args:
+            lease: Lease to hold
+            interval: Seconds between acquisition attempts and renewals
+            on_lost: Called when a renewal fails
+        """
+        self.lease = lease
+        self.interval = interval
+        self.on_lost = on_lost
+        self.leading = False
+        self._stop = threading.Event()
+
+    def wait(self, stop: Optional[threading.Event] = None) -> bool:
+        """Block until this process holds the lease
+
+        Args:
+            stop: Event that aborts waiting
+
+        Returns:
+            True if leading, False if aborted
+        """
+        announced = False
+        while not (stop is not None and stop.is_set()):
+            try:
+                if self.lease.acquire():
+                    self.leading = True
+                    threading.Thread(target=self._renew_loop, name="sbe-leader", daemon=True).start()
+                    return True
+            except Exception as e:
+                logger.error(f"Error acquiring leader lease: {e}")
+            if not announced:
+                logger.info(f"Standing by, {self.lease.current_holder() or 'another scheduler'} is leading")
+                announced = True
+            if stop is not None:
+                stop.wait(self.interval)
+            else:
+                time.sleep(self.interval)
+        return False
+
+    def release(self) -> None:
+        """Stop renewing and give up the lease"""
+        self._stop.set()
+        if self.leading:
+            self.leading = False
+            try:
+                self.lease.release()
+            except Exception as e:
+                logger.error(f"Error releasing leader lease: {e}")
+
+    def _renew_loop(self) -> None:
+        # Errors are retried until an expiring lease may have passed to a standby
+        lifetime = getattr(self.lease, "seconds", None)
+        renewed_at = time.monotonic()
+        while not self._stop.wait(self.interval):
+            try:
+                renewed = self.lease.renew()
+                if renewed:
+                    renewed_at = time.monotonic()
+            except Exception as e:
+                logger.error(f"Error renewing leader lease: {e}")
+                renewed = lifetime is None or time.monotonic() - renewed_at < lifetime
+            if not renewed:
+                logger.error("Lost the leader lease")
+                self.leading = False
+                if self.on_lost is not None:
+                    self.on_lost()
+                return
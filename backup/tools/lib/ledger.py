@@ -0,0 +1,541 @@
+#!/usr/bin/env python3
+
+import os
+import sqlite3
+import contextlib
+import logging
+import datetime
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+SUCCESS = "success"
+FAILED = "failed"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+# Legacy flat files replaced by the ledger
+FLAT_FILES = ["SBE-queue", "SBE-queue-run", "SBE-done"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    directory TEXT NOT NULL,
+    type TEXT NOT NULL,
+    state TEXT NOT NULL,
+    pid INTEGER,
+    queued_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    return_code INTEGER,
+    bytes INTEGER,
+    priority INTEGER NOT NULL DEFAULT 0,
+    node TEXT,
+    lease_expires TEXT,  -- UTC
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_lookup ON jobs (directory, type, state);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at);
+CREATE INDEX IF NOT EXISTS jobs_lease ON jobs (state, lease_expires);
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_active ON jobs (directory, type)
+    WHERE state IN ('queued', 'running');
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires TEXT NOT NULL  -- UTC
+);
+CREATE TABLE IF NOT EXISTS last_success (
+    directory TEXT NOT NULL,
+    type TEXT NOT NULL,
+    queued_at TEXT NOT NULL,
+    PRIMARY KEY (directory, type)
+);
+"""
+
+# Columns added after the first release, with their definitions
+COLUMNS = {
+    "bytes": "INTEGER",
+    "priority": "INTEGER NOT NULL DEFAULT 0",
+    "node": "TEXT",
+    "lease_expires": "TEXT",
+    "attempts": "INTEGER NOT NULL DEFAULT 0",
+}
+
+# Keeps last_success independent of history pruning
+RECORD_SUCCESS = """
+INSERT OR REPLACE INTO last_success (directory, type, queued_at)
+SELECT directory, type, MAX(queued_at) FROM jobs WHERE state = 'success' {where} GROUP BY directory, type
+"""
+
+def default_ledger_path(reports_dir: Path) -> Path:
+    """Location of the job ledger (LEDGER_PATH overrides REPORTS_DIR/SBE-ledger.db)"""
+    return Path(os.environ.get("LEDGER_PATH", str(Path(reports_dir) / "SBE-ledger.db")))
+
+def _timestamp(seconds: float = 0) -> str:
+    """Current time, or `seconds` from now, in the ledger's format"""
+    return (datetime.datetime.now() + datetime.timedelta(seconds=seconds)).strftime("%Y-%m-%d %H:%M:%S")
+
+def _lease_deadline(seconds: float = 0) -> str:
+    """Current UTC time, or `seconds` from now, for lease columns
+
+    Leases are compared across nodes and must not jump when local time
+    does at a DST change.
+    """
+    deadline = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=seconds)
+    return deadline.strftime("%Y-%m-%d %H:%M:%S")
+
+def pid_alive(pid: Optional[int]) -> bool:
+    """Check if a process exists"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)  # Signal 0 just checks if process exists
+        return True
+    except OSError:
+        return False
+
+class JobLedger:
+    """Transactional record of queued, running and finished backup jobs
+
+    Backed by SQLite in WAL mode so the status tool can read while the
+    scheduler writes. At most one queued or running job exists per
+    (directory, type), enforced by a partial unique index.
+
+    Several schedulers can share one ledger. Each node then claims queued
+    jobs under a lease it renews with heartbeats; jobs whose lease ran out
+    because their node died are put back into the queue for the others.
+    """
+
+    def __init__(self, path: Path, history_limit: Optional[int] = None,
+                 journal_mode: Optional[str] = None):
+        """Open or create the ledger
+
+        Args:
+            path: Path of the SQLite database
+            history_limit: Number of finished jobs to keep. Defaults to LEDGER_HISTORY or 10000.
+            journal_mode: SQLite journal mode. Defaults to LEDGER_JOURNAL_MODE or WAL;
+                use DELETE for a ledger on network storage shared by several hosts.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.history_limit = history_limit or int(os.environ.get("LEDGER_HISTORY", "10000"))
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        journal_mode = journal_mode or os.environ.get("LEDGER_JOURNAL_MODE", "WAL")
+        self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, definition in COLUMNS.items():
+            if columns and column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+        self._conn.executescript(SCHEMA)
+        self._finished_since_prune = 0
+        if not self._conn.execute("SELECT 1 FROM last_success LIMIT 1").fetchone():
+            with self._transaction() as conn:
+                conn.execute(RECORD_SUCCESS.format(where=""))
+
+    def close(self) -> None:
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Lock the connection and run the block in an immediate write transaction"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def enqueue(self, directory: str, backup_type: str, priority: int = 0) -> Optional[int]:
+        """Add a job to the queue
+
+        Args:
+            directory: Backup directory
+            backup_type: Type of backup
+            priority: Claim priority, higher is claimed first
+
+        Returns:
+            Job id, or None if the same job is already queued or running
+        """
+        try:
+            with self._transaction() as conn:
+                cursor = conn.execute(
+                    "INSERT INTO jobs (directory, type, state, queued_at, priority) VALUES (?, ?, ?, ?, ?)",
+                    (directory, backup_type, QUEUED, _timestamp(), priority)
+                )
+                return cursor.lastrowid
+        except sqlite3.IntegrityError:
+            return None
+
+    def start(self, job_id: int, pid: int) -> None:
+        """Mark a queued job as running
+
+        Args:
+            job_id: Job id
+            pid: Process ID of the backup process
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, pid = ?, started_at = ? WHERE id = ?",
+                (RUNNING, pid, _timestamp(), job_id)
+            )
+
+    def claim(self, node: str, lease_seconds: float, limit: int = 1,
+              one_per_directory: bool = True) -> List[Dict[str, Any]]:
+        """Take queued jobs for a node under a lease
+
+        Jobs are claimed by priority, then in queue order. A claimed job is
+        running on that node until it completes or its lease expires.
+
+        Args:
+            node: Identifier of the claiming scheduler
+            lease_seconds: Time the node has to renew the lease with heartbeat()
+            limit: Maximum number of jobs to claim
+            one_per_directory: Skip directories that already have a running job on any node
+
+        Returns:
+            Claimed job rows
+        """
+        if limit <= 0:
+            return []
+        with self._transaction() as conn:
+            busy = set()
+            if one_per_directory:
+                busy = {row[0] for row in conn.execute("SELECT directory FROM jobs WHERE state = ?", (RUNNING,))}
+            claimed = []
+            for row in conn.execute("SELECT id, directory FROM jobs WHERE state = ? ORDER BY priority DESC, id",
+                                    (QUEUED,)).fetchall():
+                if len(claimed) >= limit:
+                    break
+                if row["directory"] in busy:
+                    continue
+                if one_per_directory:
+                    busy.add(row["directory"])
+                claimed.append(row["id"])
+            conn.executemany(
+                "UPDATE jobs SET state = ?, node = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                [(RUNNING, node, _lease_deadline(lease_seconds), job_id) for job_id in claimed]
+            )
+            return [dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+                    for job_id in claimed]
+
+    def heartbeat(self, node: str, lease_seconds: float) -> int:
+        """Renew the leases of all running jobs of a node
+
+        Returns:
+            Number of renewed leases
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE node = ? AND state = ?",
+                (_lease_deadline(lease_seconds), node, RUNNING)
+            )
+            return cursor.rowcount
+
+    def requeue_expired(self, max_attempts: int = 3) -> int:
+        """Put running jobs whose lease expired back into the queue
+
+        Jobs that already used up `max_attempts` claims are failed instead.
+
+        Returns:
+            Number of requeued jobs
+        """
+        with self._transaction() as conn:
+            now = _lease_deadline()
+            expired = conn.execute(
+                "SELECT id, directory, type, node, attempts FROM jobs "
+                "WHERE state = ? AND lease_expires IS NOT NULL AND lease_expires < ?",
+                (RUNNING, now)
+            ).fetchall()
+            requeued = 0
+            for job in expired:
+                if job["attempts"] >= max_attempts:
+                    logger.warning(f"Lease of job {job['id']} ({job['directory']}/{job['type']}) on "
+                                   f"{job['node']} expired after {job['attempts']} attempts, failing it")
+                    conn.execute("UPDATE jobs SET state = ?, finished_at = ? WHERE id = ?",
+                                 (FAILED, _timestamp(), job["id"]))
+                else:
+                    logger.warning(f"Lease of job {job['id']} ({job['directory']}/{job['type']}) on "
+                                   f"{job['node']} expired, requeueing it")
+                    conn.execute(
+                        "UPDATE jobs SET state = ?, node = NULL, lease_expires = NULL, pid = NULL, "
+                        "started_at = NULL WHERE id = ?",
+                        (QUEUED, job["id"])
+                    )
+                    requeued += 1
+            return requeued
+
+    def requeue_node(self, node: str) -> int:
+        """Put the running jobs of a node back into the queue, e.g. after it restarted
+
+        Returns:
+            Number of requeued jobs
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = ?, node = NULL, lease_expires = NULL, pid = NULL, started_at = NULL "
+                "WHERE node = ? AND state = ?",
+                (QUEUED, node, RUNNING)
+            )
+            return cursor.rowcount
+
+    def acquire_lease(self, name: str, holder: str, seconds: float, renew_only: bool = False) -> bool:
+        """Take or extend a named lease, e.g. the leadership of the scheduler
+
+        Args:
+            name: Lease name
+            holder: Identity of the caller
+            seconds: Lifetime of the lease from now
+            renew_only: Only extend a lease the caller already holds
+
+        Returns:
+            True if the caller holds the lease
+        """
+        with self._transaction() as conn:
+            row = conn.execute("SELECT holder, expires FROM leases WHERE name = ?", (name,)).fetchone()
+            if row is not None and row["holder"] != holder and row["expires"] >= _lease_deadline():
+                return False
+            if renew_only and (row is None or row["holder"] != holder):
+                return False
+            conn.execute("INSERT OR REPLACE INTO leases (name, holder, expires) VALUES (?, ?, ?)",
+                         (name, holder, _lease_deadline(seconds)))
+            return True
+
+    def release_lease(self, name: str, holder: str) -> None:
+        """Drop a named lease if the caller holds it"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+    def lease_holder(self, name: str) -> Optional[str]:
+        """Holder of an unexpired named lease, None if it is free"""
+        with self._lock:
+            row = self._conn.execute("SELECT holder FROM leases WHERE name = ? AND expires >= ?",
+                                     (name, _lease_deadline())).fetchone()
+        return row["holder"] if row else None
+
+    def complete(self, job_id: int, success: bool, return_code: Optional[int] = None,
+                 transferred: Optional[int] = None, node: Optional[str] = None) -> bool:
+        """Mark a job as finished
+
+        Args:
+            job_id: Job id
+            success: Whether backup was successful
+            return_code: Exit code of the backup process
+            transferred: Bytes received from the remote host
+            node: Only complete the job if this node still holds its lease
+
+        Returns:
+            True if the job was updated, False if its lease went to another node
+        """
+        query = "UPDATE jobs SET state = ?, return_code = ?, finished_at = ?, bytes = ?, lease_expires = NULL WHERE id = ?"
+        params: tuple = (SUCCESS if success else FAILED, return_code, _timestamp(), transferred, job_id)
+        if node is not None:
+            query += " AND node = ? AND state = ?"
+            params += (node, RUNNING)
+        with self._transaction() as conn:
+            if not conn.execute(query, params).rowcount:
+                return False
+            if success:
+                conn.execute(
+                    RECORD_SUCCESS.format(where="AND (directory, type) = "
+                                                "(SELECT directory, type FROM jobs WHERE id = ?)"),
+                    (job_id,)
+                )
+        self._finished_since_prune += 1
+        if self._finished_since_prune >= 100:
+            self.prune()
+        return True
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Look up a job by id"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def jobs(self, state: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """List jobs in a state, oldest first
+
+        Args:
+            state: Job state
+            limit: Maximum number of jobs to return
+
+        Returns:
+            List of job rows
+        """
+        query = "SELECT * FROM jobs WHERE state = ? ORDER BY id"
+        params: tuple = (state,)
+        if limit is not None:
+            query += " LIMIT ?"
+            params += (limit,)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(query, params)]
+
+    def count(self, state: str) -> int:
+        """Number of jobs in a state"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE state = ?", (state,)).fetchone()[0]
+
+    def recent(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Most recently finished jobs, oldest first
+
+        Args:
+            limit: Number of jobs to return
+
+        Returns:
+            List of job rows
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE state IN (?, ?) ORDER BY finished_at DESC, id DESC LIMIT ?",
+                (SUCCESS, FAILED, limit)
+            ).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    def last_successes(self) -> Dict[Tuple[str, str], datetime.datetime]:
+        """Queue time of the last successful run per (directory, type)
+
+        Returns:
+            Dict mapping (directory, type) to the time the job was queued
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT directory, type, queued_at FROM last_success").fetchall()
+        last = {}
+        for row in rows:
+            try:
+                last[(row["directory"], row["type"])] = datetime.datetime.strptime(
+                    row["queued_at"], "%Y-%m-%d %H:%M:%S")
+            except ValueError:
+                logger.warning(f"Ignoring invalid timestamp {row['queued_at']!r} of {row['directory']}")
+        return last
+
+    def average_durations(self, runs: int = 5) -> Dict[Tuple[str, str], float]:
+        """Average run time of the last successful runs per (directory, type)
+
+        Args:
+            runs: Number of recent runs to average
+
+        Returns:
+            Dict mapping (directory, type) to seconds
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT directory, type, AVG(seconds) FROM ("
+                "  SELECT directory, type, (julianday(finished_at) - julianday(started_at)) * 86400 AS seconds,"
+                "         ROW_NUMBER() OVER (PARTITION BY directory, type ORDER BY id DESC) AS age"
+                "  FROM jobs WHERE state = ? AND started_at IS NOT NULL AND finished_at IS NOT NULL"
+                ") WHERE age <= ? GROUP BY directory, type",
+                (SUCCESS, runs)
+            ).fetchall()
+        return {(row[0], row[1]): row[2] for row in rows if row[2] is not None}
+
+    def abandon_active(self) -> int:
+        """Fail every queued or running job, e.g. those left over by a previous scheduler
+
+        Returns:
+            Number of jobs marked as failed
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = ?, finished_at = ? WHERE state IN (?, ?)",
+                (FAILED, _timestamp()) + ACTIVE_STATES
+            )
+            return cursor.rowcount
+
+    def clean_orphans(self, node: Optional[str] = None) -> int:
+        """Fail running jobs whose process no longer exists
+
+        Jobs leased by other nodes run on other hosts and are left alone, as
+        are leased jobs still waiting for a slot on their node.
+
+        Args:
+            node: Identifier of this node, None if the ledger is not shared
+
+        Returns:
+            Number of jobs marked as failed
+        """
+        orphans = [job["id"] for job in self.jobs(RUNNING)
+                   if job["node"] in (None, node) and (job["pid"] or job["node"] is None)
+                   and not pid_alive(job["pid"])]
+        if orphans:
+            with self._transaction() as conn:
+                conn.executemany(
+                    "UPDATE jobs SET state = ?, finished_at = ? WHERE id = ? AND state = ?",
+                    [(FAILED, _timestamp(), job_id, RUNNING) for job_id in orphans]
+                )
+        return len(orphans)
+
+    def prune(self) -> int:
+        """Drop finished jobs beyond the history limit
+
+        Returns:
+            Number of jobs removed
+        """
+        self._finished_since_prune = 0
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE state IN (?, ?) AND id NOT IN "
+                "(SELECT id FROM jobs WHERE state IN (?, ?) ORDER BY id DESC LIMIT ?)",
+                (SUCCESS, FAILED, SUCCESS, FAILED, self.history_limit)
+            )
+            return cursor.rowcount
+
+    def migrate_flat_files(self, reports_dir: Path) -> int:
+        """Import the SBE-queue/SBE-queue-run/SBE-done files and retire them
+
+        Finished jobs from SBE-done are imported as history. Queue entries
+        belonged to a scheduler that is no longer running and are dropped.
+        Each file is renamed to <name>.migrated afterwards.
+
+        Args:
+            reports_dir: Directory containing the flat files
+
+        Returns:
+            Number of imported jobs
+        """
+        reports_dir = Path(reports_dir)
+        imported = 0
+        for name in FLAT_FILES:
+            flat_path = reports_dir / name
+            if not flat_path.exists():
+                continue
+
+            if name == "SBE-done":
+                rows = []
+                with open(flat_path, "r") as f:
+                    for line in f:
+                        parts = [part.strip() for part in line.split(";")]
+                        if len(parts) < 5 or not parts[2]:
+                            continue
+                        try:
+                            pid = int(parts[0])
+                        except ValueError:
+                            pid = None
+                        state = SUCCESS if parts[4] == "SUCCESS" else FAILED
+                        rows.append((parts[2], parts[3], state, pid, parts[1], parts[1]))
+                with self._transaction() as conn:
+                    conn.executemany(
+                        "INSERT INTO jobs (directory, type, state, pid, queued_at, finished_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        rows
+                    )
+                    conn.execute(RECORD_SUCCESS.format(where=""))
+                imported += len(rows)
+
+            flat_path.rename(flat_path.with_name(name + ".migrated"))
+
+        if imported:
+            logger.info(f"Imported {imported} finished jobs from flat queue files")
+            self.prune()
+        return imported
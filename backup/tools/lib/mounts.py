@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Callable, Set
+
+logger = logging.getLogger(__name__)
+
+class MountSession:
+    """A host's backup image kept open for its queued and running jobs"""
+
+    def __init__(self, host: str):
+        self.host = host
+        self.references = 0
+        self.idle_since: Optional[float] = None
+        self.jobs = 0
+
+    def __repr__(self) -> str:
+        return f"MountSession({self.host}, refs={self.references}, jobs={self.jobs})"
+
+class MountSessionManager:
+    """Reference-counted mount sessions with an idle timeout
+
+    Every queued or running job holds a reference to its host's session.
+    The backup processes leave the image mounted (--keep-mounted) and the
+    image is only unmounted once no job has referenced it for
+    `idle_timeout` seconds, so jobs of one host that follow each other
+    share a single LUKS unlock and mount.
+
+    Jobs of a host whose image is still being unmounted must not start
+    (see `is_closing`); `on_unmounted` tells when they can.
+    """
+
+    def __init__(self, unmount: Callable[[str], None], idle_timeout: float = 300,
+                 clock: Callable[[], float] = time.monotonic,
+                 on_unmounted: Optional[Callable[[str], None]] = None):
+        """Initialize the manager
+
+        Args:
+            unmount: Called with a host to unmount its image
+            idle_timeout: Seconds an unreferenced image stays mounted
+            clock: Time source in seconds
+            on_unmounted: Called with a host once its unmount is done, failed or not
+        """
+        self.unmount = unmount
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self.on_unmounted = on_unmounted
+        self._sessions: Dict[str, MountSession] = {}
+        # Hosts being unmounted
+        self._closing: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def acquire(self, host: str) -> None:
+        """Reference a host's session for a queued job"""
+        with self._lock:
+            session = self._sessions.setdefault(host, MountSession(host))
+            session.references += 1
+            session.jobs += 1
+            session.idle_since = None
+
+    def release(self, host: str) -> None:
+        """Drop the reference of a finished job; the image becomes idle at zero"""
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None or session.references == 0:
+                logger.warning(f"Released mount session of {host} that holds no reference")
+                return
+            session.references -= 1
+            if session.references == 0:
+                session.idle_since = self.clock()
+        if self.idle_timeout <= 0:
+            self.expire()
+
+    def adopt(self, host: str) -> None:
+        """Track an image found mounted, e.g. after a restart, so it is unmounted when idle"""
+        with self._lock:
+            if host not in self._sessions:
+                session = self._sessions[host] = MountSession(host)
+                session.idle_since = self.clock()
+
+    def expire(self) -> List[str]:
+        """Unmount images that have been idle for longer than the timeout
+
+        Returns:
+            Hosts that were unmounted
+        """
+        now = self.clock()
+        with self._lock:
+            expired = [session for session in self._sessions.values()
+                       if session.references == 0 and now - session.idle_since >= self.idle_timeout]
+            self._detach(expired)
+        return self._unmount(expired)
+
+    def close_all(self) -> List[str]:
+        """Unmount every idle image regardless of the timeout
+
+        Returns:
+            Hosts that were unmounted
+        """
+        with self._lock:
+            idle = [session for session in self._sessions.values() if session.references == 0]
+            self._detach(idle)
+        return self._unmount(idle)
+
+    def is_closing(self, host: str) -> bool:
+        """Check if an expired session of a host is still being unmounted
+
+        A backup of the host must wait, so it does not mount the image
+        while it is being torn down.
+        """
+        with self._lock:
+            return host in self._closing
+
+    def sessions(self) -> List[MountSession]:
+        """Open sessions"""
+        with self._lock:
+            return list(self._sessions.values())
+
+    def start(self, interval: Optional[float] = None) -> None:
+        """Expire idle sessions from a daemon thread
+
+        Args:
+            interval: Seconds between checks, defaults to a tenth of the timeout
+        """
+        if self._thread is not None:
+            return
+        interval = interval or max(1.0, min(60.0, self.idle_timeout / 10))
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="sbe-mounts", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop expiring sessions"""
+        self._stop.set()
+
+    def _run(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.expire()
+            except Exception as e:
+                logger.error(f"Error expiring mount sessions: {e}")
+
+    def _detach(self, sessions: List[MountSession]) -> None:
+        """Move sessions to the closing state (called with the lock held)"""
+        for session in sessions:
+            del self._sessions[session.host]
+            self._closing.add(session.host)
+
+    def _unmount(self, sessions: List[MountSession]) -> List[str]:
+        hosts = []
+        for session in sessions:
+            logger.info(f"Unmounting idle backup image of {session.host} (used by {session.jobs} jobs)")
+            try:
+                self.unmount(session.host)
+                hosts.append(session.host)
+            except Exception as e:
+                logger.error(f"Error unmounting {session.host}: {e}")
+            finally:
+                with self._lock:
+                    self._closing.discard(session.host)
+            if self.on_unmounted is not None:
+                self.on_unmounted(session.host)
+        return hosts
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+import time
+import queue
+import logging
+import subprocess
+import threading
+from pathlib import Path
+from typing import List, Optional, Callable, Union
+
+logger = logging.getLogger(__name__)
+
+# Longest line kept in a mail body
+MAX_LINE_LENGTH = 500
+
+def truncate_body(body: str, max_lines: int) -> str:
+    """Keep the last lines of a body and shorten overlong lines
+
+    Args:
+        body: Text to truncate
+        max_lines: Number of lines to keep, 0 for all
+
+    Returns:
+        Truncated text with a note about omitted lines
+    """
+    lines = body.splitlines()
+    omitted = 0
+    if max_lines and len(lines) > max_lines:
+        omitted = len(lines) - max_lines
+        lines = lines[-max_lines:]
+    lines = [line if len(line) <= MAX_LINE_LENGTH else line[:MAX_LINE_LENGTH] + " [...]" for line in lines]
+    if omitted:
+        lines.insert(0, f"[... {omitted} earlier lines omitted]")
+    return "\n".join(lines)
+
+class Notification:
+    """A queued message"""
+
+    def __init__(self, subject: str, body: str, log_path: Optional[Union[str, Path]] = None,
+                 digest: bool = True):
+        """Initialize a notification
+
+        Args:
+            subject: Mail subject
+            body: Mail body, truncated before sending
+            log_path: Full log of the event, referenced in the mail
+            digest: Whether the message may be coalesced with others
+        """
+        self.subject = subject
+        self.body = body
+        self.log_path = log_path
+        self.digest = digest
+        self.created = time.strftime("%Y-%m-%d %H:%M:%S")
+
+class SendmailTransport:
+    """Delivers a mail by piping it into sendmail"""
+
+    def __init__(self, sendmail_path: str, recipient: str):
+        """Initialize the transport
+
+        Args:
+            sendmail_path: Path of the sendmail binary
+            recipient: Mail recipient
+        """
+        self.sendmail_path = sendmail_path
+        self.recipient = recipient
+
+    def __call__(self, subject: str, body: str) -> bool:
+        """Send a mail
+
+        Returns:
+            True if sendmail accepted the mail
+        """
+        try:
+            process = subprocess.Popen(
+                [self.sendmail_path, self.recipient],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
+            )
+
+            message = f"Subject: {subject}\n\n{body}"
+            stdout, stderr = process.communicate(input=message, timeout=120)
+
+            if process.returncode != 0:
+                logger.error(f"Failed to send email: {stderr}")
+                return False
+            return True
+        except Exception as e:
+            logger.error(f"Error sending email: {str(e)}")
+            return False
+
+class Notifier:
+    """Queues notifications and delivers them from a background thread
+
+    Callers never wait for mail delivery. Digest notifications arriving
+    within `digest_interval` seconds of the first one are sent together
+    as one mail; others are sent right away. Bodies are cut to the last
+    `tail_lines` lines and point to the full log instead.
+    """
+
+    def __init__(self, transport: Callable[[str, str], bool], digest_interval: float = 300,
+                 tail_lines: int = 40):
+        """Initialize the notifier
+
+        Args:
+            transport: Callable sending (subject, body)
+            digest_interval: Seconds to collect digest notifications, 0 to send each one
+            tail_lines: Lines of each body kept in the mail
+        """
+        self.transport = transport
+        self.digest_interval = digest_interval
+        self.tail_lines = tail_lines
+        self._queue: queue.Queue = queue.Queue()
+        self._pending: List[Notification] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def start(self) -> None:
+        """Start the delivery thread"""
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="sbe-notify", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30) -> None:
+        """Deliver everything queued and stop the delivery thread"""
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def notify(self, subject: str, body: str, log_path: Optional[Union[str, Path]] = None,
+               digest: bool = True) -> None:
+        """Queue a notification
+
+        Args:
+            subject: Mail subject
+            body: Mail body
+            log_path: Full log of the event, referenced in the mail
+            digest: Whether the message may be coalesced with others
+        """
+        self._queue.put(Notification(subject, body, log_path, digest))
+        if self._thread is None:
+            self.start()
+
+    def _run(self) -> None:
+        """Deliver queued notifications until stopped"""
+        flush_at = None
+        while True:
+            timeout = None if flush_at is None else max(0.0, flush_at - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+                if not self._stopping:
+                    self._flush()
+                    flush_at = None
+                    continue
+
+            if item is None and self._stopping:
+                self._flush()
+                return
+
+            if item.digest and self.digest_interval > 0:
+                if not self._pending:
+                    flush_at = time.monotonic() + self.digest_interval
+                self._pending.append(item)
+            else:
+                self._deliver(item.subject, self._format(item))
+
+    def _flush(self) -> None:
+        """Send the collected digest notifications"""
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        if len(pending) == 1:
+            self._deliver(pending[0].subject, self._format(pending[0]))
+            return
+
+        subjects = "\n".join(f"- {item.created} {item.subject}" for item in pending)
+        sections = "\n\n".join(f"=== {item.subject} ===\n{self._format(item)}" for item in pending)
+        self._deliver(f"SBE: {len(pending)} notifications",
+                      f"{len(pending)} events since {pending[0].created}:\n{subjects}\n\n{sections}")
+
+    def _format(self, item: Notification) -> str:
+        """Truncated body of a notification with the path of its full log"""
+        body = truncate_body(item.body, self.tail_lines)
+        if item.log_path:
+            body += f"\n\nFull log: {item.log_path}"
+        return body
+
+    def _deliver(self, subject: str, body: str) -> None:
+        """Hand a mail to the transport, never raising"""
+        try:
+            self.transport(subject, body)
+        except Exception as e:
+            logger.error(f"Error sending notification {subject!r}: {e}")
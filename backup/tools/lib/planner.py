@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+import heapq
+import logging
+from typing import List, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+class PlannedJob:
+    """A job placed on a worker lane of a plan"""
+
+    def __init__(self, key: Hashable, lane: int, start: float, duration: float):
+        """Initialize a planned job
+
+        Args:
+            key: Identity of the job
+            lane: Worker lane the job runs on
+            start: Start in seconds after the plan begins
+            duration: Predicted duration in seconds
+        """
+        self.key = key
+        self.lane = lane
+        self.start = start
+        self.duration = duration
+
+    @property
+    def end(self) -> float:
+        """Predicted end in seconds after the plan begins"""
+        return self.start + self.duration
+
+    def __repr__(self) -> str:
+        return f"PlannedJob({self.key!r}, lane={self.lane}, start={self.start:.0f}, end={self.end:.0f})"
+
+class Plan:
+    """Predicted start and end of jobs packed onto a number of workers"""
+
+    def __init__(self, jobs: List[PlannedJob], workers: int):
+        """Initialize a plan
+
+        Args:
+            jobs: Planned jobs in start order
+            workers: Number of worker lanes
+        """
+        self.jobs = jobs
+        self.workers = workers
+
+    @property
+    def makespan(self) -> float:
+        """Seconds from the first start to the last predicted end"""
+        return max((job.end for job in self.jobs), default=0.0)
+
+    def fits(self, window: float) -> bool:
+        """Check if all jobs are predicted to finish within a window"""
+        return self.makespan <= window
+
+    def stretched(self, window: float) -> "Plan":
+        """Spread the starts over a window the plan fits into
+
+        Scaling every start by window/makespan keeps the order and never
+        makes jobs of one lane overlap, while leaving room for jobs that
+        run longer than predicted.
+
+        Args:
+            window: Window length in seconds
+
+        Returns:
+            New plan, or this plan if it does not fit
+        """
+        if not self.jobs or not 0 < self.makespan < window:
+            return self
+        factor = window / self.makespan
+        return Plan([PlannedJob(job.key, job.lane, job.start * factor, job.duration) for job in self.jobs],
+                    self.workers)
+
+    def start_of(self, key: Hashable) -> Optional[float]:
+        """Planned start of a job in seconds, or None if not planned"""
+        for job in self.jobs:
+            if job.key == key:
+                return job.start
+        return None
+
+def lpt_plan(durations: Dict[Hashable, float], workers: int, order_key=repr) -> Plan:
+    """Pack jobs onto workers longest processing time first
+
+    Each job goes to the lane that becomes free first. The resulting
+    makespan is at most 4/3 of the optimum.
+
+    Args:
+        durations: Predicted duration in seconds per job
+        workers: Number of jobs that may run at once
+        order_key: Tie breaker for jobs of equal duration
+
+    Returns:
+        Plan with jobs in start order
+    """
+    workers = max(1, workers)
+    lanes = [(0.0, lane) for lane in range(workers)]
+    jobs = []
+    for key in sorted(durations, key=lambda key: (-durations[key], order_key(key))):
+        free_at, lane = heapq.heappop(lanes)
+        jobs.append(PlannedJob(key, lane, free_at, durations[key]))
+        heapq.heappush(lanes, (free_at + durations[key], lane))
+    jobs.sort(key=lambda job: (job.start, job.lane))
+    return Plan(jobs, workers)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+
+import os
+import math
+import time
+import logging
+import threading
+from typing import Dict, Optional, Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+DISKSTATS = "/proc/diskstats"
+PSI_IO = "/proc/pressure/io"
+
+# Index of the "milliseconds spent doing I/O" field after major, minor and name in /proc/diskstats
+IO_TICKS_FIELD = 9
+
+class Pressure:
+    """One sample of storage and CPU pressure"""
+
+    def __init__(self, utilization: Optional[float], io_pressure: Optional[float], cpu_load: float):
+        """Initialize a sample
+
+        Args:
+            utilization: Busiest store device, fraction of time doing I/O (0-1), None if unknown
+            io_pressure: PSI "some" avg10 of I/O in percent, None if unavailable
+            cpu_load: One-minute load average per CPU
+        """
+        self.utilization = utilization
+        self.io_pressure = io_pressure
+        self.cpu_load = cpu_load
+
+    def __repr__(self) -> str:
+        utilization = f"{self.utilization:.0%}" if self.utilization is not None else "?"
+        io_pressure = f"{self.io_pressure:.1f}%" if self.io_pressure is not None else "?"
+        return f"Pressure(util={utilization}, io_psi={io_pressure}, load={self.cpu_load:.2f})"
+
+class PressureSampler:
+    """Reads disk utilization, I/O pressure and CPU load from /proc"""
+
+    def __init__(self, paths: Iterable[str] = ()):
+        """Initialize the sampler
+
+        Args:
+            paths: Files or directories whose block devices are watched
+        """
+        self.devices = set()
+        for path in paths:
+            self.add_path(path)
+        self._last_ticks: Dict[tuple, int] = {}
+        self._last_time: Optional[float] = None
+
+    def add_path(self, path: str) -> None:
+        """Watch the block device holding a path"""
+        try:
+            st_dev = os.stat(path).st_dev
+        except OSError as e:
+            logger.warning(f"Cannot watch device of {path}: {e}")
+            return
+        self.devices.add((os.major(st_dev), os.minor(st_dev)))
+
+    def _read_io_ticks(self) -> Dict[tuple, int]:
+        """I/O milliseconds per watched device"""
+        ticks = {}
+        try:
+            with open(DISKSTATS, "r") as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 3 + IO_TICKS_FIELD + 1:
+                        continue
+                    device = (int(fields[0]), int(fields[1]))
+                    if device in self.devices:
+                        ticks[device] = int(fields[3 + IO_TICKS_FIELD])
+        except OSError:
+            pass
+        return ticks
+
+    @staticmethod
+    def read_io_pressure() -> Optional[float]:
+        """PSI "some" avg10 of I/O in percent, None if the kernel has no PSI"""
+        try:
+            with open(PSI_IO, "r") as f:
+                for line in f:
+                    if line.startswith("some"):
+                        for field in line.split()[1:]:
+                            key, _, value = field.partition("=")
+                            if key == "avg10":
+                                return float(value)
+        except (OSError, ValueError):
+            pass
+        return None
+
+    @staticmethod
+    def read_cpu_load() -> float:
+        """One-minute load average per CPU"""
+        try:
+            return os.getloadavg()[0] / (os.cpu_count() or 1)
+        except OSError:
+            return 0.0
+
+    def sample(self) -> Pressure:
+        """Take a sample; utilization is measured since the previous call"""
+        now = time.monotonic()
+        ticks = self._read_io_ticks()
+        utilization = None
+        if self._last_time is not None and now > self._last_time:
+            elapsed_ms = (now - self._last_time) * 1000
+            busy = [ticks[device] - self._last_ticks[device] for device in ticks if device in self._last_ticks]
+            if busy:
+                utilization = min(1.0, max(busy) / elapsed_ms)
+        self._last_ticks = ticks
+        self._last_time = now
+        return Pressure(utilization, self.read_io_pressure(), self.read_cpu_load())
+
+class AIMDController:
+    """Additive-increase/multiplicative-decrease limit on concurrent backups
+
+    While the store disk has headroom and the limit is what keeps jobs
+    waiting, the limit grows by one per sample. As soon as the disk is
+    saturated, tasks stall on I/O or the CPUs are overloaded, it is cut
+    by `decrease`. This keeps the store busy without thrashing it.
+    """
+
+    def __init__(self, minimum: int = 1, maximum: int = 8, initial: Optional[int] = None,
+                 target_utilization: float = 0.8, saturated_utilization: float = 0.95,
+                 io_pressure_limit: float = 20.0, cpu_load_limit: float = 1.5,
+                 increase: int = 1, decrease: float = 0.5):
+        """Initialize the controller
+
+        Args:
+            minimum: Lowest limit
+            maximum: Highest limit
+            initial: Starting limit, defaults to minimum
+            target_utilization: Grow only below this disk utilization
+            saturated_utilization: Shrink at or above this disk utilization
+            io_pressure_limit: Shrink above this I/O PSI avg10 (percent)
+            cpu_load_limit: Shrink above this load average per CPU
+            increase: Additive step
+            decrease: Multiplicative factor
+        """
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(self.maximum, max(self.minimum, initial or self.minimum))
+        self.target_utilization = target_utilization
+        self.saturated_utilization = saturated_utilization
+        self.io_pressure_limit = io_pressure_limit
+        self.cpu_load_limit = cpu_load_limit
+        self.increase = increase
+        self.decrease = decrease
+
+    def overloaded(self, pressure: Pressure) -> bool:
+        """Check if any pressure signal is above its limit"""
+        return ((pressure.utilization is not None and pressure.utilization >= self.saturated_utilization)
+                or (pressure.io_pressure is not None and pressure.io_pressure > self.io_pressure_limit)
+                or pressure.cpu_load > self.cpu_load_limit)
+
+    def update(self, pressure: Pressure, running: int, waiting: int) -> int:
+        """Adjust the limit to a new sample
+
+        Args:
+            pressure: Current pressure
+            running: Number of running jobs
+            waiting: Number of jobs waiting for a slot
+
+        Returns:
+            New limit
+        """
+        if self.overloaded(pressure):
+            self.limit = max(self.minimum, int(math.floor(self.limit * self.decrease)))
+        elif (waiting and running >= self.limit
+              and (pressure.utilization is None or pressure.utilization < self.target_utilization)):
+            self.limit = min(self.maximum, self.limit + self.increase)
+        return self.limit
+
+class AdaptiveLimiter:
+    """Samples pressure periodically and applies the controller's limit"""
+
+    def __init__(self, controller: AIMDController, sampler: PressureSampler,
+                 apply: Callable[[int], None], load: Callable[[], tuple], interval: float = 30):
+        """Initialize the limiter
+
+        Args:
+            controller: Controller computing the limit
+            sampler: Pressure source
+            apply: Called with the new limit when it changes
+            load: Returns (running jobs, waiting jobs)
+            interval: Seconds between samples
+        """
+        self.controller = controller
+        self.sampler = sampler
+        self.apply = apply
+        self.load = load
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start sampling in a daemon thread"""
+        if self._thread is not None:
+            return
+        self.sampler.sample()
+        self._thread = threading.Thread(target=self._run, name="sbe-pressure", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling"""
+        self._stop.set()
+
+    def step(self) -> int:
+        """Take one sample and apply the resulting limit"""
+        pressure = self.sampler.sample()
+        running, waiting = self.load()
+        previous = self.controller.limit
+        limit = self.controller.update(pressure, running, waiting)
+        if limit != previous:
+            logger.info(f"Concurrent backups {previous} -> {limit} ({pressure})")
+            self.apply(limit)
+        return limit
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.step()
+            except Exception as e:
+                logger.error(f"Error adapting concurrency: {e}")
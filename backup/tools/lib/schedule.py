@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+
+import re
+import zlib
+import heapq
+import logging
+import calendar
+import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+from croniter import croniter, CroniterBadDateError
+
+from .planner import Plan, lpt_plan
+
+logger = logging.getLogger(__name__)
+
+# Day and month names accepted by legacy date patterns (as %a/%A and %b/%B)
+WEEKDAY_NAMES = {name for day in range(7)
+                 for name in (calendar.day_abbr[day].lower(), calendar.day_name[day].lower())}
+MONTH_NAMES = {name: month for month in range(1, 13)
+               for name in (calendar.month_abbr[month].lower(), calendar.month_name[month].lower())}
+
+# What to do with runs missed while the scheduler was down
+CATCHUP_POLICIES = ("once", "skip", "all")
+
+# Upper bound of missed runs replayed per task with the "all" policy
+MAX_CATCHUP_RUNS = 31
+
+# Predicted duration of tasks in a window that never finished a run
+DEFAULT_DURATION = 3600.0
+
+def parse_duration(value: Any) -> datetime.timedelta:
+    """Parse a duration like 90, "45s", "15m" or "2h"
+
+    Raises:
+        ValueError: If the duration is not understood
+    """
+    match = re.fullmatch(r"\s*(\d+)\s*([smh]?)\s*", str(value), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid duration: {value!r}")
+    unit = {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2).lower()]
+    return datetime.timedelta(seconds=int(match.group(1)) * unit)
+
+def parse_window(value: str) -> Tuple[str, datetime.timedelta]:
+    """Parse a start window like "01:00-04:00" (may wrap around midnight)
+
+    Returns:
+        Start time as "HH:MM" and the window length
+
+    Raises:
+        ValueError: If the window is not understood
+    """
+    match = re.fullmatch(r"\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*", str(value))
+    if not match:
+        raise ValueError(f"Invalid window: {value!r}")
+    start_h, start_m, end_h, end_m = (int(part) for part in match.groups())
+    if start_h > 23 or end_h > 24 or start_m > 59 or end_m > 59:
+        raise ValueError(f"Invalid window: {value!r}")
+    length = ((end_h * 60 + end_m) - (start_h * 60 + start_m)) % (24 * 60)
+    if length == 0:
+        raise ValueError(f"Empty window: {value!r}")
+    return f"{start_h:02d}:{start_m:02d}", datetime.timedelta(minutes=length)
+
+def legacy_to_cron(interval: str, date_pattern: str) -> str:
+    """Translate a legacy intervall/date pair into a cron expression
+
+    Args:
+        interval: Interval ("12h", "30m" or "HH:MM")
+        date_pattern: Date pattern ("*", "15", "Mon", "Monday" or "Jan-1")
+
+    Returns:
+        Equivalent five-field cron expression
+
+    Raises:
+        ValueError: If either pattern is not understood
+    """
+    interval = str(interval)
+    date_pattern = str(date_pattern)
+
+    # Minute and hour fields
+    if re.match(r"^\d+[hH]$", interval):
+        # Hourly interval (e.g., "12h"): full hours divisible by N
+        hours = int(interval[:-1])
+        if hours <= 0:
+            raise ValueError(f"Unknown interval format: {interval}")
+        minute_field = "0"
+        hour_field = "*" if hours == 1 else f"*/{hours}" if hours < 24 else "0"
+    elif re.match(r"^\d+[mM]$", interval):
+        # Minute interval (e.g., "30m"): minutes divisible by N
+        minutes = int(interval[:-1])
+        if minutes <= 0:
+            raise ValueError(f"Unknown interval format: {interval}")
+        minute_field = "*" if minutes == 1 else f"*/{minutes}" if minutes < 60 else "0"
+        hour_field = "*"
+    elif re.match(r"^\d{2}:\d{2}$", interval):
+        # Specific time (e.g., "01:30")
+        hour, minute = map(int, interval.split(":"))
+        if hour > 23 or minute > 59:
+            raise ValueError(f"Unknown interval format: {interval}")
+        minute_field, hour_field = str(minute), str(hour)
+    else:
+        raise ValueError(f"Unknown interval format: {interval}")
+
+    # Day of month, month and day of week fields
+    day_field, month_field, weekday_field = "*", "*", "*"
+    if date_pattern == "*":
+        # Wildcard - run every day
+        pass
+    elif re.match(r"^\d{1,2}$", date_pattern) and 1 <= int(date_pattern) <= 31:
+        # Day of month (e.g., "15")
+        day_field = str(int(date_pattern))
+    elif date_pattern.lower() in WEEKDAY_NAMES:
+        # Day of week (e.g., "Mon" or "Monday")
+        weekday_field = date_pattern[:3].lower()
+    elif re.match(r"^[A-Za-z]+-\d{1,2}$", date_pattern):
+        # Month-Day format for yearly backups (e.g., "Jan-1")
+        month_part, day_part = date_pattern.split("-")
+        month = MONTH_NAMES.get(month_part.lower())
+        if month is None or not 1 <= int(day_part) <= calendar.monthrange(2000, month)[1]:
+            raise ValueError(f"Unknown date pattern format: {date_pattern}")
+        day_field, month_field = str(int(day_part)), str(month)
+    else:
+        raise ValueError(f"Unknown date pattern format: {date_pattern}")
+
+    return f"{minute_field} {hour_field} {day_field} {month_field} {weekday_field}"
+
+class CronTrigger:
+    """Fire times of a cron expression, backed by a precompiled croniter"""
+
+    def __init__(self, expression: str):
+        """Compile a cron expression
+
+        Args:
+            expression: Five-field cron expression (e.g. "15 */4 * * 1-5")
+
+        Raises:
+            ValueError: If the expression is invalid
+        """
+        self.expression = str(expression).strip()
+        try:
+            self._iter = croniter(self.expression, datetime.datetime.now())
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError(f"Invalid cron expression: {self.expression}") from e
+        self._last: Optional[datetime.datetime] = None
+
+    def next_after(self, after: datetime.datetime) -> Optional[datetime.datetime]:
+        """Return the first fire time strictly after the given time
+
+        Consecutive calls that continue from the previous result only advance
+        the iterator instead of re-evaluating the expression from scratch.
+
+        Args:
+            after: Reference time
+
+        Returns:
+            Next fire time, or None if the expression never matches
+        """
+        if after != self._last:
+            self._iter.set_current(after)
+        try:
+            self._last = self._iter.get_next(datetime.datetime)
+        except CroniterBadDateError:
+            self._last = None
+        return self._last
+
+    def __repr__(self) -> str:
+        return f"CronTrigger({self.expression!r})"
+
+class ScheduledTask:
+    """A backup.yaml entry compiled once into a trigger and its next fire time"""
+
+    def __init__(self, config: Dict[str, Any]):
+        """Compile a backup configuration entry
+
+        Args:
+            config: Server entry from backup.yaml
+
+        Raises:
+            ValueError: If the entry is incomplete or its schedule is not understood
+        """
+        self.config = config
+        self.directory = config.get("backupdirectory")
+        self.backup_type = config.get("type")
+        self.retention = config.get("retention")
+        self.include_file = config.get("include_file")
+        self.exclude_file = config.get("exclude_file")
+        self.catchup = config.get("catchup")
+        try:
+            self.priority = int(config.get("priority", 0))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid priority {config.get('priority')!r} for {self.directory}")
+
+        expression = config.get("schedule")
+        interval = config.get("intervall")
+        date_pattern = config.get("date")
+        window = config.get("window")
+        if not self.directory or not self.backup_type:
+            raise ValueError(f"Invalid backup configuration: {config}")
+        if self.catchup is not None and self.catchup not in CATCHUP_POLICIES:
+            raise ValueError(f"Invalid catchup policy {self.catchup!r} for {self.directory}, "
+                             f"expected one of {', '.join(CATCHUP_POLICIES)}")
+
+        # Fire times are shifted by a deterministic jitter or the task's slot in its window
+        self.offset = datetime.timedelta(0)
+        self.window: Optional[datetime.timedelta] = None
+
+        # Cron expressions, windows and legacy intervall/date pairs share one trigger type
+        if window:
+            if expression or interval:
+                raise ValueError(f"Use either window or schedule/intervall for {self.directory}")
+            window_start, self.window = parse_window(window)
+            self.trigger = CronTrigger(legacy_to_cron(window_start, date_pattern or "*"))
+        elif expression:
+            self.trigger = CronTrigger(expression)
+        elif interval and date_pattern:
+            self.trigger = CronTrigger(legacy_to_cron(interval, date_pattern))
+        else:
+            raise ValueError(f"Invalid backup configuration: {config}")
+        self.next_fire: Optional[datetime.datetime] = None
+        self.last_fire: Optional[datetime.datetime] = None
+
+        jitter = config.get("jitter")
+        if jitter and not window:
+            span = int(parse_duration(jitter).total_seconds())
+            if span > 0:
+                self.offset = datetime.timedelta(seconds=zlib.crc32(self.name.encode()) % span)
+
+    @property
+    def name(self) -> str:
+        """Directory and type of the task, e.g. ServerName/daily"""
+        return f"{self.directory}/{self.backup_type}"
+
+    def next_after(self, after: datetime.datetime) -> Optional[datetime.datetime]:
+        """First fire time of the task, including its offset, strictly after a time"""
+        fire_time = self.trigger.next_after(after - self.offset)
+        return fire_time + self.offset if fire_time is not None else None
+
+    def missed_runs(self, since: datetime.datetime, now: datetime.datetime,
+                    limit: int = MAX_CATCHUP_RUNS) -> List[datetime.datetime]:
+        """Fire times after `since` up to and including `now`
+
+        Args:
+            since: Time of the last run
+            now: Current time
+            limit: Maximum number of fire times to return
+
+        Returns:
+            Missed fire times, oldest first
+        """
+        missed = []
+        fire_time = self.next_after(since)
+        while fire_time is not None and fire_time <= now and len(missed) < limit:
+            missed.append(fire_time)
+            fire_time = self.next_after(fire_time)
+        return missed
+
+    @property
+    def key(self) -> Tuple:
+        """Identity of the task, stable across configuration reloads"""
+        return tuple(sorted((k, repr(v)) for k, v in self.config.items()))
+
+    def __repr__(self) -> str:
+        return f"ScheduledTask({self.directory}/{self.backup_type} next={self.next_fire})"
+
+class WindowPlan:
+    """Predicted packing of the tasks sharing a start window"""
+
+    def __init__(self, label: str, window: datetime.timedelta, plan: Plan):
+        """Initialize a window plan
+
+        Args:
+            label: Window as written in backup.yaml
+            window: Window length
+            plan: Packing of the window's tasks
+        """
+        self.label = label
+        self.window = window
+        self.plan = plan
+
+    @property
+    def fits(self) -> bool:
+        """Whether all tasks are predicted to finish inside the window"""
+        return self.plan.fits(self.window.total_seconds())
+
+    @property
+    def overrun(self) -> datetime.timedelta:
+        """Predicted time the last task finishes after the window"""
+        return datetime.timedelta(seconds=max(0, int(self.plan.makespan - self.window.total_seconds())))
+
+    def __repr__(self) -> str:
+        return f"WindowPlan({self.label}, tasks={len(self.plan.jobs)}, makespan={self.plan.makespan:.0f}s)"
+
+class Schedule:
+    """Min-heap of compiled tasks ordered by their next fire time
+
+    Finding out whether anything is due is a peek at the heap root, so the
+    cost of a scheduler wake-up does not depend on the number of tasks.
+    """
+
+    def __init__(self, slots: int = 1):
+        """Initialize an empty schedule
+
+        Args:
+            slots: Number of backups that may run at once, used to plan windows
+        """
+        self.slots = slots
+        self.window_plans: List[WindowPlan] = []
+        self._heap: List[Tuple[datetime.datetime, int, ScheduledTask]] = []
+        self._tasks: Dict[Tuple, ScheduledTask] = {}
+        self._counter = 0
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    @property
+    def tasks(self) -> List[ScheduledTask]:
+        """All tasks in the schedule"""
+        return list(self._tasks.values())
+
+    def load(self, servers: List[Dict[str, Any]], now: datetime.datetime,
+             durations: Optional[Dict[Tuple[str, str], float]] = None) -> List[str]:
+        """Compile backup entries into the schedule
+
+        Tasks whose configuration did not change keep their pending fire time.
+
+        Args:
+            servers: List of server entries from backup.yaml
+            now: Reference time for newly added tasks
+            durations: Predicted run time in seconds per (directory, type), used to spread windows
+
+        Returns:
+            List of error messages for entries that could not be compiled
+        """
+        errors = []
+        tasks = {}
+        for server_config in servers or []:
+            try:
+                task = ScheduledTask(server_config)
+            except ValueError as e:
+                errors.append(str(e))
+                continue
+
+            existing = self._tasks.get(task.key)
+            if existing is not None:
+                task = existing
+            tasks[task.key] = task
+
+        self._spread_windows(tasks.values(), durations or {})
+        for task in tasks.values():
+            if task.next_fire is None:
+                task.next_fire = task.next_after(now)
+
+        self._tasks = tasks
+        self._rebuild()
+        return errors
+
+    def replan(self, durations: Dict[Tuple[str, str], float]) -> List["WindowPlan"]:
+        """Re-plan all windows with updated duration predictions
+
+        Args:
+            durations: Predicted run time in seconds per (directory, type)
+
+        Returns:
+            Plan of every window
+        """
+        self._spread_windows(self._tasks.values(), durations)
+        self._rebuild()
+        return self.window_plans
+
+    def _spread_windows(self, tasks, durations: Dict[Tuple[str, str], float]) -> None:
+        """Assign the start offsets of tasks sharing a window
+
+        Tasks are packed longest first onto as many lanes as backups may
+        run at once, then the starts are stretched over the window. Long
+        runs get the most headroom and the number of concurrent runs
+        stays flat. Tasks without history are assumed to take the median
+        known duration.
+        """
+        windows: Dict[Tuple, List[ScheduledTask]] = {}
+        for task in tasks:
+            if task.window is not None:
+                windows.setdefault((task.trigger.expression, task.window), []).append(task)
+
+        known = sorted(durations.values())
+        default = known[len(known) // 2] if known else DEFAULT_DURATION
+        self.window_plans = []
+        for (_, window), members in windows.items():
+            predicted = {task: max(1.0, durations.get((task.directory, task.backup_type), default))
+                         for task in members}
+            plan = lpt_plan(predicted, self.slots, order_key=lambda task: zlib.crc32(task.name.encode()))
+            self.window_plans.append(WindowPlan(members[0].config.get("window"), window, plan))
+            for planned in plan.stretched(window.total_seconds()).jobs:
+                task = planned.key
+                offset = datetime.timedelta(seconds=int(planned.start))
+                # Pending fire times move with the offset instead of skipping a run
+                if task.next_fire is not None and offset != task.offset:
+                    task.next_fire += offset - task.offset
+                task.offset = offset
+
+    def _rebuild(self) -> None:
+        """Rebuild the heap from the task table"""
+        self._heap = []
+        for task in self._tasks.values():
+            self._push(task)
+
+    def _push(self, task: ScheduledTask) -> None:
+        """Add a task with a fire time to the heap"""
+        if task.next_fire is None:
+            return
+        self._counter += 1
+        heapq.heappush(self._heap, (task.next_fire, self._counter, task))
+
+    def plan_catchup(self, last_runs: Dict[Tuple[str, str], datetime.datetime], now: datetime.datetime,
+                     policy: str = "once", spread: float = 0) -> List[Tuple[datetime.datetime, ScheduledTask]]:
+        """Plan runs missed since the last successful run of every task
+
+        Tasks that never ran successfully are not caught up. Catch-up runs
+        are started `spread` seconds apart, the most overdue first.
+
+        Args:
+            last_runs: Last successful run per (directory, type)
+            now: Current time
+            policy: Default policy ("once", "skip" or "all"), a task's `catchup` overrides it
+            spread: Seconds between two catch-up runs
+
+        Returns:
+            List of (start time, task), in start time order
+        """
+        overdue = []
+        for task in self._tasks.values():
+            last_run = last_runs.get((task.directory, task.backup_type))
+            task_policy = task.catchup or policy
+            if last_run is None or task_policy == "skip":
+                continue
+            missed = task.missed_runs(last_run, now)
+            if task_policy == "once":
+                missed = missed[-1:]
+            overdue.extend((fire_time, task) for fire_time in missed)
+
+        overdue.sort(key=lambda entry: entry[0])
+        step = datetime.timedelta(seconds=spread)
+        return [(now + step * index, task) for index, (_, task) in enumerate(overdue)]
+
+    def next_fire_time(self) -> Optional[datetime.datetime]:
+        """Earliest pending fire time, or None if nothing is scheduled"""
+        if not self._heap:
+            return None
+        return self._heap[0][0]
+
+    def pop_due(self, now: datetime.datetime) -> List[ScheduledTask]:
+        """Remove and reschedule every task that is due
+
+        A task that is several fire times late is returned once and then
+        rescheduled after `now`, so a slow iteration neither skips nor
+        replays it.
+
+        Args:
+            now: Current time
+
+        Returns:
+            Due tasks in fire time order
+        """
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_time, _, task = heapq.heappop(self._heap)
+            # Entries of tasks removed by a reload are dropped lazily
+            if self._tasks.get(task.key) is not task or task.next_fire != fire_time:
+                continue
+            due.append(task)
+            task.last_fire = fire_time
+            task.next_fire = task.next_after(max(fire_time, now))
+            self._push(task)
+        return due
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+import time
+import shlex
+import logging
+import tempfile
+import subprocess
+from typing import List, Sequence
+
+logger = logging.getLogger(__name__)
+
+def partition(names: Sequence[str], shards: int) -> List[List[str]]:
+    """Split top-level directories into at most `shards` groups
+
+    Names are dealt out in sorted order, so consecutive runs of a host put
+    every directory into the same shard.
+
+    Returns:
+        Non-empty groups
+    """
+    groups: List[List[str]] = [[] for _ in range(max(1, shards))]
+    for index, name in enumerate(sorted(names)):
+        groups[index % len(groups)].append(name)
+    return [group for group in groups if group]
+
+def shard_commands(rsync_cmd: List[str], remote: str, share: str, target: str,
+                   directories: Sequence[str], shards: int) -> List[List[str]]:
+    """Build the rsync commands of a sharded run
+
+    Every shard copies a group of top-level directories of the share. One
+    more pass copies the files directly in the share and skips all
+    directories. With --relative all of them write the same layout into
+    the same snapshot as a single rsync would.
+
+    Args:
+        rsync_cmd: rsync and its options, including --relative
+        remote: user@host
+        share: Directory on the remote host
+        target: Snapshot directory
+        directories: Names of the top-level directories of the share
+        shards: Number of parallel directory shards
+
+    Returns:
+        Commands, the root pass first
+    """
+    base = share.rstrip("/")
+    # Names are passed as they are; keep the remote shell from splitting them
+    rsync_cmd = list(rsync_cmd) + ["--protect-args"]
+    commands = [rsync_cmd + [f"--exclude={base}/*/", f"{remote}:{share}", target]]
+    for group in partition(directories, shards):
+        commands.append(rsync_cmd + [f"{remote}:{base}/{name}" for name in group] + [target])
+    return commands
+
+def list_remote_directories(ssh_cmd: List[str], remote: str, share: str, timeout: float = 300) -> List[str]:
+    """Names of the top-level directories of a share on the remote host
+
+    Raises:
+        RuntimeError: If the remote listing fails or cannot be parsed
+    """
+    # ssh hands the command to the remote login shell as one string
+    command = shlex.join(["find", share, "-mindepth", "1", "-maxdepth", "1", "-type", "d", "-printf", r"%f\0"])
+    result = subprocess.run(ssh_cmd + [remote, command], capture_output=True, text=True, timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(f"Listing {share} on {remote} failed: {result.stderr.strip()}")
+    # Every name ends with a NUL; anything else means the output was mangled
+    if result.stdout and not result.stdout.endswith("\0"):
+        raise RuntimeError(f"Listing {share} on {remote} is not NUL-separated: {result.stdout[:100]!r}")
+    names = result.stdout.split("\0")[:-1]
+    if any(not name or "/" in name or name in (".", "..") for name in names):
+        raise RuntimeError(f"Listing {share} on {remote} contains invalid names: {names[:10]!r}")
+    return names
+
+def run_parallel(commands: List[List[str]]) -> subprocess.CompletedProcess:
+    """Run rsync commands in parallel and merge them into one result
+
+    The merged return code is 0 only if every command succeeded, otherwise
+    it is the first non-zero one. Output of all commands is concatenated.
+    """
+    started = time.monotonic()
+    # Output goes to files so a chatty shard never blocks on a full pipe
+    outputs = [(tempfile.TemporaryFile("w+"), tempfile.TemporaryFile("w+")) for _ in commands]
+    processes = [subprocess.Popen(command, stdout=out, stderr=err, text=True)
+                 for command, (out, err) in zip(commands, outputs)]
+    returncode = 0
+    stdout, stderr = [], []
+    for index, (process, (out, err)) in enumerate(zip(processes, outputs)):
+        process.wait()
+        out.seek(0)
+        err.seek(0)
+        stdout.append(out.read())
+        if process.returncode != 0:
+            stderr.append(f"[shard {index}] {err.read().strip()}")
+            returncode = returncode or process.returncode
+        out.close()
+        err.close()
+    logger.info(f"{len(commands)} rsync shards finished in {time.monotonic() - started:.1f}s")
+    return subprocess.CompletedProcess(commands, returncode, "\n".join(stdout), "\n".join(stderr))
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+import time
+import heapq
+import logging
+import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+from .schedule import Schedule, ScheduledTask, DEFAULT_DURATION, parse_duration
+from .dispatch import Dispatcher, Job
+
+logger = logging.getLogger(__name__)
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def _hms(seconds: float) -> str:
+    return str(datetime.timedelta(seconds=int(seconds)))
+
+def scale_servers(servers: List[Dict[str, Any]], copies: int) -> List[Dict[str, Any]]:
+    """Replicate backup entries as if there were more hosts
+
+    Copy N of an entry backs up directory `<name>-N`; the first copy keeps its name.
+    """
+    if copies <= 1:
+        return list(servers)
+    scaled = []
+    for copy in range(copies):
+        for entry in servers:
+            entry = dict(entry)
+            if copy and entry.get("backupdirectory"):
+                entry["backupdirectory"] = f"{entry['backupdirectory']}-{copy}"
+            scaled.append(entry)
+    return scaled
+
+class SimulationReport:
+    """Results of a schedule simulation"""
+
+    def __init__(self, days: int, tasks: int):
+        self.days = days
+        self.tasks = tasks
+        self.runs = 0
+        self.skipped = 0
+        self.peak_running = 0
+        self.peak_queued = 0
+        self.queued_at_end = 0
+        self.waits: List[float] = []
+        self.missed_windows: Dict[str, int] = {}
+        # Busy job-seconds per hour of day
+        self.hourly_busy = [0.0] * 24
+        self.events = 0
+        self.wall_time = 0.0
+
+    def hourly_load(self) -> List[float]:
+        """Average number of running backups per hour of day"""
+        return [busy / (3600 * self.days) for busy in self.hourly_busy]
+
+    def format(self) -> str:
+        """Human readable report"""
+        lines = [
+            f"Simulated {self.days} days of {self.tasks} backup tasks",
+            f"  Backup runs:           {self.runs}",
+            f"  Skipped (still busy):  {self.skipped}",
+            f"  Peak running:          {self.peak_running}",
+            f"  Peak queued:           {self.peak_queued}",
+            f"  Still queued at end:   {self.queued_at_end}",
+            f"  Queue wait p50/p95/max: {_hms(_percentile(self.waits, 0.5))} / "
+            f"{_hms(_percentile(self.waits, 0.95))} / {_hms(max(self.waits, default=0))}",
+            f"  Missed windows:        {sum(self.missed_windows.values())}",
+        ]
+        for name, count in sorted(self.missed_windows.items(), key=lambda item: -item[1])[:10]:
+            lines.append(f"    {name}: {count}")
+        lines.append("  Average running backups per hour:")
+        for hour, load in enumerate(self.hourly_load()):
+            lines.append(f"    {hour:02d}:00 {load:6.2f} {'#' * int(round(load * 4))}")
+        rate = self.events / self.wall_time if self.wall_time else 0
+        lines.append(f"  Engine: {self.events} events in {self.wall_time:.3f}s ({rate:,.0f} events/s)")
+        return "\n".join(lines)
+
+class Simulation:
+    """Replays a compiled schedule against a virtual clock
+
+    Uses the scheduler's own Schedule and Dispatcher; only the backup
+    processes are replaced by modelled durations, so no mounts, LUKS
+    devices or rsync are touched. Like the job ledger, a task that is
+    still queued or running when it fires again is skipped.
+    """
+
+    def __init__(self, servers: List[Dict[str, Any]], max_workers: int,
+                 durations: Optional[Dict[Tuple[str, str], float]] = None,
+                 limits: Optional[Dict[str, int]] = None, aging: float = 600,
+                 default_duration: float = DEFAULT_DURATION):
+        """Initialize a simulation
+
+        Args:
+            servers: backup.yaml entries; a `duration` key overrides the predicted duration
+            max_workers: Maximum number of concurrent backups
+            durations: Predicted run time in seconds per (directory, type), e.g. ledger averages
+            limits: Per-resource limits as in the scheduler (only "server" is modelled, by directory)
+            aging: Priority aging in seconds
+            default_duration: Run time of tasks without history or duration
+        """
+        self.servers = servers
+        self.max_workers = max_workers
+        self.durations = durations or {}
+        self.limits = limits or {}
+        self.aging = aging
+        self.default_duration = default_duration
+
+    def duration_of(self, task: ScheduledTask) -> float:
+        """Modelled run time of a task in seconds"""
+        if task.config.get("duration") is not None:
+            return parse_duration(task.config["duration"]).total_seconds()
+        return self.durations.get((task.directory, task.backup_type), self.default_duration)
+
+    def run(self, days: int, start: Optional[datetime.datetime] = None) -> SimulationReport:
+        """Simulate a number of days
+
+        Args:
+            days: Length of the simulation
+            start: Virtual start time, defaults to the next midnight
+
+        Returns:
+            Simulation report
+        """
+        if start is None:
+            start = (datetime.datetime.now() + datetime.timedelta(days=1)).replace(
+                hour=0, minute=0, second=0, microsecond=0)
+        end = start + datetime.timedelta(days=days)
+        origin = start.timestamp()
+        now = [start]
+
+        schedule = Schedule(slots=self.max_workers)
+        for error in schedule.load(self.servers, start, self.durations):
+            logger.warning(error)
+        report = SimulationReport(days, len(schedule))
+
+        completions: List[Tuple[datetime.datetime, int, Job]] = []
+        active: Dict[Tuple[str, str], Job] = {}
+
+        def launch(job: Job) -> bool:
+            finish = now[0] + datetime.timedelta(seconds=job.options["duration"])
+            heapq.heappush(completions, (finish, job.job_id, job))
+            return True
+
+        dispatcher = Dispatcher(self.max_workers, launch, limits=self.limits, aging=self.aging,
+                                clock=lambda: now[0].timestamp() - origin)
+
+        wall_start = time.perf_counter()
+        job_id = 0
+        while True:
+            next_fire = schedule.next_fire_time()
+            next_done = completions[0][0] if completions else None
+            candidates = [t for t in (next_fire, next_done) if t is not None]
+            if not candidates or min(candidates) >= end:
+                break
+            now[0] = min(candidates)
+            report.events += 1
+
+            # Completions first, so freed slots are visible to jobs firing at the same time
+            while completions and completions[0][0] <= now[0]:
+                _, _, job = heapq.heappop(completions)
+                active.pop((job.directory, job.backup_type), None)
+                dispatcher.finished(job)
+                self._account(report, job, start)
+
+            for task in schedule.pop_due(now[0]):
+                key = (task.directory, task.backup_type)
+                if key in active:
+                    report.skipped += 1
+                    continue
+                job_id += 1
+                job = Job(job_id, task.directory, task.backup_type, resources={"server": task.directory},
+                          priority=task.priority, duration=self.duration_of(task), task=task,
+                          fired=task.last_fire)
+                active[key] = job
+                dispatcher.submit(job)
+                report.peak_queued = max(report.peak_queued, dispatcher.queue_depth())
+
+            report.peak_running = max(report.peak_running, dispatcher.running_count())
+
+        # Jobs still running at the end count up to the end of the simulation
+        for _, _, job in completions:
+            job.finished_at = (end - start).total_seconds()
+            self._account(report, job, start)
+        report.queued_at_end = dispatcher.queue_depth()
+        report.wall_time = time.perf_counter() - wall_start
+        return report
+
+    @staticmethod
+    def _account(report: SimulationReport, job: Job, start: datetime.datetime) -> None:
+        """Add a finished job to the report"""
+        report.runs += 1
+        report.waits.append(job.started_at - job.queued_at)
+
+        # Spread the run over the hours of day it covered
+        position, finish = job.started_at, job.finished_at
+        while position < finish:
+            moment = start + datetime.timedelta(seconds=position)
+            hour_end = (moment.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1))
+            step = min(finish, position + (hour_end - moment).total_seconds()) - position
+            report.hourly_busy[moment.hour] += step
+            position += step
+
+        task = job.options["task"]
+        if task.window is not None:
+            window_end = job.options["fired"] - task.offset + task.window
+            if start + datetime.timedelta(seconds=job.finished_at) > window_end:
+                report.missed_windows[task.name] = report.missed_windows.get(task.name, 0) + 1
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+import re
+import shutil
+import logging
+import datetime
+import subprocess
+from pathlib import Path
+from typing import List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Snapshot directories below a mounted image, one per backup type
+SNAPSHOT_TYPES = ("daily", "weekly", "monthly", "yearly", "latest")
+
+# Snapshots are named by their start time, e.g. 20250101_013000
+SNAPSHOT_NAME = re.compile(r"\d{8}_\d{6}")
+
+# Written by backup_server.py once rsync succeeded
+INFO_FILE = "backup_info.txt"
+
+# Tiers that GFS mode fills from daily snapshots instead of their own rsync run
+PROMOTED_TYPES = ("weekly", "monthly", "yearly")
+
+def is_complete(snapshot: Path) -> bool:
+    """Check if a snapshot was finished by a successful rsync run"""
+    return (snapshot / INFO_FILE).is_file()
+
+def list_snapshots(mount_dir: Union[str, Path], types=SNAPSHOT_TYPES, complete_only: bool = True) -> List[Path]:
+    """Snapshots of a host, oldest first
+
+    Args:
+        mount_dir: Mounted backup image of the host
+        types: Backup types to include
+        complete_only: Skip snapshots of failed or interrupted runs
+
+    Returns:
+        Snapshot directories sorted by their timestamp
+    """
+    snapshots = []
+    for backup_type in types:
+        type_dir = Path(mount_dir) / backup_type
+        if not type_dir.is_dir():
+            continue
+        for entry in type_dir.iterdir():
+            if SNAPSHOT_NAME.fullmatch(entry.name) and entry.is_dir() and not entry.is_symlink():
+                if not complete_only or is_complete(entry):
+                    snapshots.append(entry)
+    return sorted(snapshots, key=lambda path: (path.name, path.parent.name))
+
+def newest_snapshot(mount_dir: Union[str, Path], exclude: Optional[Path] = None) -> Optional[Path]:
+    """Newest complete snapshot of a host across all backup types
+
+    Args:
+        mount_dir: Mounted backup image of the host
+        exclude: Snapshot to ignore, e.g. the one being written
+
+    Returns:
+        Snapshot directory, or None if the host has none yet
+    """
+    for snapshot in reversed(list_snapshots(mount_dir)):
+        if exclude is None or snapshot.resolve() != Path(exclude).resolve():
+            return snapshot
+    return None
+
+def snapshot_time(snapshot: Path) -> datetime.datetime:
+    """Start time of a snapshot, taken from its name"""
+    return datetime.datetime.strptime(Path(snapshot).name, "%Y%m%d_%H%M%S")
+
+def promote(mount_dir: Union[str, Path], backup_type: str, max_age: datetime.timedelta,
+            now: Optional[datetime.datetime] = None) -> Optional[Path]:
+    """Promote the newest complete daily snapshot into a higher tier
+
+    The daily snapshot is copied as a tree of hard links (cp -al) under
+    its own name, so the tier shares every file with the daily timeline
+    and takes no extra space. Promoting the same snapshot twice is a no-op.
+
+    Args:
+        mount_dir: Mounted backup image of the host
+        backup_type: Tier to fill, e.g. weekly
+        max_age: Oldest daily snapshot that may be promoted
+        now: Current time
+
+    Returns:
+        The promoted snapshot, or None if there is no recent daily snapshot
+    """
+    mount_dir = Path(mount_dir)
+    dailies = list_snapshots(mount_dir, types=("daily",))
+    if not dailies:
+        return None
+    source = dailies[-1]
+    if (now or datetime.datetime.now()) - snapshot_time(source) > max_age:
+        return None
+
+    target = mount_dir / backup_type / source.name
+    if target.exists():
+        if is_complete(target):
+            return target
+        shutil.rmtree(target)
+
+    # Built under a name retention and link-dest ignore, then renamed into place
+    partial = target.with_name(f".{source.name}.partial")
+    if partial.exists():
+        shutil.rmtree(partial)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    subprocess.run(["cp", "-al", str(source), str(partial)], check=True, capture_output=True)
+
+    # The info file is a hard link too; replace it instead of writing through it
+    info = partial / INFO_FILE
+    info.unlink()
+    info.write_text(f"Backup promoted at {datetime.datetime.now().isoformat()}\n"
+                    f"Type: {backup_type}\nPromoted from: daily/{source.name}\n")
+    partial.rename(target)
+    logger.info(f"Promoted daily/{source.name} to {backup_type}")
+    return target
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import shlex
+import hashlib
+import logging
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+logger = logging.getLogger(__name__)
+
+# Where the master sockets live; short, since socket paths are limited to ~100 bytes
+DEFAULT_CONTROL_DIR = "/tmp/sbe-ssh"
+
+# Seconds an unused master connection stays open
+DEFAULT_IDLE_TIMEOUT = 300
+
+def control_path(control_dir: Union[str, Path], user: str, host: str, port: Union[str, int],
+                 cipher: Optional[str] = None) -> Path:
+    """Socket of the master connection for a (user, host, port)
+
+    The cipher is negotiated by the master, so masters with a forced
+    cipher get a socket of their own.
+    """
+    target = f"{user}@{host}:{port}" + (f"/{cipher}" if cipher else "")
+    key = hashlib.sha1(target.encode()).hexdigest()[:16]
+    return Path(control_dir) / key
+
+class SSHMaster:
+    """A multiplexed SSH connection to one (user, host, port)
+
+    The first user opens a ControlMaster in the background; every later
+    ssh, rsync or ssh-copy-id for the same target runs as a session over
+    its socket and skips the handshake and key exchange. OpenSSH itself
+    closes the master once it had no session for `idle_timeout` seconds
+    (ControlPersist), so masters outlive the backup process that opened
+    them and serve the next job of the host.
+    """
+
+    def __init__(self, user: str, host: str, port: Union[str, int] = 22,
+                 control_dir: Union[str, Path] = DEFAULT_CONTROL_DIR,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT, enabled: bool = True,
+                 cipher: Optional[str] = None, extra_options: Sequence[str] = ()):
+        """Initialize the connection
+
+        Args:
+            user: SSH username
+            host: Server IP or hostname
+            port: SSH port
+            control_dir: Directory of the master sockets
+            idle_timeout: Seconds an unused master stays open
+            enabled: False to fall back to one connection per command
+            cipher: Cipher to force (-o Ciphers=), None for the default negotiation
+            extra_options: Further ssh options, e.g. an identity file
+        """
+        self.user = user
+        self.host = host
+        self.port = str(port)
+        self.control_dir = Path(control_dir)
+        self.idle_timeout = int(idle_timeout)
+        self.enabled = enabled
+        self.cipher = cipher
+        self.extra_options = list(extra_options)
+        self.path = control_path(control_dir, user, host, port, cipher)
+        self.handshakes = 0
+        self.handshake_seconds = 0.0
+        self.connections = 0
+
+    @property
+    def remote(self) -> str:
+        return f"{self.user}@{self.host}"
+
+    def options(self, master: str = "auto") -> List[str]:
+        """ssh options that run over the master socket
+
+        Only -p and -o options (plus `extra_options`), so they suit
+        ssh-copy-id as well as ssh.
+
+        Args:
+            master: ControlMaster setting; auto opens a master if none is running
+        """
+        options = ["-p", self.port] + self.extra_options
+        if self.cipher:
+            options += ["-o", f"Ciphers={self.cipher}"]
+        if self.enabled:
+            options += ["-o", f"ControlMaster={master}", "-o", f"ControlPath={self.path}",
+                        "-o", f"ControlPersist={self.idle_timeout}"]
+        return options
+
+    def ssh_command(self) -> List[str]:
+        """ssh and its options, followed by the remote and a command"""
+        return ["ssh"] + self.options()
+
+    def rsh(self) -> str:
+        """Remote shell for rsync -e"""
+        return shlex.join(self.ssh_command())
+
+    def is_open(self) -> bool:
+        """Check if a master connection is running"""
+        if not self.enabled or not self.path.exists():
+            return False
+        result = subprocess.run(
+            ["ssh", "-O", "check", "-o", f"ControlPath={self.path}", "-p", self.port, self.remote],
+            capture_output=True, text=True, timeout=10
+        )
+        return result.returncode == 0
+
+    def open(self, timeout: float = 60) -> bool:
+        """Make sure a master connection is running, opening one if needed
+
+        Opening a master counts as a handshake and its duration is measured.
+
+        Returns:
+            True if a master is running
+        """
+        if not self.enabled:
+            return False
+        try:
+            if self.is_open():
+                return True
+            self.control_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+            started = time.monotonic()
+            # -f returns once authentication is done and leaves the master running
+            result = subprocess.run(
+                ["ssh", "-f", "-N", "-o", "BatchMode=yes"] + self.options(master="yes") + [self.remote],
+                capture_output=True, text=True, timeout=timeout
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"Cannot open SSH master to {self.remote}:{self.port}: {e}")
+            return False
+        if result.returncode != 0:
+            logger.warning(f"Cannot open SSH master to {self.remote}:{self.port}: {result.stderr.strip()}")
+            return False
+        seconds = time.monotonic() - started
+        self.record_handshake(seconds)
+        logger.info(f"Opened SSH master to {self.remote}:{self.port} in {seconds:.2f}s")
+        return True
+
+    def close(self) -> None:
+        """Stop the master connection right away"""
+        if not self.path.exists():
+            return
+        subprocess.run(["ssh", "-O", "exit", "-o", f"ControlPath={self.path}", "-p", self.port, self.remote],
+                       capture_output=True, text=True, timeout=10)
+
+    def record_handshake(self, seconds: float) -> None:
+        """Account for a master connection opened by this process"""
+        self.handshakes += 1
+        self.handshake_seconds += seconds
+
+    def record_connections(self, count: int = 1) -> None:
+        """Account for ssh or rsync commands run over the master"""
+        self.connections += count
+
+    def stats(self) -> Dict[str, float]:
+        """Counters of this process
+
+        handshakes: Masters opened
+        handshake_seconds: Time those took
+        connections: Commands run over a master
+        """
+        return {"handshakes": self.handshakes, "handshake_seconds": round(self.handshake_seconds, 3),
+                "connections": self.connections}
+
+def saved_seconds(connections: int, handshakes: int, average_handshake: float) -> float:
+    """Estimate the time saved by multiplexing
+
+    Without a master every connection pays a handshake; with one only the
+    masters opened do.
+
+    Args:
+        connections: Commands run over a master
+        handshakes: Masters opened for them
+        average_handshake: Average measured seconds of a handshake to the host
+    """
+    return max(0, connections - handshakes) * average_handshake
+
+def from_environment(user: str, host: str, port: Union[str, int],
+                     config: Optional[Dict[str, str]] = None) -> SSHMaster:
+    """Build a connection configured by server.config or the environment
+
+    SSH_MULTIPLEX=0 disables multiplexing, SSH_CONTROL_DIR and
+    SSH_IDLE_TIMEOUT place the sockets and set their idle timeout, and
+    SSH_CIPHER forces a cipher (written by tune.py).
+    """
+    config = config or {}
+
+    def setting(key: str, default: str) -> str:
+        return config.get(key, os.environ.get(key, default))
+
+    return SSHMaster(
+        user, host, port,
+        control_dir=setting("SSH_CONTROL_DIR", DEFAULT_CONTROL_DIR),
+        idle_timeout=float(setting("SSH_IDLE_TIMEOUT", str(DEFAULT_IDLE_TIMEOUT))),
+        enabled=setting("SSH_MULTIPLEX", "1") != "0",
+        cipher=setting("SSH_CIPHER", "") or None,
+    )
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import asyncio
+import logging
+import threading
+from collections import deque
+from pathlib import Path
+from typing import List, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from a child pipe at once, and longest line kept in memory
+READ_CHUNK = 64 * 1024
+MAX_LINE = 64 * 1024
+
+class JobSupervisor:
+    """Runs backup processes on a single asyncio event loop thread
+
+    Output of every child is streamed line by line into its own log file.
+    Only the last `tail_lines` lines are kept in memory for error reports,
+    so memory stays flat regardless of how much rsync prints. Exit status
+    is collected by the event loop (via pidfd where available) instead of
+    one waiting thread per job.
+    """
+
+    def __init__(self, tail_lines: int = 200):
+        """Initialize the supervisor
+
+        Args:
+            tail_lines: Number of output lines kept per job for error reports
+        """
+        self.tail_lines = tail_lines
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = 0
+
+    def start(self) -> None:
+        """Start the event loop thread"""
+        if self._loop is not None:
+            return
+
+        self._loop = asyncio.new_event_loop()
+        self._install_child_watcher(self._loop)
+        self._thread = threading.Thread(target=self._loop.run_forever, name="sbe-supervisor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the event loop thread (running children are left alone)"""
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = None
+        self._thread = None
+
+    @staticmethod
+    def _install_child_watcher(loop: asyncio.AbstractEventLoop) -> None:
+        """Use a pidfd child watcher so the loop can run outside the main thread
+
+        Python 3.12+ selects it automatically; older versions default to a
+        watcher that spawns one thread per child.
+        """
+        if sys.version_info >= (3, 12) or not hasattr(os, "pidfd_open"):
+            return
+        try:
+            watcher = asyncio.PidfdChildWatcher()
+            watcher.attach_loop(loop)
+            asyncio.set_child_watcher(watcher)
+        except Exception as e:
+            logger.warning(f"pidfd child watcher unavailable, falling back to default: {e}")
+
+    @property
+    def running(self) -> int:
+        """Number of supervised processes that have not exited yet"""
+        return self._running
+
+    def launch(self, command: List[str], log_path: Path,
+               on_exit: Callable[[int, List[str]], None],
+               on_start: Optional[Callable[[int], None]] = None,
+               on_line: Optional[Callable[[str], None]] = None) -> int:
+        """Start a process and supervise it until it exits
+
+        Args:
+            command: Command line to execute
+            log_path: File receiving the combined stdout/stderr of the process
+            on_exit: Called with (return code, last output lines) once the process exited
+            on_start: Optional callback with the PID, guaranteed to run before on_exit
+            on_line: Optional callback for every output line
+
+        Returns:
+            PID of the started process
+
+        Raises:
+            OSError: If the process could not be started
+        """
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(
+            self._spawn(command, Path(log_path), on_exit, on_start, on_line), self._loop
+        )
+        return future.result()
+
+    async def _spawn(self, command: List[str], log_path: Path,
+                     on_exit: Callable[[int, List[str]], None],
+                     on_start: Optional[Callable[[int], None]],
+                     on_line: Optional[Callable[[str], None]]) -> int:
+        """Create the process and schedule its supervision"""
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT
+        )
+        self._running += 1
+        if on_start is not None:
+            try:
+                on_start(process.pid)
+            except Exception as e:
+                logger.error(f"Error in start handler for PID {process.pid}: {e}")
+        asyncio.ensure_future(self._supervise(process, log_path, on_exit, on_line))
+        return process.pid
+
+    async def _supervise(self, process: asyncio.subprocess.Process, log_path: Path,
+                         on_exit: Callable[[int, List[str]], None],
+                         on_line: Optional[Callable[[str], None]]) -> None:
+        """Stream output to the log file and report the exit status"""
+        tail: deque = deque(maxlen=self.tail_lines)
+        try:
+            with open(log_path, "ab") as log_file:
+                pending = b""
+                while True:
+                    chunk = await process.stdout.read(READ_CHUNK)
+                    if not chunk:
+                        break
+                    log_file.write(chunk)
+                    pending += chunk
+                    *lines, pending = pending.split(b"\n")
+                    if len(pending) > MAX_LINE:
+                        lines.append(pending)
+                        pending = b""
+                    for raw in lines:
+                        self._handle_line(raw, tail, on_line)
+                if pending:
+                    self._handle_line(pending, tail, on_line)
+        except Exception as e:
+            logger.error(f"Error streaming output of PID {process.pid} to {log_path}: {e}")
+            tail.append(f"[supervisor] output streaming failed: {e}")
+            # Keep draining so the child cannot block on a full pipe
+            while await process.stdout.read(READ_CHUNK):
+                pass
+
+        return_code = await process.wait()
+        self._running -= 1
+        # Completion handlers may block (ledger writes, mail); keep them off the loop
+        self._loop.run_in_executor(None, on_exit, return_code, list(tail))
+
+    @staticmethod
+    def _handle_line(raw: bytes, tail: deque, on_line: Optional[Callable[[str], None]]) -> None:
+        """Record a line in the tail buffer and pass it to the line callback"""
+        line = raw.decode(errors="replace").rstrip("\r")
+        tail.append(line)
+        if on_line is not None:
+            try:
+                on_line(line)
+            except Exception as e:
+                logger.error(f"Error in output handler: {e}")
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import random
+import socket
+import getpass
+import logging
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from .ssh import SSHMaster
+
+logger = logging.getLogger(__name__)
+
+# Candidates, cheapest first; ties go to the earlier one
+CIPHERS = ("aes128-gcm@openssh.com", "aes256-gcm@openssh.com", "chacha20-poly1305@openssh.com")
+COMPRESSIONS: Tuple[Tuple[str, Optional[int]], ...] = (
+    ("none", None), ("lz4", None), ("zstd", 1), ("zstd", 3), ("zlib", 6))
+
+# rsync --compress-choice values
+COMPRESS_CHOICES = ("none", "zstd", "lz4", "zlibx", "zlib")
+
+def compression_options(algorithm: Optional[str], level: Union[str, int, None] = None) -> List[str]:
+    """rsync options for a compression algorithm and level
+
+    Raises:
+        ValueError: If rsync does not know the algorithm
+    """
+    if not algorithm or algorithm == "none":
+        return []
+    if algorithm not in COMPRESS_CHOICES:
+        raise ValueError(f"Unknown rsync compression {algorithm!r}, expected one of {', '.join(COMPRESS_CHOICES)}")
+    options = ["--compress", f"--compress-choice={algorithm}"]
+    if level not in (None, ""):
+        options.append(f"--compress-level={int(level)}")
+    return options
+
+def local_ciphers() -> List[str]:
+    """Ciphers the local ssh client supports"""
+    try:
+        result = subprocess.run(["ssh", "-Q", "cipher"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return []
+    return result.stdout.split() if result.returncode == 0 else []
+
+def make_sample(directory: Union[str, Path], size: int, seed: int = 1) -> Path:
+    """Write calibration data of about `size` bytes
+
+    Half of it is random (like media and archives), half is compressible
+    text (like logs, configuration and source), in files of up to 1 MiB.
+    """
+    rng = random.Random(seed)
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    chunk = 1024 * 1024
+    for index in range(max(2, size // chunk)):
+        path = directory / f"sample{index:04d}"
+        if index % 2:
+            lines = (f"{rng.randrange(10**6):06d} INFO job {rng.choice('abcdef')} wrote {rng.random():.4f}\n"
+                     for _ in range(chunk // 40))
+            path.write_text("".join(lines))
+        else:
+            path.write_bytes(rng.randbytes(chunk))
+    return directory
+
+class TuningResult:
+    """Measured transfer of the calibration data with one setting"""
+
+    def __init__(self, cipher: Optional[str], compress: str, level: Optional[int], seconds: float, size: int):
+        self.cipher = cipher
+        self.compress = compress
+        self.level = level
+        self.seconds = seconds
+        self.size = size
+
+    @property
+    def throughput(self) -> float:
+        """Bytes per second"""
+        return self.size / self.seconds if self.seconds > 0 else 0.0
+
+    def config(self) -> Dict[str, str]:
+        """server.config entries of the setting"""
+        return {"SSH_CIPHER": self.cipher or "", "RSYNC_COMPRESS": self.compress,
+                "RSYNC_COMPRESS_LEVEL": "" if self.level is None else str(self.level)}
+
+    def __repr__(self) -> str:
+        level = f":{self.level}" if self.level is not None else ""
+        return f"TuningResult({self.cipher}, {self.compress}{level}, {self.seconds:.2f}s)"
+
+def best(results: Sequence[TuningResult], tolerance: float = 0.05) -> Optional[TuningResult]:
+    """Pick the setting to use
+
+    Settings within `tolerance` of the fastest count as equal, and the
+    first of them (the cheapest candidate) wins, so a few percent of noise
+    does not buy CPU time on every backup.
+    """
+    if not results:
+        return None
+    fastest = min(result.seconds for result in results)
+    return next(result for result in results if result.seconds <= fastest * (1 + tolerance))
+
+def calibrate(connect: Callable[[Optional[str]], SSHMaster], sample: Union[str, Path],
+              ciphers: Sequence[str] = CIPHERS, compressions=COMPRESSIONS, repeat: int = 2,
+              run: Callable[..., subprocess.CompletedProcess] = subprocess.run) -> List[TuningResult]:
+    """Time pulling the calibration data from a host with every setting
+
+    The sample is uploaded once, then pulled like a backup (rsync from the
+    host) with each cipher and compression. Every pull copies all data
+    (--ignore-times --whole-file). Masters are opened before the timing
+    starts, as backups reuse them too (without multiplexing every pull
+    includes a handshake). The best of `repeat` pulls counts.
+
+    Args:
+        connect: Returns the connection to the host for a cipher (None for the default)
+        sample: Local directory with the calibration data
+        ciphers: Ciphers to try; those the host refuses are skipped
+        compressions: (algorithm, level) pairs to try
+        repeat: Pulls per setting
+        run: subprocess.run, replaceable for tests
+
+    Returns:
+        Results in candidate order
+
+    Raises:
+        RuntimeError: If the sample cannot be placed on the host
+    """
+    sample = Path(sample)
+    size = sum(path.stat().st_size for path in sample.rglob("*") if path.is_file())
+    base = connect(None)
+    base.open()
+    created = run(base.ssh_command() + [base.remote, "mktemp", "-d", "/tmp/sbe-tune.XXXXXX"],
+                  capture_output=True, text=True)
+    if created.returncode != 0:
+        raise RuntimeError(f"Cannot create a directory on {base.remote}: {created.stderr.strip()}")
+    remote_dir = created.stdout.strip()
+
+    results = []
+    try:
+        uploaded = run(["rsync", "-a", "-e", base.rsh(), f"{sample}/", f"{base.remote}:{remote_dir}/"],
+                       capture_output=True, text=True)
+        if uploaded.returncode != 0:
+            raise RuntimeError(f"Cannot upload calibration data: {uploaded.stderr.strip()}")
+
+        with tempfile.TemporaryDirectory(prefix="sbe_tune_") as target:
+            for cipher in ciphers:
+                ssh = connect(cipher)
+                if ssh.enabled and not ssh.open():
+                    logger.info(f"Skipping cipher {cipher}, the connection failed")
+                    continue
+                try:
+                    for algorithm, level in compressions:
+                        seconds = _time_pull(run, ssh, remote_dir, target, compression_options(algorithm, level),
+                                             repeat)
+                        if seconds is None:
+                            logger.info(f"Skipping {cipher} with {algorithm}, rsync failed")
+                            continue
+                        results.append(TuningResult(cipher, algorithm, level, seconds, size))
+                        logger.info(f"{results[-1]}: {results[-1].throughput / 2**20:.1f} MiB/s")
+                finally:
+                    # Masters that backups were already using are left to their idle timeout
+                    if ssh.handshakes:
+                        ssh.close()
+    finally:
+        run(base.ssh_command() + [base.remote, "rm", "-rf", remote_dir], capture_output=True, text=True)
+        if base.handshakes:
+            base.close()
+    return results
+
+def _time_pull(run, ssh: SSHMaster, remote_dir: str, target: str, options: List[str],
+               repeat: int) -> Optional[float]:
+    """Fastest of `repeat` full pulls, None if rsync fails"""
+    command = ["rsync", "-a", "--ignore-times", "--whole-file", "--delete", "-e", ssh.rsh()] + options
+    timings = []
+    for _ in range(max(1, repeat)):
+        started = time.monotonic()
+        result = run(command + [f"{ssh.remote}:{remote_dir}/", f"{target}/"], capture_output=True, text=True)
+        if result.returncode != 0:
+            return None
+        timings.append(time.monotonic() - started)
+    return min(timings)
+
+class LoopbackSSHD:
+    """A throwaway sshd on 127.0.0.1 for testing the calibration
+
+    Runs as the current user with its own host and client keys, so no
+    system configuration is touched. Needs sshd and rsync installed.
+    """
+
+    def __init__(self, sshd: str = "/usr/sbin/sshd"):
+        self.sshd = sshd
+        self.user = getpass.getuser()
+        self.host = "127.0.0.1"
+        self.port = 0
+        self._tmp: Optional[tempfile.TemporaryDirectory] = None
+        self._process: Optional[subprocess.Popen] = None
+
+    def __enter__(self) -> "LoopbackSSHD":
+        self._tmp = tempfile.TemporaryDirectory(prefix="sbe_sshd_")
+        directory = Path(self._tmp.name)
+        for name in ("host_key", "client_key"):
+            subprocess.run(["ssh-keygen", "-q", "-t", "ed25519", "-N", "", "-f", str(directory / name)], check=True)
+        (directory / "authorized_keys").write_text((directory / "client_key.pub").read_text())
+        with socket.socket() as probe:
+            probe.bind((self.host, 0))
+            self.port = probe.getsockname()[1]
+        (directory / "sshd_config").write_text(
+            f"Port {self.port}\nListenAddress {self.host}\nHostKey {directory / 'host_key'}\n"
+            f"AuthorizedKeysFile {directory / 'authorized_keys'}\nPidFile {directory / 'sshd.pid'}\n"
+            "StrictModes no\nUsePAM no\nPasswordAuthentication no\n")
+        self._process = subprocess.Popen([self.sshd, "-D", "-e", "-f", str(directory / "sshd_config")],
+                                         stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection((self.host, self.port), timeout=1).close()
+                return self
+            except OSError:
+                if self._process.poll() is not None:
+                    break
+                time.sleep(0.1)
+        self.__exit__(None, None, None)
+        raise RuntimeError(f"Loopback sshd did not start on port {self.port}")
+
+    def __exit__(self, *exc) -> None:
+        if self._process is not None:
+            self._process.terminate()
+            self._process.wait()
+            self._process = None
+        if self._tmp is not None:
+            self._tmp.cleanup()
+            self._tmp = None
+
+    def options(self) -> List[str]:
+        """ssh options to log in with the throwaway client key"""
+        return ["-i", os.path.join(self._tmp.name, "client_key"), "-o", "IdentitiesOnly=yes",
+                "-o", "UserKnownHostsFile=/dev/null", "-o", "StrictHostKeyChecking=no"]
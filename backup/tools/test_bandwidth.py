@@ -0,0 +1,75 @@
+import datetime
+import unittest
+
+from backup.tools.lib.bandwidth import BandwidthBudget, parse_rate, parse_schedule, water_fill
+
+NOON = datetime.datetime(2025, 1, 6, 12, 0)
+NIGHT = datetime.datetime(2025, 1, 6, 23, 0)
+
+class BandwidthTest(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_rate("800"), 800)
+        self.assertEqual(parse_rate("20M"), 20480)
+        self.assertEqual(parse_schedule("08:00-18:00=1M, 18:00-08:00=0"),
+                         [(480, 1080, 1024), (1080, 480, 0)])
+        with self.assertRaises(ValueError):
+            parse_rate("fast")
+
+    def test_water_fill_redistributes_unused_share(self):
+        self.assertEqual(water_fill(900, {"a": 100, "b": None, "c": None}), {"a": 100, "b": 400, "c": 400})
+        self.assertEqual(water_fill(900, {"a": None, "b": None, "c": None}), {"a": 300, "b": 300, "c": 300})
+
+    def test_time_of_day_budget(self):
+        budget = BandwidthBudget(0, parse_schedule("08:00-18:00=1000"), slots=2)
+        self.assertEqual(budget.assign(1, "a", NIGHT), 0)
+        budget.release(1)
+
+        # The first job leaves an even split for the other slot
+        self.assertEqual(budget.assign(1, "a", NOON), 500)
+        self.assertEqual(budget.assign(2, "b", NOON), 500)
+        budget.release(1)
+        budget.release(2)
+
+    def test_measured_throughput_frees_bandwidth(self):
+        budget = BandwidthBudget(1000, slots=4)
+        self.assertTrue(budget.observe_line("slow", "SBE-STATS bytes=1024000 seconds=10.0"))
+        self.assertFalse(budget.observe_line("slow", "sending incremental file list"))
+
+        self.assertEqual(budget.assign(1, "slow", NOON), 120)
+        # What the slow host leaves is shared, two free slots keep their even split
+        self.assertEqual(budget.assign(2, "fast", NOON), 380)
+        self.assertEqual(budget.assigned(), {1: 120, 2: 380})
+
+    def test_never_assigns_more_than_the_budget(self):
+        for slots in (1, 2, 3, 4, 7):
+            budget = BandwidthBudget(1000, slots=slots)
+            assigned = [budget.assign(key, f"host{key}", NOON) for key in range(slots)]
+            self.assertLessEqual(sum(assigned), 1000)
+            self.assertTrue(all(limit >= 1000 // slots for limit in assigned))
+
+            # Slots freed and refilled in any order keep the sum within the budget
+            budget.release(0)
+            self.assertLessEqual(sum(budget.assigned().values()) + budget.assign(slots, "new", NOON), 1000)
+
+    def test_jobs_beyond_the_slots_are_not_starved(self):
+        budget = BandwidthBudget(1000, slots=2)
+        with self.assertLogs("backup.tools.lib.bandwidth", "WARNING"):
+            assigned = [budget.assign(key, f"host{key}", NOON) for key in range(4)]
+        self.assertEqual(assigned, [500, 500, 333, 250])
+
+    def test_raised_slots_split_the_budget_evenly(self):
+        budget = BandwidthBudget(1000, slots=2)
+        self.assertEqual([budget.assign(key, f"host{key}", NOON) for key in range(2)], [500, 500])
+        # The adaptive controller allows four backups; rsync keeps the limits of the running two
+        budget.set_slots(4)
+        with self.assertLogs("backup.tools.lib.bandwidth", "WARNING"):
+            self.assertEqual([budget.assign(key, f"host{key}", NOON) for key in range(2, 4)], [250, 250])
+
+        # Once the first two finish, jobs are split for four slots within the budget
+        budget.release(0)
+        budget.release(1)
+        self.assertEqual([budget.assign(key, f"host{key}", NOON) for key in range(4, 6)], [250, 250])
+        self.assertEqual(sum(budget.assigned().values()), 1000)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from backup.tools.lib.config import ConfigCache, ConfigWatcher, ConfigManager
+
+class ConfigCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "backup.json"
+        self.calls = 0
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def parse(self, path):
+        self.calls += 1
+        with open(path) as f:
+            return json.load(f)
+
+    def write(self, content, mtime_ns):
+        self.path.write_text(content)
+        os.utime(self.path, ns=(mtime_ns, mtime_ns))
+
+    def test_parses_only_on_change(self):
+        cache = ConfigCache()
+        self.write('{"servers": []}', 10 ** 18)
+        self.assertEqual(cache.load(self.path, self.parse), {"servers": []})
+        self.assertEqual(cache.load(self.path, self.parse), {"servers": []})
+        self.assertEqual(self.calls, 1)
+
+        self.write('{"servers": [1]}', 10 ** 18 + 1)
+        self.assertEqual(cache.load(self.path, self.parse), {"servers": [1]})
+        self.assertEqual(self.calls, 2)
+
+        cache.invalidate(self.path)
+        cache.load(self.path, self.parse)
+        self.assertEqual(self.calls, 3)
+
+    def test_errors_reported_once_per_change(self):
+        cache = ConfigCache()
+        self.write("{broken", 10 ** 18)
+        with self.assertLogs("backup.tools.lib.config", level="ERROR") as logs:
+            self.assertEqual(cache.load(self.path, self.parse), {})
+            self.assertEqual(cache.load(self.path, self.parse), {})
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_invalidated_error_not_reported_again(self):
+        cache = ConfigCache()
+        self.write("{broken", 10 ** 18)
+        with self.assertLogs("backup.tools.lib.config", level="ERROR") as logs:
+            cache.load(self.path, self.parse)
+            cache.invalidate(self.path)
+            cache.load(self.path, self.parse)
+            self.write("{still broken", 2 * 10 ** 18)
+            cache.load(self.path, self.parse)
+        self.assertEqual(len(logs.records), 2)
+
+    def test_missing_file(self):
+        self.assertEqual(ConfigCache().load(self.path, self.parse), {})
+
+    def test_watcher_invalidates_on_write(self):
+        cache = ConfigCache()
+        changed = threading.Event()
+        watcher = ConfigWatcher([self.tmp.name], on_change=lambda path: changed.set(), cache=cache)
+        if not watcher.start():
+            self.skipTest("inotify not available")
+        self.path.write_text("{}")
+        self.assertTrue(changed.wait(5))
+
+class ServerConfigTest(unittest.TestCase):
+    def test_each_load_returns_its_own_dict(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, server in (("web", "10.0.0.1"), ("db", "10.0.0.2")):
+                (Path(tmp) / "store" / name).mkdir(parents=True)
+                (Path(tmp) / "store" / name / "server.config").write_text(f'SERVER="{server}"\n')
+            manager = ConfigManager(tmp)
+            web = manager.load_server_config("web")
+            db = manager.load_server_config("db")
+            self.assertEqual(web["SERVER"], "10.0.0.1")
+            self.assertEqual(db["SERVER"], "10.0.0.2")
+
+            results = {}
+
+            def load(name):
+                for _ in range(200):
+                    results.setdefault(name, set()).add(manager.load_server_config(name)["SERVER"])
+
+            threads = [threading.Thread(target=load, args=(name,)) for name in ("web", "db")]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(results, {"web": {"10.0.0.1"}, "db": {"10.0.0.2"}})
+
+if __name__ == "__main__":
+    unittest.main()
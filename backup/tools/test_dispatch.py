@@ -0,0 +1,117 @@
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from backup.tools.lib.dispatch import Dispatcher, Job
+from backup.tools.lib.supervisor import JobSupervisor
+
+class DispatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.started = []
+        self.dispatcher = Dispatcher(2, self.launch)
+
+    def launch(self, job):
+        self.started.append(job.directory)
+        return job.directory != "broken"
+
+    def test_submit_never_blocks_and_respects_limit(self):
+        jobs = [Job(i, f"host{i}", "daily") for i in range(4)]
+        for job in jobs:
+            self.dispatcher.submit(job)
+
+        self.assertEqual(self.started, ["host0", "host1"])
+        self.assertEqual(self.dispatcher.queue_depth(), 2)
+        self.assertEqual(self.dispatcher.running_count(), 2)
+
+        # A freed slot is used by the next waiting job right away
+        self.dispatcher.finished(jobs[0])
+        self.assertEqual(self.started, ["host0", "host1", "host2"])
+        self.assertGreaterEqual(jobs[2].wait_time, 0)
+        states = {entry["directory"]: entry["state"] for entry in self.dispatcher.snapshot()}
+        self.assertEqual(states, {"host1": "running", "host2": "running", "host3": "queued"})
+
+    def test_failed_launch_frees_slot(self):
+        self.dispatcher.submit(Job(1, "broken", "daily"))
+        self.dispatcher.submit(Job(2, "ok", "daily"))
+        self.assertEqual(self.started, ["broken", "ok"])
+        self.assertEqual(self.dispatcher.running_count(), 1)
+
+    def test_resource_limits_skip_blocked_jobs(self):
+        dispatcher = Dispatcher(3, self.launch, limits={"server": 1, "device": 2})
+        jobs = [
+            Job(1, "a", "daily", resources={"server": "s1", "device": "d1"}),
+            Job(2, "a", "weekly", resources={"server": "s1", "device": "d1"}),
+            Job(3, "b", "daily", resources={"server": "s2", "device": "d1"}),
+            Job(4, "c", "daily", resources={"server": "s3", "device": "d1"}),
+            Job(5, "d", "daily", resources={"server": "s4", "device": "d2"}),
+        ]
+        for job in jobs:
+            dispatcher.submit(job)
+
+        # s1 is busy with job 1, d1 is full after job 3
+        self.assertEqual([job.job_id for job in jobs if job.started_at], [1, 3, 5])
+
+        # Host "c" has not been served yet and takes the free d1 slot before "a" again
+        dispatcher.finished(jobs[0])
+        self.assertIsNotNone(jobs[3].started_at)
+        self.assertIsNone(jobs[1].started_at)
+
+        dispatcher.finished(jobs[2])
+        self.assertIsNotNone(jobs[1].started_at)
+
+    def test_priority_aging_and_round_robin(self):
+        dispatcher = Dispatcher(1, self.launch, aging=100)
+        blocker = Job(0, "blocker", "daily")
+        dispatcher.submit(blocker)
+        jobs = [
+            Job(1, "a", "daily"),
+            Job(2, "a", "weekly"),
+            Job(3, "b", "daily"),
+            Job(4, "c", "daily", priority=2),
+            Job(5, "old", "daily"),
+        ]
+        for job in jobs:
+            dispatcher.submit(job)
+        # Waiting 300s lifts a priority 0 job above priority 2
+        jobs[4].queued_at -= 300
+
+        order = []
+        current = blocker
+        while True:
+            dispatcher.finished(current)
+            running = [job for job in jobs if job.started_at and job.finished_at is None]
+            if not running:
+                break
+            current = running[0]
+            order.append(current.directory)
+        # After "a" was served, "b" goes before the second "a" job
+        self.assertEqual(order, ["old", "c", "a", "b", "a"])
+
+class JobSupervisorTest(unittest.TestCase):
+    def test_streams_output_and_reports_exit(self):
+        tmp = tempfile.TemporaryDirectory()
+        log_path = Path(tmp.name) / "logs" / "job.log"
+        supervisor = JobSupervisor(tail_lines=3)
+        done = threading.Event()
+        result = {}
+
+        def on_exit(return_code, tail):
+            result.update(return_code=return_code, tail=tail)
+            done.set()
+
+        script = "import sys\nfor i in range(10): print(f'line {i}')\nsys.exit(3)"
+        pid = supervisor.launch([sys.executable, "-c", script], log_path, on_exit,
+                                on_start=lambda pid: result.update(pid=pid))
+        self.assertTrue(done.wait(10))
+        supervisor.stop()
+
+        self.assertEqual(result["pid"], pid)
+        self.assertEqual(result["return_code"], 3)
+        self.assertEqual(result["tail"], ["line 7", "line 8", "line 9"])
+        self.assertEqual(log_path.read_text().splitlines()[0], "line 0")
+        tmp.cleanup()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from backup.tools.lib.hosts import HostReconciler
+
+class FakeConfig:
+    def __init__(self, path):
+        self.path = path
+
+    def load_servers_config(self):
+        if not self.path.exists():
+            return {}
+        return json.loads(self.path.read_text())
+
+class HostReconcilerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        base_dir = Path(self.tmp.name)
+        self.store = base_dir / "store"
+        (self.store / "old").mkdir(parents=True)
+        (self.store / "keep").mkdir()
+        (self.store / "keep" / "server.config").write_text('SERVER="10.0.0.1"\nPORT="22"\n')
+        (base_dir / "backup" / "config").mkdir(parents=True)
+        self.servers = base_dir / "backup" / "config" / "servers.yaml"
+        self.reconciler = HostReconciler(str(base_dir), FakeConfig(self.servers))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_servers(self, servers):
+        self.servers.write_text(json.dumps({"servers": servers}))
+
+    def fake_add(self, entry):
+        (self.store / entry["hostname"]).mkdir()
+        return True
+
+    def test_applies_diff_only_on_change(self):
+        self.write_servers([
+            {"hostname": "keep", "server_ip": "10.0.0.2", "exclude": ["/proc/"]},
+            {"hostname": "new", "server_ip": "10.0.0.3"},
+        ])
+        with patch.object(HostReconciler, "add_host", side_effect=self.fake_add) as add_mock, \
+             patch.object(HostReconciler, "unmount_and_remove_host") as remove_mock:
+            host_diff = self.reconciler.reconcile()
+            self.assertEqual([e["hostname"] for e in host_diff.added], ["new"])
+            self.assertEqual(host_diff.removed, ["old"])
+            self.assertEqual([e["hostname"] for e in host_diff.modified], ["keep"])
+            remove_mock.assert_called_once_with("old")
+
+            # Nothing changed: no store scan, no actions
+            self.assertIsNone(self.reconciler.reconcile())
+            self.assertEqual(add_mock.call_count, 1)
+
+        config = (self.store / "keep" / "server.config").read_text()
+        self.assertIn('SERVER="10.0.0.2"', config)
+        self.assertIn('PORT="22"', config)
+        self.assertEqual((self.store / "keep" / "exclude.txt").read_text(), "/proc/\n")
+
+    def test_missing_servers_yaml_never_removes_hosts(self):
+        with patch.object(HostReconciler, "unmount_and_remove_host") as remove_mock:
+            self.assertIsNone(self.reconciler.reconcile())
+        remove_mock.assert_not_called()
+
+    def test_empty_servers_never_removes_all_hosts(self):
+        for content in ('{"servers": null}', '{"servers": []}', '{"servers": [{"hostname": null}]}'):
+            self.servers.write_text(content)
+            with patch.object(HostReconciler, "unmount_and_remove_host") as remove_mock:
+                self.assertIsNone(self.reconciler.reconcile(force=True))
+            remove_mock.assert_not_called()
+
+        self.reconciler.allow_empty = True
+        with patch.object(HostReconciler, "unmount_and_remove_host") as remove_mock:
+            self.assertEqual(self.reconciler.reconcile(force=True).removed, ["keep", "old"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import time
+import tempfile
+import threading
+import unittest
+import multiprocessing
+from pathlib import Path
+
+from backup.tools.lib.ledger import JobLedger
+from backup.tools.lib.leader import FileLease, LedgerLease, LeaderElection
+
+def _hold_and_die(path, ready):
+    lease = FileLease(path, holder="leader")
+    lease.acquire()
+    ready.set()
+    time.sleep(0.2)
+    os._exit(1)
+
+class LeaderTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_file_lease_is_exclusive(self):
+        first = FileLease(self.dir / "leader.lock", holder="first")
+        second = FileLease(self.dir / "leader.lock", holder="second")
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        self.assertEqual(second.current_holder(), "first")
+        first.release()
+        self.assertTrue(second.acquire())
+        second.release()
+
+    def test_file_lease_taken_over_when_holder_dies(self):
+        path = self.dir / "leader.lock"
+        ready = multiprocessing.Event()
+        process = multiprocessing.Process(target=_hold_and_die, args=(path, ready))
+        process.start()
+        ready.wait(10)
+        standby = FileLease(path, holder="standby")
+        self.assertFalse(standby.acquire())
+        process.join(10)
+        self.assertTrue(standby.acquire())
+        standby.release()
+
+    def test_ledger_lease_expires(self):
+        ledger = JobLedger(self.dir / "SBE-ledger.db")
+        leader = LedgerLease(ledger, -1, holder="leader")
+        standby = LedgerLease(ledger, 60, holder="standby")
+        self.assertTrue(leader.acquire())
+        # The leader stopped renewing, so its lease is already over
+        self.assertTrue(standby.acquire())
+        self.assertFalse(leader.renew())
+        self.assertEqual(leader.current_holder(), "standby")
+        standby.release()
+        self.assertIsNone(standby.current_holder())
+        ledger.close()
+
+    def test_election_reports_lost_lease(self):
+        ledger = JobLedger(self.dir / "SBE-ledger.db")
+        lost = threading.Event()
+        election = LeaderElection(LedgerLease(ledger, 60, holder="leader"), interval=0.05, on_lost=lost.set)
+        self.assertTrue(election.wait())
+        ledger.release_lease("scheduler", "leader")
+        ledger.acquire_lease("scheduler", "other", 60)
+        self.assertTrue(lost.wait(5))
+        self.assertFalse(election.leading)
+        ledger.close()
+
+    def test_standby_wait_can_be_stopped(self):
+        leader = FileLease(self.dir / "leader.lock", holder="leader")
+        leader.acquire()
+        stop = threading.Event()
+        stop.set()
+        self.assertFalse(LeaderElection(FileLease(self.dir / "leader.lock")).wait(stop))
+        leader.release()
+
+if __name__ == "__main__":
+    unittest.main()
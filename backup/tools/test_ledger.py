@@ -0,0 +1,165 @@
+import os
+import time
+import tempfile
+import unittest
+import multiprocessing
+from pathlib import Path
+
+from backup.tools.lib.ledger import JobLedger, QUEUED, RUNNING, SUCCESS, FAILED
+
+def _cluster_node(path, node, barrier):
+    """Claim and complete jobs from a shared ledger until the queue is empty"""
+    ledger = JobLedger(path)
+    barrier.wait()
+    while True:
+        jobs = ledger.claim(node, 60)
+        if not jobs:
+            break
+        time.sleep(0.01)
+        ledger.heartbeat(node, 60)
+        ledger.complete(jobs[0]["id"], True, 0, node=node)
+    ledger.close()
+
+class JobLedgerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.reports_dir = Path(self.tmp.name)
+        self.ledger = JobLedger(self.reports_dir / "SBE-ledger.db")
+
+    def tearDown(self):
+        self.ledger.close()
+        self.tmp.cleanup()
+
+    def test_one_active_job_per_directory_and_type(self):
+        job_id = self.ledger.enqueue("srv", "daily")
+        self.assertIsNotNone(job_id)
+        self.assertIsNone(self.ledger.enqueue("srv", "daily"))
+        self.assertIsNotNone(self.ledger.enqueue("srv", "weekly"))
+
+        self.ledger.start(job_id, os.getpid())
+        self.assertIsNone(self.ledger.enqueue("srv", "daily"))
+        self.assertEqual(self.ledger.count(RUNNING), 1)
+
+        self.ledger.complete(job_id, True, 0)
+        self.assertEqual(self.ledger.get(job_id)["state"], SUCCESS)
+        self.assertIsNotNone(self.ledger.enqueue("srv", "daily"))
+
+    def test_last_successes_survive_pruning(self):
+        self.ledger.history_limit = 1
+        daily = self.ledger.enqueue("srv", "daily")
+        queued_at = self.ledger.get(daily)["queued_at"]
+        self.ledger.complete(daily, True, 0)
+        weekly = self.ledger.enqueue("srv", "weekly")
+        self.ledger.complete(weekly, False, 1)
+        self.ledger.prune()
+
+        self.assertIsNone(self.ledger.get(daily))
+        last = self.ledger.last_successes()
+        self.assertEqual(list(last), [("srv", "daily")])
+        self.assertEqual(f"{last[('srv', 'daily')]:%Y-%m-%d %H:%M:%S}", queued_at)
+
+    def test_clean_orphans_and_abandon(self):
+        alive = self.ledger.enqueue("a", "daily")
+        dead = self.ledger.enqueue("b", "daily")
+        self.ledger.enqueue("c", "daily")
+        self.ledger.start(alive, os.getpid())
+        self.ledger.start(dead, 2 ** 22 + 1)
+
+        self.assertEqual(self.ledger.clean_orphans(), 1)
+        self.assertEqual(self.ledger.get(dead)["state"], FAILED)
+        self.assertEqual(self.ledger.abandon_active(), 2)
+        self.assertEqual(self.ledger.count(QUEUED) + self.ledger.count(RUNNING), 0)
+
+    def test_prune_keeps_history_limit(self):
+        self.ledger.history_limit = 3
+        for i in range(5):
+            job_id = self.ledger.enqueue("srv", "daily")
+            self.ledger.complete(job_id, True, 0)
+        self.ledger.prune()
+        self.assertEqual(len(self.ledger.recent(10)), 3)
+
+    def test_migrate_flat_files(self):
+        with open(self.reports_dir / "SBE-done", "w") as f:
+            f.write("123; 2025-01-01 01:00:00; srv; daily; SUCCESS;\n")
+            f.write("124; 2025-01-02 01:00:00; srv; daily; FAILED;\n")
+        with open(self.reports_dir / "SBE-queue", "w") as f:
+            f.write("99; 2025-01-02 01:00:00; srv; weekly;\n")
+
+        self.assertEqual(self.ledger.migrate_flat_files(self.reports_dir), 2)
+        self.assertEqual([job["state"] for job in self.ledger.recent(10)], [SUCCESS, FAILED])
+        self.assertFalse((self.reports_dir / "SBE-done").exists())
+        self.assertTrue((self.reports_dir / "SBE-queue.migrated").exists())
+        self.assertEqual(self.ledger.migrate_flat_files(self.reports_dir), 0)
+
+    def test_claim_by_priority_one_per_directory(self):
+        low = self.ledger.enqueue("a", "daily")
+        self.ledger.enqueue("a", "weekly", priority=5)
+        high = self.ledger.enqueue("b", "daily", priority=5)
+
+        jobs = self.ledger.claim("node1", 60, limit=3)
+        self.assertEqual(sorted(job["directory"] for job in jobs), ["a", "b"])
+        self.assertIn(high, [job["id"] for job in jobs])
+        self.assertNotIn(low, [job["id"] for job in jobs])
+        self.assertEqual(self.ledger.claim("node2", 60, limit=3), [])
+
+    def test_expired_lease_is_requeued(self):
+        job_id = self.ledger.enqueue("a", "daily")
+        self.ledger.claim("node1", -1)
+        self.assertEqual(self.ledger.heartbeat("node2", 60), 0)
+
+        self.assertEqual(self.ledger.requeue_expired(), 1)
+        self.assertEqual(self.ledger.get(job_id)["state"], QUEUED)
+        self.assertEqual(self.ledger.claim("node2", 60)[0]["attempts"], 2)
+
+        # The crashed node's late completion does not overwrite the new owner's run
+        self.assertFalse(self.ledger.complete(job_id, False, 1, node="node1"))
+        self.assertTrue(self.ledger.complete(job_id, True, 0, node="node2"))
+        self.assertEqual(self.ledger.get(job_id)["state"], SUCCESS)
+
+    def test_expired_lease_fails_after_max_attempts(self):
+        job_id = self.ledger.enqueue("a", "daily")
+        self.ledger.claim("node1", -1)
+        self.assertEqual(self.ledger.requeue_expired(max_attempts=1), 0)
+        self.assertEqual(self.ledger.get(job_id)["state"], FAILED)
+
+    def test_leases_survive_a_local_clock_jump(self):
+        # Like a DST change: local time moves an hour ahead while the lease runs
+        previous = os.environ.get("TZ")
+        try:
+            os.environ["TZ"] = "UTC0"
+            time.tzset()
+            job_id = self.ledger.enqueue("a", "daily")
+            self.ledger.claim("node1", 60)
+            self.assertTrue(self.ledger.acquire_lease("scheduler", "node1", 60))
+            os.environ["TZ"] = "XST-1"
+            time.tzset()
+            self.assertEqual(self.ledger.requeue_expired(), 0)
+            self.assertEqual(self.ledger.get(job_id)["state"], RUNNING)
+            self.assertEqual(self.ledger.lease_holder("scheduler"), "node1")
+            self.assertFalse(self.ledger.acquire_lease("scheduler", "node2", 60))
+        finally:
+            if previous is None:
+                os.environ.pop("TZ", None)
+            else:
+                os.environ["TZ"] = previous
+            time.tzset()
+
+    def test_nodes_in_separate_processes_share_the_queue(self):
+        path = self.reports_dir / "SBE-ledger.db"
+        job_ids = [self.ledger.enqueue(f"srv{i}", "daily") for i in range(30)]
+
+        nodes = [f"node{i}" for i in range(3)]
+        barrier = multiprocessing.Barrier(len(nodes))
+        processes = [multiprocessing.Process(target=_cluster_node, args=(path, node, barrier)) for node in nodes]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+            self.assertEqual(process.exitcode, 0)
+
+        jobs = [self.ledger.get(job_id) for job_id in job_ids]
+        self.assertTrue(all(job["state"] == SUCCESS and job["attempts"] == 1 for job in jobs))
+        self.assertGreater(len({job["node"] for job in jobs}), 1)
+
+if __name__ == "__main__":
+    unittest.main()
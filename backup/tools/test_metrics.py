@@ -0,0 +1,40 @@
+import unittest
+import urllib.request
+
+from backup.tools.lib.metrics import Registry, MetricsServer
+
+class MetricsTest(unittest.TestCase):
+    def test_text_exposition(self):
+        registry = Registry()
+        backups = registry.counter("sbe_backups_total", "Finished backups", labels=("host", "result"))
+        backups.inc(host="a", result="success")
+        backups.inc(2, host="a", result="failed")
+        registry.gauge("sbe_queue_depth", "Waiting backups", callback=lambda: 3)
+        duration = registry.histogram("sbe_duration_seconds", "Run time", buckets=(1, 10))
+        for value in (0.5, 1, 5, 50):
+            duration.observe(value)
+
+        lines = registry.render().splitlines()
+        self.assertIn("# TYPE sbe_backups_total counter", lines)
+        self.assertIn('sbe_backups_total{host="a",result="failed"} 2', lines)
+        self.assertIn("sbe_queue_depth 3", lines)
+        self.assertIn('sbe_duration_seconds_bucket{le="1"} 2', lines)
+        self.assertIn('sbe_duration_seconds_bucket{le="10"} 3', lines)
+        self.assertIn('sbe_duration_seconds_bucket{le="+Inf"} 4', lines)
+        self.assertIn("sbe_duration_seconds_sum 56.5", lines)
+        self.assertIs(registry.counter("sbe_backups_total", "Finished backups"), backups)
+
+    def test_http_endpoint(self):
+        registry = Registry()
+        registry.counter("sbe_test_total", "Test").inc()
+        server = MetricsServer(registry, 0, "127.0.0.1")
+        server.start()
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=5) as response:
+                self.assertIn("text/plain", response.headers["Content-Type"])
+                self.assertIn("sbe_test_total 1", response.read().decode())
+        finally:
+            server.stop()
+
+if __name__ == "__main__":
+    unittest.main()
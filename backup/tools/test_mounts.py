@@ -0,0 +1,60 @@
+import unittest
+
+from backup.tools.lib.dispatch import Dispatcher, Job
+from backup.tools.lib.mounts import MountSessionManager
+
+class MountSessionTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.unmounted = []
+        self.manager = MountSessionManager(self.unmounted.append, idle_timeout=300, clock=lambda: self.now)
+
+    def test_image_stays_mounted_while_referenced(self):
+        self.manager.acquire("srv")
+        self.manager.acquire("srv")
+        self.manager.release("srv")
+        self.now = 1000
+        self.assertEqual(self.manager.expire(), [])
+
+        self.manager.release("srv")
+        self.now = 1299
+        self.assertEqual(self.manager.expire(), [])
+        self.now = 1300
+        self.assertEqual(self.manager.expire(), ["srv"])
+        self.assertEqual(self.manager.sessions(), [])
+
+    def test_new_job_cancels_idle_timeout(self):
+        self.manager.acquire("srv")
+        self.manager.release("srv")
+        self.now = 200
+        self.manager.acquire("srv")
+        self.now = 600
+        self.assertEqual(self.manager.expire(), [])
+        self.assertEqual(self.manager.sessions()[0].jobs, 2)
+
+    def test_adopted_and_idle_images_closed_on_shutdown(self):
+        self.manager.adopt("old")
+        self.manager.acquire("busy")
+        self.assertEqual(self.manager.close_all(), ["old"])
+        self.assertEqual(self.unmounted, ["old"])
+        self.assertEqual([session.host for session in self.manager.sessions()], ["busy"])
+
+    def test_jobs_wait_for_unmount_without_blocking(self):
+        launched = []
+        dispatcher = Dispatcher(2, lambda job: launched.append(job.directory) or True,
+                                admit=lambda job: not manager.is_closing(job.directory))
+
+        def unmount(host):
+            # A job of the host queued while its image is torn down stays queued
+            self.assertTrue(manager.is_closing(host))
+            dispatcher.submit(Job(1, host, "daily"))
+            self.assertEqual((launched, dispatcher.queue_depth()), ([], 1))
+
+        manager = MountSessionManager(unmount, idle_timeout=0, on_unmounted=lambda host: dispatcher.retry())
+        manager.acquire("srv")
+        manager.release("srv")
+        self.assertFalse(manager.is_closing("srv"))
+        self.assertEqual((launched, dispatcher.queue_depth()), (["srv"], 0))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import threading
+import unittest
+
+from backup.tools.lib.notify import Notifier, truncate_body
+
+class NotifierTest(unittest.TestCase):
+    def setUp(self):
+        self.sent = []
+        self.delivered = threading.Event()
+
+    def transport(self, subject, body):
+        self.sent.append((subject, body))
+        self.delivered.set()
+        return True
+
+    def test_truncate_body(self):
+        body = "\n".join(f"line {i}" for i in range(100)) + "\n" + "x" * 1000
+        truncated = truncate_body(body, 3).splitlines()
+        self.assertEqual(truncated[:3], ["[... 98 earlier lines omitted]", "line 98", "line 99"])
+        self.assertTrue(truncated[3].endswith("[...]"))
+        self.assertLess(len(truncated[3]), 600)
+
+    def test_failures_are_coalesced_into_one_digest(self):
+        notifier = Notifier(self.transport, digest_interval=0.2, tail_lines=2)
+        for i in range(50):
+            notifier.notify(f"Backup failed for host{i}", "rsync error\nline a\nline b", log_path=f"/logs/host{i}.log")
+        self.assertTrue(self.delivered.wait(5))
+        notifier.stop()
+
+        self.assertEqual(len(self.sent), 1)
+        subject, body = self.sent[0]
+        self.assertEqual(subject, "SBE: 50 notifications")
+        self.assertIn("Full log: /logs/host49.log", body)
+        self.assertNotIn("rsync error", body)
+
+    def test_urgent_mail_skips_digest_and_stop_flushes(self):
+        notifier = Notifier(self.transport, digest_interval=60)
+        notifier.notify("Backup failed for a", "error")
+        notifier.notify("Error in SBE scheduler", "crash", digest=False)
+        self.assertTrue(self.delivered.wait(5))
+        self.assertEqual([subject for subject, _ in self.sent], ["Error in SBE scheduler"])
+
+        notifier.stop()
+        self.assertEqual([subject for subject, _ in self.sent], ["Error in SBE scheduler", "Backup failed for a"])
+
+if __name__ == "__main__":
+    unittest.main()
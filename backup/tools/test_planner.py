@@ -0,0 +1,24 @@
+import unittest
+
+from backup.tools.lib.planner import lpt_plan
+
+class PlannerTest(unittest.TestCase):
+    def test_longest_first_onto_free_lane(self):
+        plan = lpt_plan({"a": 30, "b": 20, "c": 20, "d": 10, "e": 10}, workers=2)
+        starts = {job.key: (job.lane, job.start) for job in plan.jobs}
+        self.assertEqual(starts, {"a": (0, 0), "b": (1, 0), "c": (1, 20), "d": (0, 30), "e": (0, 40)})
+        self.assertEqual(plan.makespan, 50)
+        self.assertTrue(plan.fits(50))
+        self.assertFalse(plan.fits(45))
+
+    def test_stretched_keeps_lanes_apart(self):
+        plan = lpt_plan({"a": 30, "b": 20, "c": 20, "d": 10}, workers=2).stretched(80)
+        self.assertEqual(plan.start_of("d"), 60)
+        for lane in range(2):
+            jobs = [job for job in plan.jobs if job.lane == lane]
+            for before, after in zip(jobs, jobs[1:]):
+                self.assertLessEqual(before.end, after.start)
+        self.assertLessEqual(plan.makespan, 80)
+
+if __name__ == "__main__":
+    unittest.main()
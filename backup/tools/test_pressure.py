@@ -0,0 +1,44 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from backup.tools.lib import pressure
+from backup.tools.lib.pressure import AIMDController, Pressure, PressureSampler
+
+class AIMDControllerTest(unittest.TestCase):
+    def test_additive_increase_multiplicative_decrease(self):
+        controller = AIMDController(minimum=1, maximum=6, initial=2)
+        idle = Pressure(0.3, 1.0, 0.2)
+        # Grows only while the limit keeps jobs waiting
+        self.assertEqual(controller.update(idle, running=2, waiting=0), 2)
+        self.assertEqual(controller.update(idle, running=2, waiting=3), 3)
+        self.assertEqual(controller.update(idle, running=3, waiting=3), 4)
+        # Busy but not saturated disk holds the limit
+        self.assertEqual(controller.update(Pressure(0.9, 5.0, 0.2), running=4, waiting=3), 4)
+        self.assertEqual(controller.update(Pressure(0.99, 5.0, 0.2), running=4, waiting=3), 2)
+        self.assertEqual(controller.update(Pressure(0.5, 50.0, 0.2), running=2, waiting=3), 1)
+        self.assertEqual(controller.update(Pressure(None, None, 3.0), running=1, waiting=3), 1)
+
+class PressureSamplerTest(unittest.TestCase):
+    def test_utilization_from_diskstats(self):
+        tmp = tempfile.TemporaryDirectory()
+        diskstats = os.path.join(tmp.name, "diskstats")
+        st_dev = os.stat(tmp.name).st_dev
+        major, minor = os.major(st_dev), os.minor(st_dev)
+
+        def write_ticks(ticks):
+            with open(diskstats, "w") as f:
+                f.write(f"{major} {minor} store " + " ".join(["0"] * 9) + f" {ticks} 0 0 0 0 0 0\n")
+
+        sampler = PressureSampler([tmp.name])
+        with patch.object(pressure, "DISKSTATS", diskstats), \
+             patch.object(pressure.time, "monotonic", side_effect=[100.0, 110.0]):
+            write_ticks(1000)
+            self.assertIsNone(sampler.sample().utilization)
+            write_ticks(6000)
+            self.assertAlmostEqual(sampler.sample().utilization, 0.5)
+        tmp.cleanup()
+
+if __name__ == "__main__":
+    unittest.main()
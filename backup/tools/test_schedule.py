@@ -0,0 +1,163 @@
+import datetime
+import unittest
+
+from backup.tools.lib.schedule import CronTrigger, Schedule, ScheduledTask, legacy_to_cron
+
+def LegacyTrigger(interval, date_pattern):
+    return CronTrigger(legacy_to_cron(interval, date_pattern))
+
+class LegacyTriggerTest(unittest.TestCase):
+    def test_daily_time(self):
+        trigger = LegacyTrigger("01:00", "*")
+        after = datetime.datetime(2025, 3, 10, 0, 59, 30)
+        self.assertEqual(trigger.next_after(after), datetime.datetime(2025, 3, 10, 1, 0))
+        self.assertEqual(trigger.next_after(datetime.datetime(2025, 3, 10, 1, 0)),
+                         datetime.datetime(2025, 3, 11, 1, 0))
+
+    def test_weekday_and_yearly(self):
+        # 2025-03-10 is a Monday
+        self.assertEqual(LegacyTrigger("02:00", "Sun").next_after(datetime.datetime(2025, 3, 10)),
+                         datetime.datetime(2025, 3, 16, 2, 0))
+        self.assertEqual(LegacyTrigger("04:00", "Jan-1").next_after(datetime.datetime(2025, 3, 10)),
+                         datetime.datetime(2026, 1, 1, 4, 0))
+
+    def test_intervals(self):
+        after = datetime.datetime(2025, 3, 10, 13, 5)
+        self.assertEqual(LegacyTrigger("12h", "*").next_after(after), datetime.datetime(2025, 3, 11, 0, 0))
+        self.assertEqual(LegacyTrigger("30m", "15").next_after(after), datetime.datetime(2025, 3, 15, 0, 0))
+
+    def test_invalid_patterns(self):
+        with self.assertRaises(ValueError):
+            LegacyTrigger("1 am", "*")
+        with self.assertRaises(ValueError):
+            LegacyTrigger("01:00", "1/1")
+        with self.assertRaises(ValueError):
+            LegacyTrigger("01:00", "Feb-30")
+
+    def test_legacy_translation(self):
+        self.assertEqual(legacy_to_cron("01:30", "*"), "30 1 * * *")
+        self.assertEqual(legacy_to_cron("6h", "Monday"), "0 */6 * * mon")
+        self.assertEqual(legacy_to_cron("04:00", "Jan-1"), "0 4 1 1 *")
+
+class CronTriggerTest(unittest.TestCase):
+    def test_expression(self):
+        trigger = CronTrigger("15 */4 * * 1-5")
+        # 2025-03-14 is a Friday
+        after = datetime.datetime(2025, 3, 14, 20, 15)
+        self.assertEqual(trigger.next_after(after), datetime.datetime(2025, 3, 17, 0, 15))
+        self.assertEqual(trigger.next_after(datetime.datetime(2025, 3, 17, 0, 15)),
+                         datetime.datetime(2025, 3, 17, 4, 15))
+
+    def test_invalid_expression(self):
+        with self.assertRaises(ValueError):
+            CronTrigger("61 * * * *")
+
+class ScheduleTest(unittest.TestCase):
+    def setUp(self):
+        self.servers = [
+            {"backupdirectory": "a", "intervall": "01:00", "date": "*", "type": "daily"},
+            {"backupdirectory": "b", "intervall": "02:00", "date": "*", "type": "daily"},
+            {"backupdirectory": "c", "type": "daily"},
+            {"backupdirectory": "d", "schedule": "30 1 * * *", "type": "weekly"},
+        ]
+        self.start = datetime.datetime(2025, 3, 10, 0, 30)
+
+    def test_pop_due_in_order(self):
+        schedule = Schedule()
+        errors = schedule.load(self.servers, self.start)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(schedule.next_fire_time(), datetime.datetime(2025, 3, 10, 1, 0))
+        self.assertEqual(schedule.pop_due(self.start), [])
+
+        due = schedule.pop_due(datetime.datetime(2025, 3, 10, 1, 0, 2))
+        self.assertEqual([task.directory for task in due], ["a"])
+        self.assertEqual(schedule.next_fire_time(), datetime.datetime(2025, 3, 10, 1, 30))
+        due = schedule.pop_due(datetime.datetime(2025, 3, 10, 2, 0))
+        self.assertEqual([task.directory for task in due], ["d", "b"])
+
+    def test_late_wakeup_fires_once(self):
+        schedule = Schedule()
+        schedule.load(self.servers[:1], self.start)
+        # Woken three days late: the task runs once and is rescheduled after now
+        late = datetime.datetime(2025, 3, 13, 5, 0)
+        self.assertEqual(len(schedule.pop_due(late)), 1)
+        self.assertEqual(schedule.next_fire_time(), datetime.datetime(2025, 3, 14, 1, 0))
+
+    def test_reload_keeps_unchanged_tasks(self):
+        schedule = Schedule()
+        schedule.load(self.servers[:2], self.start)
+        schedule.pop_due(datetime.datetime(2025, 3, 10, 1, 0))
+        schedule.load(self.servers[:2], datetime.datetime(2025, 3, 10, 1, 30))
+        fires = sorted(task.next_fire for task in schedule.tasks)
+        self.assertEqual(fires, [datetime.datetime(2025, 3, 10, 2, 0), datetime.datetime(2025, 3, 11, 1, 0)])
+
+        schedule.load(self.servers[1:2], datetime.datetime(2025, 3, 10, 1, 30))
+        self.assertEqual(len(schedule), 1)
+
+    def test_plan_catchup_policies(self):
+        servers = [
+            {"backupdirectory": "a", "intervall": "01:00", "date": "*", "type": "daily"},
+            {"backupdirectory": "b", "intervall": "02:00", "date": "*", "type": "daily", "catchup": "all"},
+            {"backupdirectory": "c", "intervall": "03:00", "date": "*", "type": "daily", "catchup": "skip"},
+            {"backupdirectory": "new", "intervall": "01:00", "date": "*", "type": "daily"},
+        ]
+        restart = datetime.datetime(2025, 3, 10, 3, 2)
+        schedule = Schedule()
+        self.assertEqual(schedule.load(servers, restart), [])
+        last_runs = {(name, "daily"): datetime.datetime(2025, 3, 8, 0, 50) for name in "abc"}
+
+        plan = schedule.plan_catchup(last_runs, restart, "once", spread=60)
+        # "a" runs once, "b" replays all three missed runs, "c" and never-run "new" wait
+        self.assertEqual([task.directory for _, task in plan], ["b", "b", "a", "b"])
+        self.assertEqual([start for start, _ in plan],
+                         [restart + datetime.timedelta(seconds=60 * i) for i in range(4)])
+        self.assertEqual(schedule.plan_catchup(last_runs, restart, "skip")[0][1].directory, "b")
+
+        self.assertEqual(len(schedule.load([dict(servers[0], catchup="sometimes")], restart)), 1)
+
+class SpreadTest(unittest.TestCase):
+    def test_jitter_is_deterministic(self):
+        entry = {"backupdirectory": "a", "intervall": "01:00", "date": "*", "type": "daily", "jitter": "15m"}
+        first, second = ScheduledTask(entry), ScheduledTask(dict(entry))
+        self.assertEqual(first.offset, second.offset)
+        self.assertLess(first.offset, datetime.timedelta(minutes=15))
+
+        fire = first.next_after(datetime.datetime(2025, 3, 10, 0, 30))
+        self.assertEqual(fire, datetime.datetime(2025, 3, 10, 1, 0) + first.offset)
+        self.assertEqual(first.next_after(fire), fire + datetime.timedelta(days=1))
+
+    def test_window_spread_by_duration(self):
+        servers = [{"backupdirectory": name, "window": "01:00-04:00", "type": "daily"} for name in "abc"]
+        durations = {("a", "daily"): 600, ("b", "daily"): 1200, ("c", "daily"): 1800}
+        schedule = Schedule()
+        self.assertEqual(schedule.load(servers, datetime.datetime(2025, 3, 10, 0, 30), durations), [])
+
+        fires = {task.directory: task.next_fire.strftime("%H:%M") for task in schedule.tasks}
+        self.assertEqual(fires, {"c": "01:00", "b": "02:30", "a": "03:30"})
+        self.assertTrue(schedule.window_plans[0].fits)
+
+        # Updated predictions move pending fire times within the same night
+        durations[("a", "daily")] = 3600
+        schedule.load(servers, datetime.datetime(2025, 3, 10, 0, 45), durations)
+        fires = {task.directory: task.next_fire.strftime("%H:%M") for task in schedule.tasks}
+        self.assertEqual(fires, {"a": "01:00", "c": "02:38", "b": "03:27"})
+
+    def test_window_packed_onto_lanes(self):
+        servers = [{"backupdirectory": name, "window": "01:00-04:00", "type": "daily"} for name in "abc"]
+        durations = {("a", "daily"): 4800, ("b", "daily"): 9600, ("c", "daily"): 14400}
+        schedule = Schedule(slots=2)
+        schedule.load(servers, datetime.datetime(2025, 3, 10, 0, 30), durations)
+
+        # Two lanes: "c" and "b" start together, "a" follows "b"
+        fires = {task.directory: task.next_fire.strftime("%H:%M") for task in schedule.tasks}
+        self.assertEqual(fires, {"c": "01:00", "b": "01:00", "a": "03:40"})
+        self.assertFalse(schedule.window_plans[0].fits)
+        self.assertEqual(schedule.window_plans[0].overrun, datetime.timedelta(hours=1))
+
+    def test_window_excludes_intervall(self):
+        with self.assertRaises(ValueError):
+            ScheduledTask({"backupdirectory": "a", "window": "01:00-04:00", "intervall": "01:00",
+                           "date": "*", "type": "daily"})
+
+if __name__ == "__main__":
+    unittest.main()
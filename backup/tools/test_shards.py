@@ -0,0 +1,57 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from backup.tools.lib.shards import partition, shard_commands, run_parallel, list_remote_directories
+
+# Behaves like ssh: the command words are joined and run by a shell, the remote is dropped
+FAKE_SSH = ["sh", "-c", 'shift; exec sh -c "$*"', "ssh"]
+
+class ShardsTest(unittest.TestCase):
+    def test_partition_is_stable_and_balanced(self):
+        groups = partition(["var", "home", "etc", "srv", "opt"], 2)
+        self.assertEqual(groups, [["etc", "opt", "var"], ["home", "srv"]])
+        self.assertEqual(partition(["home"], 4), [["home"]])
+
+    def test_root_pass_and_directory_shards(self):
+        commands = shard_commands(["rsync", "-a", "--relative"], "root@host", "/srv/data/", "/snap",
+                                  ["a", "b", "c"], 2)
+        self.assertEqual(len(commands), 3)
+        self.assertEqual(commands[0][-3:], ["--exclude=/srv/data/*/", "root@host:/srv/data/", "/snap"])
+        self.assertEqual(commands[1][-3:], ["root@host:/srv/data/a", "root@host:/srv/data/c", "/snap"])
+        self.assertEqual(commands[2][-2:], ["root@host:/srv/data/b", "/snap"])
+        self.assertTrue(all("--protect-args" in command for command in commands))
+
+    def test_root_share(self):
+        commands = shard_commands(["rsync"], "root@host", "/", "/snap", ["etc"], 4)
+        self.assertIn("--exclude=/*/", commands[0])
+        self.assertEqual(commands[1][-2:], ["root@host:/etc", "/snap"])
+
+    def test_results_merged(self):
+        result = run_parallel([["sh", "-c", "echo one"], ["sh", "-c", "echo two; echo bad >&2; exit 23"],
+                               ["sh", "-c", "exit 12"]])
+        self.assertEqual(result.returncode, 23)
+        self.assertEqual(result.stdout.split(), ["one", "two"])
+        self.assertIn("[shard 1] bad", result.stderr)
+        self.assertEqual(run_parallel([["true"], ["true"]]).returncode, 0)
+
+    def test_remote_listing_through_a_shell(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            share = Path(tmp) / "my share"
+            for name in ("b", "a", "with space", "it's"):
+                (share / name).mkdir(parents=True)
+            (share / "file").write_text("x")
+            names = list_remote_directories(FAKE_SSH, "root@host", str(share))
+            self.assertEqual(sorted(names), ["a", "b", "it's", "with space"])
+            (share / "a").rmdir()
+            self.assertNotIn("a", list_remote_directories(FAKE_SSH, "root@host", str(share)))
+
+    def test_mangled_or_failed_listing_raises(self):
+        with self.assertRaises(RuntimeError):
+            list_remote_directories(["sh", "-c", "printf b0a0", "ssh"], "root@host", "/srv")
+        with self.assertRaises(RuntimeError):
+            list_remote_directories(FAKE_SSH, "root@host", "/does/not/exist")
+        self.assertEqual(list_remote_directories(["sh", "-c", "true", "ssh"], "root@host", "/srv"), [])
+
+if __name__ == "__main__":
+    unittest.main()
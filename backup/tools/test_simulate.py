@@ -0,0 +1,40 @@
+import datetime
+import unittest
+
+from backup.tools.lib.simulate import Simulation, scale_servers
+
+START = datetime.datetime(2024, 1, 1)
+
+class SimulationTest(unittest.TestCase):
+    def test_queue_wait_and_peak(self):
+        servers = [{"backupdirectory": name, "schedule": "0 1 * * *", "type": "daily", "duration": "1h"}
+                   for name in "abc"]
+        report = Simulation(servers, max_workers=2).run(2, START)
+        self.assertEqual(report.runs, 6)
+        self.assertEqual(report.peak_running, 2)
+        self.assertEqual(report.peak_queued, 1)
+        self.assertEqual(sorted(report.waits), [0, 0, 0, 0, 3600, 3600])
+        # Two backups from 01:00, the third from 02:00
+        load = report.hourly_load()
+        self.assertEqual((load[1], load[2], load[3]), (2, 1, 0))
+
+    def test_overlong_runs_are_skipped(self):
+        servers = [{"backupdirectory": "a", "schedule": "0 * * * *", "type": "hourly", "duration": "90m"}]
+        report = Simulation(servers, max_workers=1).run(1, START)
+        # Fires from 01:00 to 23:00, every second one is still running
+        self.assertEqual(report.skipped, 11)
+        self.assertEqual(report.runs, 12)
+
+    def test_missed_windows(self):
+        servers = [{"backupdirectory": name, "window": "01:00-02:00", "type": "daily"} for name in "abc"]
+        durations = {(name, "daily"): 3600 for name in "abc"}
+        report = Simulation(servers, max_workers=1, durations=durations).run(1, START)
+        # Only the first of three one-hour backups fits the single lane
+        self.assertEqual(sum(report.missed_windows.values()), 2)
+
+    def test_scale_servers(self):
+        servers = scale_servers([{"backupdirectory": "a", "type": "daily"}], 3)
+        self.assertEqual([entry["backupdirectory"] for entry in servers], ["a", "a-1", "a-2"])
+
+if __name__ == "__main__":
+    unittest.main()
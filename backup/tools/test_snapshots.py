@@ -0,0 +1,59 @@
+import os
+import datetime
+import tempfile
+import unittest
+from pathlib import Path
+
+from backup.tools.lib.snapshots import list_snapshots, newest_snapshot, promote
+
+class SnapshotsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.mount_dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make(self, backup_type, name, complete=True):
+        path = self.mount_dir / backup_type / name
+        path.mkdir(parents=True)
+        if complete:
+            (path / "backup_info.txt").write_text("Return code: 0\n")
+        return path
+
+    def test_newest_complete_snapshot_across_types(self):
+        self.make("daily", "20250101_010000")
+        weekly = self.make("weekly", "20250102_030000")
+        self.make("daily", "20250103_010000", complete=False)
+        (self.mount_dir / "daily" / "notes").mkdir()
+
+        self.assertEqual(newest_snapshot(self.mount_dir), weekly)
+        self.assertEqual(len(list_snapshots(self.mount_dir)), 2)
+        self.assertEqual(len(list_snapshots(self.mount_dir, complete_only=False)), 3)
+
+    def test_target_is_excluded(self):
+        daily = self.make("daily", "20250101_010000")
+        target = self.make("daily", "20250102_010000")
+        self.assertEqual(newest_snapshot(self.mount_dir, exclude=target), daily)
+        self.assertIsNone(newest_snapshot(self.mount_dir / "missing"))
+
+    def test_promote_hard_links_newest_daily(self):
+        daily = self.make("daily", "20250107_010000")
+        (daily / "data").write_text("payload")
+        now = datetime.datetime(2025, 1, 7, 12, 0)
+
+        weekly = promote(self.mount_dir, "weekly", datetime.timedelta(hours=36), now)
+        self.assertEqual(weekly, self.mount_dir / "weekly" / "20250107_010000")
+        self.assertEqual(os.stat(weekly / "data").st_ino, os.stat(daily / "data").st_ino)
+        self.assertIn("Promoted from: daily/20250107_010000", (weekly / "backup_info.txt").read_text())
+        self.assertEqual((daily / "backup_info.txt").read_text(), "Return code: 0\n")
+        self.assertEqual(promote(self.mount_dir, "weekly", datetime.timedelta(hours=36), now), weekly)
+
+    def test_no_promotion_of_stale_daily(self):
+        self.make("daily", "20250101_010000")
+        now = datetime.datetime(2025, 1, 7, 12, 0)
+        self.assertIsNone(promote(self.mount_dir, "monthly", datetime.timedelta(hours=36), now))
+        self.assertFalse((self.mount_dir / "monthly").exists())
+
+if __name__ == "__main__":
+    unittest.main()
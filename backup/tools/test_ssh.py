@@ -0,0 +1,72 @@
+import os
+import shlex
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from backup.tools.lib.ssh import SSHMaster, control_path, from_environment, saved_seconds
+
+# Stands in for ssh: -O check succeeds once a master "socket" exists, -f -N creates it
+FAKE_SSH = """#!/bin/sh
+for arg; do
+    case "$arg" in ControlPath=*) socket="${arg#ControlPath=}" ;; esac
+done
+case " $* " in
+    *" -O check "*) test -e "$socket" ;;
+    *" -N "*) touch "$socket" ;;
+esac
+"""
+
+class SSHMasterTest(unittest.TestCase):
+    def test_one_socket_per_target(self):
+        path = control_path("/tmp/sbe-ssh", "root", "host", 22)
+        self.assertEqual(path, control_path("/tmp/sbe-ssh", "root", "host", "22"))
+        self.assertNotEqual(path, control_path("/tmp/sbe-ssh", "root", "host", 2222))
+        self.assertNotEqual(path, control_path("/tmp/sbe-ssh", "backup", "host", 22))
+        self.assertLess(len(str(path)), 100)
+
+    def test_rsync_shell_runs_over_master(self):
+        ssh = SSHMaster("root", "host", 2222, control_dir="/tmp/sbe ssh", idle_timeout=60)
+        rsh = shlex.split(ssh.rsh())
+        self.assertEqual(rsh[:3], ["ssh", "-p", "2222"])
+        self.assertIn("ControlMaster=auto", rsh)
+        self.assertIn(f"ControlPath={ssh.path}", rsh)
+        self.assertIn("ControlPersist=60", rsh)
+        tuned = SSHMaster("root", "host", 2222, control_dir="/tmp/sbe ssh", cipher="aes128-gcm@openssh.com")
+        self.assertIn("Ciphers=aes128-gcm@openssh.com", tuned.ssh_command())
+        # ssh-copy-id only takes -i, -p, -o and -F
+        self.assertEqual({option for option in tuned.options() if option.startswith("-")}, {"-p", "-o"})
+        self.assertNotEqual(tuned.path, ssh.path)
+        disabled = SSHMaster("root", "host", 2222, enabled=False)
+        self.assertEqual(disabled.ssh_command(), ["ssh", "-p", "2222"])
+        self.assertFalse(disabled.open())
+
+    def test_handshake_once_then_reuse(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            bin_dir = Path(tmp) / "bin"
+            bin_dir.mkdir()
+            (bin_dir / "ssh").write_text(FAKE_SSH)
+            (bin_dir / "ssh").chmod(0o755)
+            with mock.patch.dict(os.environ, {"PATH": f"{bin_dir}:{os.environ['PATH']}"}):
+                first = SSHMaster("root", "host", control_dir=Path(tmp) / "sockets")
+                self.assertTrue(first.open())
+                self.assertEqual(first.stats()["handshakes"], 1)
+                second = SSHMaster("root", "host", control_dir=Path(tmp) / "sockets")
+                self.assertTrue(second.open())
+                second.record_connections(3)
+                self.assertEqual(second.stats(), {"handshakes": 0, "handshake_seconds": 0, "connections": 3})
+
+    def test_saved_time(self):
+        self.assertEqual(saved_seconds(4, 1, 0.5), 1.5)
+        self.assertEqual(saved_seconds(3, 0, 0.5), 1.5)
+        self.assertEqual(saved_seconds(1, 1, 0.5), 0)
+
+    def test_server_config_overrides_environment(self):
+        with mock.patch.dict(os.environ, {"SSH_IDLE_TIMEOUT": "30", "SSH_MULTIPLEX": "1"}):
+            self.assertEqual(from_environment("root", "host", 22).idle_timeout, 30)
+            ssh = from_environment("root", "host", 22, {"SSH_MULTIPLEX": "0"})
+            self.assertFalse(ssh.enabled)
+
+if __name__ == "__main__":
+    unittest.main()
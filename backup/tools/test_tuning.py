@@ -0,0 +1,75 @@
+import tempfile
+import unittest
+import subprocess
+from pathlib import Path
+
+from backup.tools.lib.config import ConfigManager
+from backup.tools.lib.ssh import SSHMaster
+from backup.tools.lib.tuning import (TuningResult, best, calibrate, compression_options, make_sample,
+                                     CIPHERS, COMPRESSIONS)
+
+class TuningTest(unittest.TestCase):
+    def test_compression_options(self):
+        self.assertEqual(compression_options(None), [])
+        self.assertEqual(compression_options("none", "3"), [])
+        self.assertEqual(compression_options("zstd", "3"),
+                         ["--compress", "--compress-choice=zstd", "--compress-level=3"])
+        self.assertEqual(compression_options("lz4", ""), ["--compress", "--compress-choice=lz4"])
+        with self.assertRaises(ValueError):
+            compression_options("brotli")
+
+    def test_ties_go_to_the_cheaper_setting(self):
+        results = [TuningResult("aes128-gcm@openssh.com", "none", None, 10.2, 1),
+                   TuningResult("aes128-gcm@openssh.com", "zstd", 1, 10.0, 1),
+                   TuningResult("chacha20-poly1305@openssh.com", "zstd", 3, 4.0, 1)]
+        self.assertIs(best(results), results[2])
+        self.assertIs(best(results[:2]), results[0])
+        self.assertIsNone(best([]))
+
+    def test_calibration_tries_every_setting(self):
+        commands = []
+
+        def run(command, **kwargs):
+            commands.append(command)
+            if command[-3:-1] == ["mktemp", "-d"]:
+                return subprocess.CompletedProcess(command, 0, "/tmp/sbe-tune.abc\n", "")
+            # An rsync without lz4 support
+            failed = "--compress-choice=lz4" in command
+            return subprocess.CompletedProcess(command, 1 if failed else 0, "", "")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            sample = make_sample(Path(tmp) / "sample", 2 * 2**20)
+            results = calibrate(lambda cipher: SSHMaster("root", "host", enabled=False, cipher=cipher),
+                                sample, repeat=2, run=run)
+            size = sum(path.stat().st_size for path in sample.iterdir())
+
+        self.assertEqual(len(results), len(CIPHERS) * (len(COMPRESSIONS) - 1))
+        self.assertEqual([r.cipher for r in results[:len(COMPRESSIONS) - 1]], [CIPHERS[0]] * 4)
+        self.assertEqual({r.size for r in results}, {size})
+        pulls = [c for c in commands if c[0] == "rsync" and "--ignore-times" in c]
+        self.assertEqual(pulls[0][-2:], ["root@host:/tmp/sbe-tune.abc/", pulls[0][-1]])
+        self.assertEqual(commands[-1][-3:], ["rm", "-rf", "/tmp/sbe-tune.abc"])
+        self.assertEqual(results[0].config(),
+                         {"SSH_CIPHER": CIPHERS[0], "RSYNC_COMPRESS": "none", "RSYNC_COMPRESS_LEVEL": ""})
+
+    def test_recorded_in_server_config(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            config_path = Path(tmp) / "store" / "web" / "server.config"
+            config_path.parent.mkdir(parents=True)
+            config_path.write_text('# Server configuration for SBE\nSERVER="10.0.0.5"\nRSYNC_COMPRESS="zlib"\n')
+            manager = ConfigManager(tmp)
+            self.assertTrue(manager.update_server_config("web", {"RSYNC_COMPRESS": "zstd", "SSH_CIPHER": "aes128-ctr"}))
+            self.assertEqual(config_path.read_text().splitlines(),
+                             ['# Server configuration for SBE', 'SERVER="10.0.0.5"', 'RSYNC_COMPRESS="zstd"',
+                              'SSH_CIPHER="aes128-ctr"'])
+            self.assertEqual(manager.load_server_config("web")["SSH_CIPHER"], "aes128-ctr")
+
+            # Stale duplicates go, empty values remove the key
+            config_path.write_text(config_path.read_text() + 'RSYNC_COMPRESS="zlib"\nRSYNC_COMPRESS_LEVEL="6"\n')
+            self.assertTrue(manager.update_server_config(
+                "web", {"RSYNC_COMPRESS": "lz4", "RSYNC_COMPRESS_LEVEL": "", "SSH_CIPHER": None}))
+            self.assertEqual(config_path.read_text().splitlines(),
+                             ['# Server configuration for SBE', 'SERVER="10.0.0.5"', 'RSYNC_COMPRESS="lz4"'])
+
+if __name__ == "__main__":
+    unittest.main()
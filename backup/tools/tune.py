@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Calibrates the rsync transport of backup hosts: pulls a short sample over
+SSH with each candidate cipher and rsync compression and records the
+fastest in the host's server.config (SSH_CIPHER, RSYNC_COMPRESS,
+RSYNC_COMPRESS_LEVEL), which backup_server.py applies to every backup.
+Needs rsync 3.2 or newer on both ends.
+
+With --loopback the calibration runs against a throwaway sshd on
+127.0.0.1 instead of a host and nothing is written.
+
+Usage: python3 backup/tools/tune.py HOST [HOST ...] | --all | --loopback [--size 64] [--repeat 2]
+"""
+
+import sys
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+
+try:
+    from lib.config import ConfigManager
+    from lib.ssh import from_environment, SSHMaster
+    from lib.tuning import CIPHERS, LoopbackSSHD, best, calibrate, local_ciphers, make_sample
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+    from backup.tools.lib.config import ConfigManager
+    from backup.tools.lib.ssh import from_environment, SSHMaster
+    from backup.tools.lib.tuning import CIPHERS, LoopbackSSHD, best, calibrate, local_ciphers, make_sample
+
+# Config paths
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+log = logging.getLogger("tune")
+
+def report(name, results, chosen):
+    """Print the measured settings of a host"""
+    print(f"\n{name}")
+    print(f"{'cipher':>32} {'compression':>12} {'seconds':>8} {'MiB/s':>8}")
+    for result in results:
+        compression = result.compress + (f":{result.level}" if result.level is not None else "")
+        marker = " *" if result is chosen else ""
+        print(f"{result.cipher:>32} {compression:>12} {result.seconds:>8.2f} "
+              f"{result.throughput / 2**20:>8.1f}{marker}")
+
+def tune_host(config_manager, host, sample, ciphers, repeat, dry_run):
+    """Calibrate one host and record its best setting"""
+    config = dict(config_manager.load_server_config(host))
+    if not config.get("SERVER"):
+        log.error(f"{host} has no SERVER in its server.config")
+        return False
+
+    def connect(cipher):
+        return from_environment(config.get("USER", "root"), config["SERVER"], config.get("PORT", "22"),
+                                dict(config, SSH_CIPHER=cipher or ""))
+
+    try:
+        results = calibrate(connect, sample, ciphers, repeat=repeat)
+    except (RuntimeError, OSError) as e:
+        log.error(f"Calibration of {host} failed: {e}")
+        return False
+    chosen = best(results)
+    if chosen is None:
+        log.error(f"No setting worked for {host}")
+        return False
+    report(host, results, chosen)
+    if dry_run:
+        return True
+    if not config_manager.update_server_config(host, chosen.config()):
+        return False
+    log.info(f"Recorded {chosen} in the server.config of {host}")
+    return True
+
+def tune_loopback(sample, ciphers, repeat):
+    """Calibrate against a throwaway local sshd"""
+    with LoopbackSSHD() as sshd, tempfile.TemporaryDirectory(prefix="sbe_ssh_") as control_dir:
+        def connect(cipher):
+            return SSHMaster(sshd.user, sshd.host, sshd.port, control_dir=control_dir, cipher=cipher,
+                             extra_options=sshd.options())
+
+        results = calibrate(connect, sample, ciphers, repeat=repeat)
+        report(f"loopback sshd on port {sshd.port}", results, best(results))
+    return bool(results)
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate SSH cipher and rsync compression per host")
+    parser.add_argument("hosts", nargs="*", help="Hosts (directories in store/) to tune")
+    parser.add_argument("--all", action="store_true", help="Tune every host")
+    parser.add_argument("--loopback", action="store_true", help="Calibrate against a local throwaway sshd")
+    parser.add_argument("--size", type=int, default=64, help="MiB of calibration data")
+    parser.add_argument("--repeat", type=int, default=2, help="Transfers per setting; the fastest counts")
+    parser.add_argument("--ciphers", nargs="+", help="Ciphers to try")
+    parser.add_argument("--dry-run", action="store_true", help="Only report, do not change server.config")
+    args = parser.parse_args()
+
+    supported = local_ciphers()
+    ciphers = [cipher for cipher in (args.ciphers or CIPHERS) if not supported or cipher in supported]
+    if not ciphers:
+        sys.exit("The local ssh supports none of the ciphers")
+
+    config_manager = ConfigManager(str(BASE_DIR))
+    hosts = args.hosts
+    if args.all:
+        hosts = sorted(path.parent.name for path in (BASE_DIR / "store").glob("*/server.config"))
+    if not hosts and not args.loopback:
+        parser.error("name hosts, --all or --loopback")
+
+    with tempfile.TemporaryDirectory(prefix="sbe_sample_") as tmp:
+        sample = make_sample(tmp, args.size * 2**20)
+        ok = True
+        if args.loopback:
+            ok = tune_loopback(sample, ciphers, args.repeat)
+        for host in hosts:
+            ok = tune_host(config_manager, host, sample, ciphers, args.repeat, args.dry_run) and ok
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()